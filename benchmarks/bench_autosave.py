@@ -0,0 +1,124 @@
+"""
+Latency of a command at the prompt with a commit after every command, as the
+prompt used to do, against the background writer (autosave.py). Also checks
+that commits alone, without a save, keep the journal from growing past the
+snapshot.
+
+    python benchmarks/bench_autosave.py --contacts 100000 --commands 2000
+"""
+import argparse, os, statistics, tempfile, time
+
+from generator import generate_book
+from personal_assistant.address_book import AddressBook
+from personal_assistant.autosave import BackgroundWriter
+from personal_assistant.storage import JournalStorage
+from personal_assistant.personal_assistant import run_command
+
+
+def commands(names, count):
+    for i in range(count):
+        yield "add-note", [names[i % len(names)], f"Note {i}", "written by the autosave benchmark"]
+
+
+def load(filename):
+    book = AddressBook()
+    book.load_from_file(filename)
+    return book
+
+
+def run_sync(filename, names, count):
+    book = load(filename)
+    latencies = []
+    for command, args in commands(names, count):
+        start = time.perf_counter()
+        book.sync()
+        run_command(book, command, args)
+        book.commit()
+        latencies.append(time.perf_counter() - start)
+    return latencies, book
+
+
+def run_background(filename, names, count, interval, max_changes):
+    book = load(filename)
+    writer = BackgroundWriter(book, interval, max_changes)
+    writer.start()
+    latencies = []
+    for command, args in commands(names, count):
+        start = time.perf_counter()
+        with writer.lock:
+            book.sync()
+            run_command(book, command, args)
+            writer.notify()
+        latencies.append(time.perf_counter() - start)
+    start = time.perf_counter()
+    writer.close()
+    return latencies, book, time.perf_counter() - start
+
+
+def journal_bound(filename, names, count, min_compact_size):
+    # Largest journal seen after a commit, and the most it may hold: past the
+    # snapshot size (or min_compact_size) the commit compacts it
+    book = AddressBook(JournalStorage(filename, min_compact_size=min_compact_size, fsync=False))
+    book.load_from_file(filename)
+    largest = bound = 0
+    for command, args in commands(names, count):
+        run_command(book, command, args)
+        book.commit()
+        largest = max(largest, book.storage.journal_size)
+        bound = max(bound, book.storage.min_compact_size, book.storage.snapshot_size)
+    return largest, bound
+
+
+def report(label, latencies):
+    latencies = sorted(latencies)
+    p99 = latencies[int(len(latencies) * 0.99)]
+    print(
+        f"{label:32} mean {statistics.mean(latencies) * 1e6:8.1f} us, p50 {statistics.median(latencies) * 1e6:8.1f} us, "
+        f"p99 {p99 * 1e6:8.1f} us"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--contacts", type=int, default=10000)
+    parser.add_argument("--commands", type=int, default=1000)
+    parser.add_argument("--interval", type=float, default=1.0, help="seconds")
+    parser.add_argument("--max-changes", type=int, default=100)
+    options = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        filename = os.path.join(directory, "address_book.dat")
+        book = generate_book(options.contacts)
+        # The notes go to the first 1000 contacts in turn
+        names = list(book.data)[:1000]
+        book.save_to_file(filename)
+        latencies, _ = run_sync(filename, names, options.commands)
+        report("commit after every command", latencies)
+
+        os.remove(filename)
+        os.remove(f"{filename}.journal")
+        generate_book(options.contacts).save_to_file(filename)
+        latencies, book, drain = run_background(
+            filename, names, options.commands, options.interval, options.max_changes
+        )
+        report("background writer", latencies)
+        print(f"drained on close in {drain * 1000:.1f} ms")
+
+        saved = load(filename)
+        notes = sum(len(saved.find(name).notes) for name in names)
+        expected = sum(len(book.find(name).notes) for name in names)
+        print("OK: every change saved" if notes == expected else f"FAILED: {expected - notes} notes lost")
+
+        # A book small enough for the notes to outgrow its snapshot several times
+        small = os.path.join(directory, "small.dat")
+        small_book = generate_book(1000)
+        small_book.save_to_file(small)
+        largest, bound = journal_bound(small, list(small_book.data), options.commands * 5, 16 * 1024)
+        print(
+            f"{options.commands * 5} commits without a save: journal at most {largest // 1024} KB, "
+            + ("OK: compacted as it went" if largest <= bound else f"FAILED: over {bound // 1024} KB")
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+"""
+Throughput of batch mode, in commands per second, including the final save.
+Also checks that "all --pager" doesn't read the commands after it as answers.
+
+    python benchmarks/bench_batch.py --contacts 50000
+"""
+import argparse, contextlib, io, os, sys, tempfile
+
+from common import timed
+from generator import generate_records
+from personal_assistant.address_book import AddressBook
+from personal_assistant.personal_assistant import main as run_personal_assistant
+
+
+def write_commands(filename, count):
+    # The generated contacts typed in: their name, first phone, emails and notes
+    lines = 0
+    with open(filename, "w", encoding="utf-8") as file:
+        for record in generate_records(count, notes=(1, 1)):
+            name = record.name.value
+            commands = [f'add-contact "{name}"', f'add-phone "{name}" {next(iter(record.phones)).value}']
+            commands += [f'add-email "{name}" {email.value}' for email in record.emails]
+            commands += [f'add-note "{name}" "{note.title}" {note.note}' for note in record.notes]
+            file.write("\n".join(commands) + "\n")
+            lines += len(commands)
+    return lines
+
+
+def check_pager(directory):
+    # Commands from stdin, where the pager's prompt reads too
+    os.chdir(directory)
+    commands = "add-contact A\nadd-contact B\nall --pager --size 1\nadd-contact C\n"
+    with contextlib.redirect_stdout(io.StringIO()) as output:
+        stdin, sys.stdin = sys.stdin, io.StringIO(commands)
+        try:
+            run_personal_assistant(["--batch"])
+        finally:
+            sys.stdin = stdin
+    book = AddressBook()
+    book.load_from_file("address_book.dat")
+    if "C" not in book.data:
+        return "FAILED: all --pager took 'add-contact C' for its answer"
+    if "--pager needs the prompt" not in output.getvalue():
+        return "FAILED: all --pager ran without its error"
+    return "OK: all --pager refused in batch mode, the next command ran"
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--contacts", type=int, default=50000, help="contacts added, 3 to 5 commands each")
+    count = parser.parse_args().contacts
+    with tempfile.TemporaryDirectory() as directory:
+        os.chdir(directory)
+        commands = write_commands("commands.txt", count)
+        with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+            seconds, _ = timed(run_personal_assistant, ["--batch", "commands.txt"])
+    print(f"{commands} commands in {seconds:.2f} s: {commands / seconds:,.0f} commands per second")
+    with tempfile.TemporaryDirectory() as directory:
+        print(check_pager(directory))
+
+
+if __name__ == "__main__":
+    main()
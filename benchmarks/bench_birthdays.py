@@ -0,0 +1,57 @@
+"""
+"birthdays 7" through the day-of-year index against the previous full scan.
+
+    python benchmarks/bench_birthdays.py --sizes 10000 100000 1000000
+"""
+from collections import defaultdict
+from datetime import date, datetime, timedelta
+import argparse, calendar
+
+from common import timed
+from generator import generate_book
+
+
+def in_year(birthday, year):
+    # 29 February is celebrated on 28 February in common years, like the index does
+    if birthday.month == 2 and birthday.day == 29 and not calendar.isleap(year):
+        return date(year, 2, 28)
+    return birthday.replace(year=year)
+
+
+def full_scan(book, days):
+    # get_birthdays_days_interval before the index
+    birthdays_per_days_interval = defaultdict(list)
+    today = datetime.today().date()
+    for record in book.data.values():
+        if hasattr(record, "birthday"):
+            birthday_date = datetime.strptime(record.birthday.value, "%d.%m.%Y").date()
+            birthday_this_year = in_year(birthday_date, today.year)
+            if birthday_this_year < today:
+                birthday_this_year = in_year(birthday_date, today.year + 1)
+            delta_days = (birthday_this_year - today).days
+            if 0 <= delta_days <= days:
+                day_of_week = (today + timedelta(days=delta_days)).strftime("%A")
+                if day_of_week in ["Saturday", "Sunday"]:
+                    day_of_week = "Monday"
+                birthdays_per_days_interval[day_of_week].append(record.name.value)
+    return birthdays_per_days_interval
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10000, 100000, 1000000])
+    options = parser.parse_args()
+    for count in options.sizes:
+        book = generate_book(count)
+        scan_seconds, expected = timed(full_scan, book, 7)
+        build_seconds, _ = timed(book.get_birthdays_days_interval, 7)
+        query_seconds, result = timed(book.get_birthdays_days_interval, 7)
+        assert sorted(map(sorted, result.values())) == sorted(map(sorted, expected.values()))
+        print(
+            f"{count:>8} contacts: full scan {scan_seconds * 1000:9.2f} ms, "
+            f"index build {build_seconds * 1000:9.2f} ms, index query {query_seconds * 1000:7.3f} ms"
+        )
+
+
+if __name__ == "__main__":
+    main()
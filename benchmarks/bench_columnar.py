@@ -0,0 +1,77 @@
+"""
+Save and load of the columnar snapshot (columnar.py) against a pickled book
+(PickleStorage) and the indexed snapshot. Loading the snapshots only opens them,
+records are decoded when asked for; "decode all" builds every record as well,
+the columnar one a column at a time (ColumnarReader.records).
+
+    python benchmarks/bench_columnar.py --contacts 1000000
+"""
+import argparse, gc, os, tempfile, time
+
+from generator import generate_book
+from personal_assistant.columnar import ColumnarReader, read_columnar, write_columnar
+from personal_assistant.storage import JournalStorage, PickleStorage
+
+
+def best_of(runs, func):
+    best = float("inf")
+    for _ in range(runs):
+        gc.collect()
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def load_indexed(filename, decode=False):
+    data, _ = JournalStorage(filename).load()
+    if decode:
+        for _ in data.values():
+            pass
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--contacts", type=int, default=1000000)
+    parser.add_argument("--runs", type=int, default=3)
+    options = parser.parse_args()
+
+    book = generate_book(options.contacts)
+    with tempfile.TemporaryDirectory() as directory:
+        pickled = PickleStorage(os.path.join(directory, "pickle.dat"))
+        indexed = os.path.join(directory, "indexed.dat")
+        columnar = os.path.join(directory, "columnar.dat")
+
+        results = {
+            "pickle": (
+                best_of(options.runs, lambda: pickled.save(book.data)),
+                best_of(options.runs, pickled.load),
+                best_of(options.runs, pickled.load),
+                os.path.getsize(pickled.filename),
+            ),
+            "indexed snapshot": (
+                best_of(options.runs, lambda: JournalStorage(indexed).compact(book.data)),
+                best_of(options.runs, lambda: load_indexed(indexed)),
+                best_of(options.runs, lambda: load_indexed(indexed, decode=True)),
+                os.path.getsize(indexed),
+            ),
+            "columnar snapshot": (
+                best_of(options.runs, lambda: write_columnar(columnar, 1, book.data.values())),
+                best_of(options.runs, lambda: ColumnarReader(columnar)),
+                best_of(options.runs, lambda: read_columnar(columnar)),
+                os.path.getsize(columnar),
+            ),
+        }
+
+    pickle_save, pickle_load, _, _ = results["pickle"]
+    print(f"{options.contacts} contacts, best of {options.runs}")
+    for label, (save, load, decode, size) in results.items():
+        print(
+            f"{label:18} save {save:7.2f} s ({pickle_save / save:5.1f}x pickle), "
+            f"load {load:7.2f} s ({pickle_load / load:5.1f}x pickle), "
+            f"decode all {decode:7.2f} s ({pickle_load / decode:4.1f}x pickle), {size / 2 ** 20:7.1f} MB"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+"""
+Time of the dedupe command (dedupe.py) on a generated book with near-duplicate
+contacts mixed in, and how many of them it finds, with the scoring on 1 and
+more worker processes.
+
+    python benchmarks/bench_dedupe.py --contacts 1000000 --duplicates 0.01 --workers 1 4
+"""
+import argparse, os, random, time
+
+from generator import generate_book
+from personal_assistant.address_book import Record
+from personal_assistant.dedupe import apply_merges, find_duplicates
+
+
+def variant(name, rng):
+    # The spellings a bulk sync leaves behind
+    return rng.choice([name.lower() + " ", name + " K.", name.upper(), f"{name} (work)"])
+
+
+def add_duplicates(book, share, seed=0):
+    """
+    Add a variant of share of the contacts, with one of their phones or emails,
+    return {variant name: original name}.
+    """
+    rng = random.Random(seed)
+    originals = rng.sample(list(book.data), int(len(book.data) * share))
+    duplicates = {}
+    for name in originals:
+        original = book.data[name]
+        record = Record(variant(name, rng))
+        if record.name.value in book.data:
+            continue
+        if original.emails and rng.random() < 0.5:
+            record.add_email(next(iter(original.emails)).value)
+        elif original.phones:
+            record.add_phone(next(iter(original.phones)).value)
+        book.add_record(record)
+        duplicates[record.name.value] = name
+    return duplicates
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--contacts", type=int, default=100000)
+    parser.add_argument("--duplicates", type=float, default=0.01, help="share of the contacts duplicated")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, os.cpu_count() or 1])
+    parser.add_argument("--threshold", type=float, default=0.8)
+    options = parser.parse_args()
+
+    book = generate_book(options.contacts)
+    duplicates = add_duplicates(book, options.duplicates)
+    print(f"{len(book.data)} contacts, {len(duplicates)} of them duplicates, {os.cpu_count()} CPUs")
+
+    for workers in sorted(set(options.workers)):
+        start = time.perf_counter()
+        report = find_duplicates(book, options.threshold, workers=workers)
+        seconds = time.perf_counter() - start
+        stages = ", ".join(f"{stage} {stage_seconds:.1f} s" for stage, stage_seconds in report.seconds.items())
+        print(f"{workers} workers: {seconds:.1f} s ({stages}), {report.candidates} candidate pairs")
+
+    group_of = {}
+    for kept, merged in report.groups:
+        for name, _ in merged:
+            group_of[name] = kept
+    found = sum(
+        1 for name, original in duplicates.items() if group_of.get(name) == original or group_of.get(original) == name
+    )
+    merged = sum(len(merged) for _, merged in report.groups)
+    print(f"found {found} of {len(duplicates)} duplicates, {merged - found} other contacts would be merged")
+
+    start = time.perf_counter()
+    apply_merges(book, report)
+    print(f"apply: {time.perf_counter() - start:.1f} s, {len(book.data)} contacts left")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,52 @@
+"""
+Scaling of queries across many address books (federation.py) with the number
+of worker processes, against reading the books one after another.
+
+    python benchmarks/bench_federation.py --books 16 --contacts 50000 --workers 1 2 4 8
+"""
+import argparse, os, tempfile, time
+
+from generator import generate_book
+from personal_assistant.federation import federated_query
+
+
+QUERIES = [("birthdays", 7), ("search-note", "Trip 1"), ("search-contact", "Anna Brown")]
+
+
+def timed_query(filenames, query, arg, workers):
+    start = time.perf_counter()
+    first = None
+    for _ in federated_query(filenames, query, arg, workers=workers):
+        if first is None:
+            first = time.perf_counter() - start
+    return time.perf_counter() - start, first
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--books", type=int, default=8)
+    parser.add_argument("--contacts", type=int, default=20000, help="contacts per book")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, os.cpu_count() or 1])
+    options = parser.parse_args()
+    print(f"{options.books} books of {options.contacts} contacts, {os.cpu_count()} CPUs")
+
+    with tempfile.TemporaryDirectory() as directory:
+        filenames = []
+        for number in range(options.books):
+            filename = os.path.join(directory, f"team{number}.dat")
+            generate_book(options.contacts, seed=number).save_to_file(filename)
+            filenames.append(filename)
+
+        for query, arg in QUERIES:
+            serial = None
+            for workers in sorted(set(options.workers)):
+                seconds, first = timed_query(filenames, query, arg, workers)
+                serial = serial or seconds
+                print(
+                    f"{query:15} {workers:3} workers: {seconds * 1000:9.1f} ms, first book after "
+                    f"{first * 1000:8.1f} ms, speedup {serial / seconds:5.2f}x"
+                )
+
+
+if __name__ == "__main__":
+    main()
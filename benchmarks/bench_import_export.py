@@ -0,0 +1,31 @@
+"""
+Import and export throughput for CSV, JSON Lines and vCard, in contacts per second.
+
+    python benchmarks/bench_import_export.py --contacts 1000000
+"""
+import argparse, os, tempfile
+
+from common import timed
+from generator import generate_book
+from personal_assistant.address_book import AddressBook
+from personal_assistant.transfer import export_contacts, import_contacts
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--contacts", type=int, default=100000)
+    count = parser.parse_args().contacts
+    book = generate_book(count)
+    with tempfile.TemporaryDirectory() as directory:
+        for extension in ["csv", "jsonl", "vcf"]:
+            filename = os.path.join(directory, f"contacts.{extension}")
+            seconds, _ = timed(export_contacts, book, filename)
+            print(f"export {extension:5}: {count / seconds:10,.0f} contacts/s ({os.path.getsize(filename) / 2 ** 20:.0f} MB)")
+            for workers in sorted({1, os.cpu_count() or 1}):
+                seconds, report = timed(import_contacts, AddressBook(), filename, None, "skip", workers)
+                assert report.added == count, report
+                print(f"import {extension:5}: {count / seconds:10,.0f} contacts/s with {workers} workers")
+
+
+if __name__ == "__main__":
+    main()
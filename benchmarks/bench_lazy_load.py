@@ -0,0 +1,38 @@
+"""
+Time-to-prompt and memory of loading a book from a memory-mapped snapshot.
+
+    python benchmarks/bench_lazy_load.py --contacts 1000000
+"""
+import argparse, os, tempfile
+
+from common import rss_mb, timed
+from generator import generate_book
+from personal_assistant.address_book import AddressBook
+from personal_assistant.storage import JournalStorage
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--contacts", type=int, default=100000)
+    count = parser.parse_args().contacts
+    with tempfile.TemporaryDirectory() as directory:
+        filename = os.path.join(directory, "address_book.dat")
+        generated = generate_book(count)
+        name = list(generated.data)[count // 2]
+        seconds, _ = timed(JournalStorage(filename).compact, generated.data)
+        del generated
+        print(f"{count} contacts, snapshot {os.path.getsize(filename) / 2 ** 20:.1f} MB written in {seconds:.2f} s")
+
+        rss_before = rss_mb()
+        book = AddressBook()
+        seconds, _ = timed(book.load_from_file, filename)
+        print(f"load:      {seconds * 1000:8.2f} ms, RSS +{rss_mb() - rss_before:.1f} MB")
+
+        seconds, record = timed(book.find, name)
+        print(f"first find:{seconds * 1000:8.3f} ms ({record.name})")
+        seconds, _ = timed(book.find, name)
+        print(f"next find: {seconds * 1000:8.3f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+"""
+Bytes per contact of the slotted Record model against the previous layout
+(__dict__ per object, lists, birthday kept as a string).
+
+    python benchmarks/bench_memory.py --contacts 100000
+"""
+import argparse, re, tracemalloc
+
+from generator import generate_records
+
+
+class LegacyField:
+    def __init__(self, value):
+        self.value = value
+
+
+class LegacyNote:
+    def __init__(self, title, note):
+        self.title = title
+        self.note = note
+
+
+class LegacyRecord:
+    def __init__(self, name):
+        self.name = LegacyField(name)
+        self.phones = []
+        self.emails = []
+        self.notes = []
+        self.address = None
+
+
+def legacy_record(record):
+    # The same contact in the previous layout, the generated Record is dropped
+    legacy = LegacyRecord(record.name.value)
+    for phone in record.phones:
+        re.match(r"^\d{10}$", phone.value)
+        legacy.phones.append(LegacyField(phone.value))
+    legacy.emails.extend(LegacyField(email.value) for email in record.emails)
+    if hasattr(record, "birthday"):
+        legacy.birthday = LegacyField(record.birthday.value)
+    if record.address is not None:
+        legacy.address = LegacyField(record.address.value)
+    legacy.notes.extend(LegacyNote(note.title, note.note) for note in record.notes)
+    return legacy
+
+
+def bytes_per_contact(convert, count):
+    # What is left of count generated contacts once converted, strings included
+    tracemalloc.start()
+    records = [convert(record) for record in generate_records(count)]
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del records
+    return size / count
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--contacts", type=int, default=100000)
+    count = parser.parse_args().contacts
+    before = bytes_per_contact(legacy_record, count)
+    after = bytes_per_contact(lambda record: record, count)
+    print(f"{count} contacts")
+    print(f"before: {before:7.0f} bytes per contact")
+    print(f"after:  {after:7.0f} bytes per contact ({1 - after / before:.0%} less)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+"""
+Cost of the statistics collection: the same command mix run with metrics off and
+on, in memory and with a commit after every command like the prompt does.
+
+    python benchmarks/bench_metrics.py --contacts 100000 --rounds 5
+"""
+import argparse, os, tempfile, time
+
+from generator import WORDS, generate_book
+from personal_assistant.metrics import metrics
+from personal_assistant.storage import JournalStorage
+from personal_assistant.personal_assistant import run_command
+import personal_assistant.personal_assistant as cli
+
+
+def commands(book):
+    words = WORDS
+    records = list(book.data.values())
+    for i in range(0, len(records), max(1, len(records) // 200)):
+        record = records[i]
+        name = record.name.value
+        yield "show-phones", [name]
+        yield "find-by-phone", [next(iter(record.phones)).value]
+        if record.emails:
+            yield "find-by-email", [next(iter(record.emails)).value]
+        yield "search-contact", [name[:8]]
+        yield "search-note", [words[i % len(words)]]
+        yield "add-email", [name, f"extra{i}@example.com"]
+        yield "remove-email", [name, f"extra{i}@example.com"]
+
+
+def run(book, mix, commit=False):
+    start = time.perf_counter()
+    for command, args in mix:
+        run_command(book, command, args)
+        if commit:
+            book.commit()
+    return time.perf_counter() - start
+
+
+def compare(label, book, mix, rounds, commit=False):
+    # Off and on take turns so both see the same machine load, the best round counts
+    off = on = float("inf")
+    for _ in range(rounds):
+        metrics.enabled = False
+        off = min(off, run(book, mix, commit))
+        metrics.enabled = True
+        on = min(on, run(book, mix, commit))
+    print(
+        f"{label:12} off {off * 1000:9.2f} ms, on {on * 1000:9.2f} ms: "
+        f"{(on - off) / off:+.2%}, {(on - off) / len(mix) * 1e6:+.2f} us a command"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--contacts", type=int, default=10000)
+    parser.add_argument("--rounds", type=int, default=5)
+    options = parser.parse_args()
+    count, rounds = options.contacts, options.rounds
+    cli.batch_mode = True
+    book = generate_book(count)
+    mix = list(commands(book))
+    # Build the indexes before timing anything
+    run(book, mix)
+
+    print(f"{len(mix)} commands on {count} contacts, best of {rounds}")
+    compare("in memory", book, mix, rounds)
+    with tempfile.TemporaryDirectory() as directory:
+        book.storage = JournalStorage(os.path.join(directory, "address_book.dat"))
+        book.save_to_file(book.storage.filename)
+        compare("commit each", book, mix, rounds, commit=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+"""
+Cost of the birthday reminder scheduler (reminders.py): setting it up, firing a
+year of reminders day by day, keeping it current while birthdays are added and
+contacts deleted, and posting reminders to a local webhook stand-in.
+
+    python benchmarks/bench_reminders.py --contacts 1000000 --lead-times 7 1 0
+"""
+from datetime import date, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import argparse, threading, time
+
+from generator import generate_book
+from personal_assistant.address_book import Record
+from personal_assistant.reminders import ReminderScheduler, webhook
+
+
+class WebhookStandIn(BaseHTTPRequestHandler):
+    received = 0
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers["Content-Length"]))
+        WebhookStandIn.received += 1
+        self.send_response(204)
+        self.end_headers()
+
+    def log_message(self, *args):
+        pass
+
+
+def timed(func):
+    start = time.perf_counter()
+    result = func()
+    return time.perf_counter() - start, result
+
+
+def edits(book, count):
+    # Half new contacts with a birthday, half deletions
+    names = list(book.data)[:count // 2]
+    start = time.perf_counter()
+    for i in range(count // 2):
+        record = Record(f"Reminder benchmark {i}")
+        record.add_birthday(f"{i % 28 + 1:02d}.{i % 12 + 1:02d}.1990")
+        book.add_record(record)
+        book.delete(names[i])
+    return (time.perf_counter() - start) / count
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--contacts", type=int, default=100000)
+    parser.add_argument("--lead-times", type=int, nargs="+", default=[7, 1, 0])
+    parser.add_argument("--edits", type=int, default=20000)
+    parser.add_argument("--posts", type=int, default=200)
+    options = parser.parse_args()
+
+    today = date.today()
+    book = generate_book(options.contacts)
+    names = [0]
+
+    def count_names(reminder):
+        names[0] += len(reminder["names"])
+
+    seconds, scheduler = timed(lambda: ReminderScheduler(book, options.lead_times, [count_names], today=today))
+    print(f"{options.contacts} contacts, lead times {options.lead_times}")
+    print(f"set up: {seconds * 1000:.2f} ms, {len(scheduler.heap)} timeline entries")
+    seconds, _ = timed(lambda: scheduler.timeline(30, today=today))
+    print(f"first timeline of 30 days (builds the birthday index): {seconds * 1000:.1f} ms")
+
+    fired = 0
+    start = time.perf_counter()
+    for offset in range(365):
+        fired += scheduler.fire_due(today + timedelta(days=offset))
+    seconds = time.perf_counter() - start
+    print(f"a year day by day: {seconds * 1000:.1f} ms, {fired} reminders of {names[0]} names")
+
+    other = generate_book(options.contacts, seed=1)
+    # With its birthday index built too, so only the scheduler differs
+    other.birthdays_on(today)
+    without = edits(other, options.edits)
+    with_scheduler = edits(book, options.edits)
+    print(f"add/delete: {without * 1e6:.2f} us without, {with_scheduler * 1e6:.2f} us with the scheduler")
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), WebhookStandIn)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    post = webhook(f"http://127.0.0.1:{server.server_address[1]}/reminders")
+    reminder = {"date": today, "days_before": 1, "names": list(book.data)[:20]}
+    seconds, _ = timed(lambda: [post(reminder) for _ in range(options.posts)])
+    server.shutdown()
+    print(f"webhook stand-in: {seconds / options.posts * 1000:.2f} ms per post, {WebhookStandIn.received} received")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,33 @@
+"""
+search-contact prefix and fuzzy lookups through the name index.
+
+    python benchmarks/bench_search_contact.py --contacts 1000000
+"""
+import argparse
+
+from common import timed
+from generator import generate_book
+
+
+def typo(text, position):
+    # Two letters swapped, the most common slip
+    return text[:position] + text[position + 1] + text[position] + text[position + 2:]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--contacts", type=int, default=100000)
+    count = parser.parse_args().contacts
+    book = generate_book(count)
+    # The index is built by the first search
+    seconds, _ = timed(book.search_contacts, "")
+    print(f"{count} contacts, index build {seconds * 1000:.0f} ms")
+    name = list(book.data)[count // 2]
+    # Prefix, whole name in lower case, and two misspelled ones
+    for query in [name[:len(name) - 2], name.lower(), typo(name, 2), typo(name[:len(name) - 2], len(name) // 2)]:
+        seconds, records = timed(book.search_contacts, query)
+        print(f"{query!r:18} {seconds * 1000:8.3f} ms, best: {records[0].name if records else None}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,41 @@
+"""
+search-note through the note index against a scan of every note.
+
+    python benchmarks/bench_search_note.py --contacts 100000 --notes 5
+"""
+import argparse
+
+from common import timed
+from generator import generate_book
+
+
+def full_scan(book, title):
+    return [
+        (note.title, note.note, record.name.value)
+        for record in book.data.values() for note in record.notes if note.title == title
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--contacts", type=int, default=100000)
+    parser.add_argument("--notes", type=int, default=5, help="notes added to every contact")
+    options = parser.parse_args()
+    count = options.contacts
+    book = generate_book(count)
+    for i, record in enumerate(book.data.values()):
+        for j in range(1, options.notes + 1):
+            record.add_note(f"Note {i % 1000}-{j}", f"Order {i} shipped to warehouse {j}")
+    print(f"{count} contacts, {sum(len(record.notes) for record in book.data.values())} notes")
+
+    seconds, _ = timed(full_scan, book, "Note 7-1")
+    print(f"full scan:       {seconds * 1000:9.3f} ms")
+    seconds, _ = timed(book.search_note, "Note 7-1")
+    print(f"index build:     {seconds * 1000:9.3f} ms")
+    for query in ["Note 7-1", "Note 99", "warehouse 3"]:
+        seconds, matches = timed(book.search_note, query)
+        print(f"{query!r:16} {seconds * 1000:9.3f} ms, {len(matches)} matches")
+
+
+if __name__ == "__main__":
+    main()
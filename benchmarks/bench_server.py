@@ -0,0 +1,161 @@
+"""
+Load test of "run_personal_assistant serve" on localhost: latency percentiles and
+requests per second for a mix of reads and writes.
+
+    python benchmarks/bench_server.py --contacts 100000 --clients 32 --requests 20000 --writes 0.1
+"""
+import argparse, asyncio, json, os, random, signal, socket, subprocess, sys, tempfile, time
+
+from generator import generate_book
+from personal_assistant.storage import JournalStorage
+
+
+PACKAGE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "personal_assistant")
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def targets(book):
+    # (name, phone, email) of the contacts having an email, what the requests ask for
+    return [
+        (record.name.value, next(iter(record.phones)).value, next(iter(record.emails)).value)
+        for record in book.data.values() if record.emails
+    ]
+
+
+def read_request(rng, contacts):
+    name, phone, email = rng.choice(contacts)
+    return rng.choice([
+        ("show-phones", [name]),
+        ("find-by-phone", [phone]),
+        ("find-by-email", [email]),
+        ("search-contact", [name[:8]]),
+        ("birthdays", ["7"]),
+    ])
+
+
+def write_request(rng, contacts, n):
+    name, _, _ = rng.choice(contacts)
+    return rng.choice([
+        ("add-note", [name, f"Load {n}", "written by the load test"]),
+        ("add-email", [name, f"load{n}@example.com"]),
+    ])
+
+
+async def call(reader, writer, command, args):
+    body = json.dumps({"args": args}).encode()
+    writer.write(
+        f"POST /{command} HTTP/1.1\r\nHost: localhost\r\nContent-Type: application/json\r\n"
+        f"Content-Length: {len(body)}\r\n\r\n".encode() + body
+    )
+    status = int((await reader.readline()).split()[1])
+    length = 0
+    while (line := await reader.readline()) not in (b"\r\n", b""):
+        name, _, value = line.decode().partition(":")
+        if name.lower() == "content-length":
+            length = int(value)
+    await reader.readexactly(length)
+    return status
+
+
+async def client(port, seed, options, contacts, queue, latencies):
+    rng = random.Random(seed)
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    while True:
+        try:
+            n = queue.get_nowait()
+        except asyncio.QueueEmpty:
+            break
+        kind = "write" if rng.random() < options.writes else "read"
+        if kind == "write":
+            command, args = write_request(rng, contacts, n)
+        else:
+            command, args = read_request(rng, contacts)
+        start = time.perf_counter()
+        status = await call(reader, writer, command, args)
+        latencies[kind].append(time.perf_counter() - start)
+        if status != 200:
+            raise RuntimeError(f"{command} answered {status}")
+    writer.close()
+
+
+async def load(port, options, contacts):
+    queue = asyncio.Queue()
+    for n in range(options.requests):
+        queue.put_nowait(n)
+    latencies = {"read": [], "write": []}
+    start = time.perf_counter()
+    await asyncio.gather(*(client(port, seed, options, contacts, queue, latencies) for seed in range(options.clients)))
+    return time.perf_counter() - start, latencies
+
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p / 100))] if values else 0.0
+
+
+def report(seconds, latencies):
+    total = latencies["read"] + latencies["write"]
+    print(f"{len(total)} requests in {seconds:.2f} s, {len(total) / seconds:.0f} requests/s")
+    for kind, values in [("all", total), ("read", latencies["read"]), ("write", latencies["write"])]:
+        print(
+            f"  {kind:5} {len(values):7} requests   p50 {percentile(values, 50) * 1000:7.2f} ms"
+            f"   p99 {percentile(values, 99) * 1000:7.2f} ms"
+        )
+
+
+def wait_for_port(port, server, timeout=300):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if server.poll() is not None:
+            raise RuntimeError("The server exited before it was ready.")
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=1).close()
+            return
+        except OSError:
+            time.sleep(0.1)
+    raise RuntimeError("The server didn't start in time.")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--contacts", type=int, default=10000)
+    parser.add_argument("--clients", type=int, default=16)
+    parser.add_argument("--requests", type=int, default=5000)
+    parser.add_argument("--writes", type=float, default=0.1, help="share of write requests, 0 to 1")
+    parser.add_argument("--commit-interval", default="50", help="ms, passed on to the server")
+    parser.add_argument("--storage", choices=["file", "sqlite"], default="file")
+    options = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        book = generate_book(options.contacts)
+        contacts = targets(book)
+        JournalStorage(os.path.join(directory, "address_book.dat")).compact(book.data)
+        del book
+        port = free_port()
+        server = subprocess.Popen(
+            [
+                sys.executable, "-c", "from personal_assistant.personal_assistant import main; main()",
+                "serve", "--port", str(port), "--commit-interval", options.commit_interval,
+                "--storage", options.storage,
+            ],
+            cwd=directory, env={**os.environ, "PYTHONPATH": os.path.abspath(PACKAGE)}, stdout=subprocess.DEVNULL,
+        )
+        try:
+            wait_for_port(port, server)
+            print(
+                f"{options.contacts} contacts, {options.clients} clients, "
+                f"{options.writes:.0%} writes, {options.storage} storage"
+            )
+            report(*asyncio.run(load(port, options, contacts)))
+        finally:
+            server.send_signal(signal.SIGINT)
+            server.wait()
+
+
+if __name__ == "__main__":
+    main()
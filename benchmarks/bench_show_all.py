@@ -0,0 +1,24 @@
+"""
+Time to the first line and to a full page of the "all" table.
+
+    python benchmarks/bench_show_all.py --sizes 1000 100000
+"""
+import argparse
+
+from common import timed
+from generator import generate_book
+from personal_assistant.rendering import page_rows, record_row, render_table
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 100000])
+    for count in parser.parse_args().sizes:
+        book = generate_book(count)
+        seconds, _ = timed(next, render_table(map(record_row, book.data.values())))
+        page_seconds, _ = timed(list, render_table(page_rows(book.data, 3, 50)))
+        print(f"{count:>8} contacts: first line {seconds * 1000:7.2f} ms, page 3 of 50 {page_seconds * 1000:7.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,52 @@
+"""
+Load time and query latency of the SQLite backend next to the snapshot files.
+
+    python benchmarks/bench_sqlite.py --contacts 100000
+"""
+import argparse, os, tempfile
+
+from common import timed
+from generator import generate_book
+from personal_assistant.address_book import AddressBook
+from personal_assistant.sqlite_storage import SQLiteStorage, migrate_to_sqlite
+from personal_assistant.storage import JournalStorage
+
+
+def run(label, book, filename, name, phone):
+    seconds, _ = timed(book.load_from_file, filename)
+    print(f"{label}: load {seconds * 1000:8.2f} ms")
+    for query, func, args in [
+        ("find", book.find, (name,)),
+        ("birthdays 7", book.get_birthdays_days_interval, (7,)),
+        ("search-note", book.search_note, ("Meeting",)),
+        ("find-by-phone", book.find_by_phone, (phone,)),
+    ]:
+        seconds, _ = timed(func, *args)
+        print(f"  {query:14} {seconds * 1000:8.2f} ms")
+    record = book.find(name)
+    seconds, _ = timed(lambda: (record.add_email("bench@example.com"), book.commit()))
+    print(f"  {'edit + commit':14} {seconds * 1000:8.2f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--contacts", type=int, default=100000)
+    count = parser.parse_args().contacts
+    with tempfile.TemporaryDirectory() as directory:
+        filename = os.path.join(directory, "address_book.dat")
+        book = generate_book(count)
+        # A contact from the middle of the book, and its first phone
+        record = list(book.data.values())[count // 2]
+        name, phone = record.name.value, next(iter(record.phones)).value
+        JournalStorage(filename).compact(book.data)
+        del book, record
+        database = os.path.join(directory, "address_book.db")
+        seconds, _ = timed(migrate_to_sqlite, filename, database)
+        print(f"{count} contacts migrated to SQLite in {seconds:.2f} s")
+
+        run("file  ", AddressBook(), filename, name, phone)
+        run("sqlite", AddressBook(SQLiteStorage(database)), database, name, phone)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+"""
+Startup cost of the CLI, measured in fresh processes:
+
+- import time of the package, from "python -X importtime", with the slowest modules,
+- time to prompt: until the interactive prompt could be shown, with the book loaded,
+- time to first result: until a --batch run prints the answer to its first command.
+
+    python benchmarks/bench_startup.py --contacts 100000 --runs 10
+    python benchmarks/bench_startup.py --package /path/to/other/checkout/personal_assistant
+"""
+import argparse, os, statistics, subprocess, sys, tempfile, time
+
+from generator import generate_book
+from personal_assistant.storage import JournalStorage
+
+
+PACKAGE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "personal_assistant")
+
+# Stops right where the prompt would be shown, after importing what it needs
+TO_PROMPT = """
+import sys
+from personal_assistant import personal_assistant as cli
+
+def ready():
+    import prompt_toolkit.shortcuts, prompt_toolkit.completion
+    print("ready", flush=True)
+    sys.exit(0)
+
+cli.get_user_input = ready
+cli.main([])
+"""
+TO_FIRST_RESULT = "from personal_assistant.personal_assistant import main; main(['--batch'])"
+
+
+def import_times(env):
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import personal_assistant"],
+        env=env, capture_output=True, text=True, check=True,
+    )
+    # "import time: self [us] | cumulative | imported package"
+    times = {}
+    for line in result.stderr.splitlines()[1:]:
+        self_us, cumulative_us, module = line.split(":", 1)[1].split("|")
+        times[module.strip()] = (int(self_us), int(cumulative_us))
+    return times
+
+
+def time_to_line(command, env, directory, stdin=None, marker=None):
+    # Seconds from spawning the process to its first line of output, or the marker line
+    start = time.perf_counter()
+    process = subprocess.Popen(
+        command, env=env, cwd=directory, text=True,
+        stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
+    )
+    if stdin is not None:
+        process.stdin.write(stdin)
+    process.stdin.close()
+    for line in process.stdout:
+        if marker is None or line.strip() == marker:
+            break
+    seconds = time.perf_counter() - start
+    process.stdout.read()
+    process.wait()
+    return seconds
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--contacts", type=int, default=10000)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--package", default=PACKAGE, help="directory holding the personal_assistant package")
+    options = parser.parse_args()
+    env = {**os.environ, "PYTHONPATH": os.path.abspath(options.package)}
+
+    totals = []
+    for _ in range(options.runs):
+        times = import_times(env)
+        totals.append(sum(self_us for self_us, _ in times.values()))
+    print(f"import personal_assistant: {statistics.median(totals) / 1000:7.1f} ms (all modules, median)")
+    slowest = sorted(times.items(), key=lambda item: item[1][0], reverse=True)[:8]
+    for module, (self_us, cumulative_us) in slowest:
+        print(f"  {module:40} self {self_us / 1000:6.1f} ms, cumulative {cumulative_us / 1000:6.1f} ms")
+
+    with tempfile.TemporaryDirectory() as directory:
+        book = generate_book(options.contacts)
+        first_command = f'show-phones "{next(iter(book.data))}"\n'
+        JournalStorage(os.path.join(directory, "address_book.dat")).compact(book.data)
+        del book
+        prompt = [
+            time_to_line([sys.executable, "-c", TO_PROMPT], env, directory, marker="ready") for _ in range(options.runs)
+        ]
+        first_result = [
+            time_to_line([sys.executable, "-c", TO_FIRST_RESULT], env, directory, first_command)
+            for _ in range(options.runs)
+        ]
+    print(f"time to prompt ({options.contacts} contacts):       {statistics.median(prompt) * 1000:7.1f} ms (median)")
+    print(f"time to first result (--batch):      {statistics.median(first_result) * 1000:7.1f} ms (median)")
+
+
+if __name__ == "__main__":
+    main()
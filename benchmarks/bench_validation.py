@@ -0,0 +1,69 @@
+"""
+Per-item validation cost: the previous constructor checks (re.match with a
+string pattern, strptime) against the validation module and its column API.
+
+    python benchmarks/bench_validation.py --values 1000000
+"""
+from datetime import datetime
+import argparse, gc, re
+
+from common import timed
+from personal_assistant.validation import (
+    validate_birthday, validate_birthdays, validate_email, validate_emails, validate_phone, validate_phones,
+)
+
+
+def old_phone(value):
+    if not re.match(r"^\d{10}$", value):
+        raise ValueError("Invalid phone number format. Use a 10-digit number.")
+    return value
+
+
+def old_email(value):
+    if not re.match(r"[^@]+@[^@]+\.[^@]+", value):
+        raise ValueError("Invalid email format.")
+    return value
+
+
+def old_birthday(value):
+    if not re.match(r"^\d{2}\.\d{2}.\d{4}$", value):
+        raise ValueError("Invalid birthday format. Use DD.MM.YYYY.")
+    return datetime.strptime(value, "%d.%m.%Y").toordinal()
+
+
+def one_by_one(validate, values):
+    results = []
+    for value in values:
+        try:
+            results.append(validate(value))
+        except ValueError:
+            results.append(None)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--values", type=int, default=1000000, help="values per column")
+    count = parser.parse_args().values
+    columns = {
+        "phone": ([f"{i:010d}" if i % 100 else "12345" for i in range(count)], old_phone, validate_phone, validate_phones),
+        "email": ([f"contact{i}@example.com" for i in range(count)], old_email, validate_email, validate_emails),
+        "birthday": (
+            [f"{i % 28 + 1:02d}.{i % 12 + 1:02d}.{1950 + i % 50}" for i in range(count)],
+            old_birthday, validate_birthday, validate_birthdays,
+        ),
+    }
+    for name, (values, old, new, column) in columns.items():
+        gc.collect()
+        old_seconds, _ = timed(one_by_one, old, values)
+        new_seconds, _ = timed(one_by_one, new, values)
+        column_seconds, _ = timed(column, values)
+        print(
+            f"{name:8}: before {old_seconds / count * 1e9:6.0f} ns/item, "
+            f"validate_{name} {new_seconds / count * 1e9:6.0f} ns/item, "
+            f"column {column_seconds / count * 1e9:6.0f} ns/item"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+"""
+Deterministic synthetic address books: the same arguments always give the same
+contacts, so results of different runs and checkouts can be compared.
+
+    from generator import generate_book
+    book = generate_book(100000, seed=1, notes=(0, 5), birthdays="seasonal")
+"""
+from datetime import date, timedelta
+import calendar, random
+
+import common  # noqa: F401, puts the working tree on sys.path
+from personal_assistant.address_book import AddressBook, Record
+
+
+FIRST_NAMES = [
+    "Anna", "Bohdan", "Carlos", "Daria", "Emma", "Farid", "Greta", "Hiro", "Iryna", "Jonas", "Kateryna", "Liam",
+    "Maria", "Nadia", "Oleh", "Paula", "Quentin", "Roman", "Sofia", "Taras", "Uma", "Viktor", "Wiktoria", "Yusuf",
+    "Zoe", "Lisa", "Mark", "Olena", "Petro", "Rita",
+]
+LAST_NAMES = [
+    "Andrusenko", "Brown", "Chen", "Dubois", "Evans", "Fischer", "Garcia", "Horvath", "Ivanenko", "Jensen",
+    "Kovalenko", "Lopez", "Muller", "Nowak", "Olsen", "Petrenko", "Rossi", "Shevchenko", "Tkachenko", "Weber",
+]
+DOMAINS = ["example.com", "mail.test", "post.example.org", "inbox.test"]
+CITIES = ["Kyiv", "Lviv", "Odesa", "Kharkiv", "Dnipro", "Berlin", "Warsaw", "Lisbon"]
+STREETS = ["Peremohy ave", "Shevchenka st", "Main st", "Harbour rd", "Park lane", "Station sq"]
+NOTE_TITLES = ["Meeting", "Call", "Birthday gift", "Project", "Trip", "Recipe", "Books", "Ideas", "Shopping", "Todo"]
+WORDS = (
+    "call remind order cake roman meeting project deadline gift flowers ticket train hotel book "
+    "invoice report review dinner lunch coffee garden car repair doctor school lesson music"
+).split()
+# Share of birthdays per month for the seasonal distribution, summer and winter peaks
+SEASONAL_MONTHS = [7, 6, 8, 8, 9, 10, 11, 11, 10, 8, 7, 7]
+
+
+def random_birthday(rng, distribution):
+    if distribution == "seasonal":
+        month = rng.choices(range(1, 13), SEASONAL_MONTHS)[0]
+        year = rng.randint(1940, 2010)
+        return date(year, month, rng.randint(1, calendar.monthrange(year, month)[1]))
+    # Uniform over the whole range, 29 February included
+    return date(1940, 1, 1) + timedelta(days=rng.randrange((date(2010, 12, 31) - date(1940, 1, 1)).days + 1))
+
+
+def generate_records(count, seed=0, phones=(1, 2), emails=(0, 2), notes=(0, 3), birthday_share=0.8,
+                     birthdays="uniform", address_share=0.5, start=0):
+    """
+    Yield count Records. phones, emails and notes are (min, max) per contact,
+    birthday_share and address_share the part of the contacts having one,
+    birthdays "uniform" or "seasonal". Names end with a running number from
+    start on, so they are unique.
+    """
+    rng = random.Random(seed)
+    for i in range(start, start + count):
+        first, last = rng.choice(FIRST_NAMES), rng.choice(LAST_NAMES)
+        record = Record(f"{first} {last} {i}")
+        for _ in range(rng.randint(*phones)):
+            record.add_phone(str(rng.randrange(10 ** 9, 10 ** 10)))
+        for k in range(rng.randint(*emails)):
+            record.add_email(f"{first}.{last}{i}{'.' + str(k) if k else ''}@{rng.choice(DOMAINS)}".lower())
+        if rng.random() < birthday_share:
+            record.add_birthday(random_birthday(rng, birthdays).strftime("%d.%m.%Y"))
+        if rng.random() < address_share:
+            record.add_address(f"{rng.choice(CITIES)}, {rng.choice(STREETS)} {rng.randint(1, 200)}")
+        for k in range(rng.randint(*notes)):
+            text = " ".join(rng.choice(WORDS) for _ in range(rng.randint(4, 12)))
+            record.add_note(f"{rng.choice(NOTE_TITLES)} {k + 1}", text)
+        yield record
+
+
+def generate_book(count, seed=0, **options):
+    book = AddressBook()
+    for record in generate_records(count, seed, **options):
+        book.add_record(record)
+    return book
@@ -0,0 +1,103 @@
+"""
+Several processes editing the same address_book.dat at once.
+
+Every worker adds its own contacts and phones, deletes and adds back some of
+them, commits often, compacts now and then (a small compaction threshold forces
+it) and also adds notes to a contact all of them share. At the end a fresh load
+has to hold every contact and phone of every worker, each contact once; edits
+to the shared contact may be merged over each other.
+
+    python benchmarks/stress_multiprocess.py --workers 8 --operations 300
+"""
+import argparse, multiprocessing, os, random, sys, tempfile, time
+
+import common  # noqa: F401, puts the working tree on sys.path
+from personal_assistant.address_book import AddressBook, Record
+from personal_assistant.storage import JournalStorage
+
+
+SHARED = "Shared contact"
+
+
+def worker(filename, number, operations, seed):
+    rng = random.Random(seed)
+    book = AddressBook(JournalStorage(filename, min_compact_size=16 * 1024, fsync=False))
+    book.load_from_file(filename)
+    conflicts = 0
+    for i in range(operations):
+        book.sync()
+        name = f"Worker {number} contact {i // 3}"
+        if i % 3 == 0:
+            book.add_record(Record(name))
+        else:
+            book.find(name).add_phone(f"{number:02d}{i:08d}")
+        if i >= 3 and rng.random() < 0.1:
+            # Most likely in the snapshot by now, deleted and added back it is still one contact
+            earlier = f"Worker {number} contact {rng.randrange(i // 3)}"
+            record = book.find(earlier)
+            book.delete(earlier)
+            book.add_record(record)
+        if rng.random() < 0.2 and book.find(SHARED) is not None:
+            book.find(SHARED).add_note(f"Worker {number} note {i}", "shared edit")
+        if rng.random() < 0.05:
+            conflicts += len(book.save_to_file(filename))
+        elif rng.random() < 0.7:
+            conflicts += len(book.commit())
+    conflicts += len(book.save_to_file(filename))
+    return conflicts
+
+
+def expected(number, operations):
+    contacts = {}
+    for i in range(operations):
+        name = f"Worker {number} contact {i // 3}"
+        phones = contacts.setdefault(name, set())
+        if i % 3:
+            phones.add(f"{number:02d}{i:08d}")
+    return contacts
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--workers", type=int, default=8)
+    parser.add_argument("--operations", type=int, default=300)
+    options = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        filename = os.path.join(directory, "address_book.dat")
+        book = AddressBook()
+        book.add_record(Record(SHARED))
+        book.save_to_file(filename)
+
+        start = time.perf_counter()
+        with multiprocessing.Pool(options.workers) as pool:
+            conflicts = pool.starmap(
+                worker, [(filename, number, options.operations, number) for number in range(options.workers)]
+            )
+        seconds = time.perf_counter() - start
+
+        book = AddressBook()
+        book.load_from_file(filename)
+        missing = 0
+        names = list(book.data)
+        duplicated = len(names) - len(set(names))
+        for number in range(options.workers):
+            for name, phones in expected(number, options.operations).items():
+                record = book.find(name)
+                found = {phone.value for phone in record.phones} if record else set()
+                missing += record is None
+                missing += len(phones - found)
+        shared_notes = len(book.find(SHARED).notes)
+        print(
+            f"{options.workers} workers x {options.operations} operations in {seconds:.2f} s, "
+            f"{len(book.data)} contacts, {shared_notes} notes on the shared contact, "
+            f"{sum(conflicts)} conflicting merges"
+        )
+        if missing or duplicated or len(book.data) != len(set(names)):
+            print(f"FAILED: {missing} contacts or phones lost, {duplicated} contacts listed twice")
+            sys.exit(1)
+        print("OK: no contact or phone lost or listed twice")
+
+
+if __name__ == "__main__":
+    main()
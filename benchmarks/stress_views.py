@@ -0,0 +1,178 @@
+"""
+Reader threads scanning the whole book while writer threads edit it and a
+committer thread saves and compacts it, as a server or the background writer
+would.
+
+Writers keep three invariants, each in one step under the write lock: the
+number of contacts (a contact is removed for every one added), a set of token
+phones each held by exactly one contact (a token moves by a remove_phone and
+an add_phone), and two contacts whose "Version" notes are always equal.
+Readers check them on every scan. With views (the default) a reader takes a
+snapshot under the lock and scans it without the lock; with --live it scans
+book.data unlocked like the commands used to, which fails.
+
+    python benchmarks/stress_views.py --contacts 20000 --readers 4 --writers 2 --seconds 10
+"""
+from collections import Counter
+import argparse, os, random, statistics, sys, tempfile, threading, time
+
+from generator import generate_book
+from personal_assistant.address_book import AddressBook, Record
+from personal_assistant.storage import JournalStorage
+
+
+TOKENS = 50
+# Token phones are 09xxxxxxxx, below the generated ones
+TOKEN_BASE = 900000000
+PAIR = ("Version A", "Version B")
+
+
+class Stress:
+    def __init__(self, book, seed):
+        self.book = book
+        self.lock = threading.RLock()
+        self.stop = threading.Event()
+        self.rng = random.Random(seed)
+        self.names = [name for name in book.data if name not in PAIR]
+        self.owners = {}
+        self.version = 0
+        self.churn = 0
+        self.writes = 0
+        self.scans = 0
+        self.snapshot_seconds = []
+        self.violations = Counter()
+
+    def setup(self):
+        for name in PAIR:
+            record = Record(name)
+            record.add_note("Version", "0")
+            self.book.add_record(record)
+        for token in range(TOKENS):
+            owner = self.rng.choice(self.names)
+            self.book.find(owner).add_phone(f"{TOKEN_BASE + token:010d}")
+            self.owners[token] = owner
+        self.contacts = len(self.book.data)
+
+    def write_once(self):
+        with self.lock:
+            kind = self.rng.random()
+            if kind < 0.4:
+                token = self.rng.randrange(TOKENS)
+                phone = f"{TOKEN_BASE + token:010d}"
+                old, new = self.owners[token], self.rng.choice(self.names)
+                if old != new:
+                    self.book.find(old).remove_phone(phone)
+                    self.book.find(new).add_phone(phone)
+                    self.owners[token] = new
+            elif kind < 0.7:
+                self.version += 1
+                for name in PAIR:
+                    self.book.find(name).edit_note("Version", str(self.version))
+            else:
+                position = self.rng.randrange(len(self.names))
+                name = self.names[position]
+                if name in self.owners.values():
+                    return
+                self.book.delete(name)
+                self.churn += 1
+                record = Record(f"Churn {self.churn}")
+                record.add_phone(f"{1000000000 + self.churn:010d}")
+                self.book.add_record(record)
+                self.names[position] = record.name.value
+            self.writes += 1
+
+    def writer(self):
+        while not self.stop.is_set():
+            self.write_once()
+
+    def committer(self):
+        while not self.stop.wait(0.05):
+            with self.lock:
+                self.book.commit()
+
+    def check(self, records):
+        contacts, tokens, versions = 0, Counter(), {}
+        for record in records:
+            contacts += 1
+            for phone in record.phones:
+                if TOKEN_BASE <= phone._value < TOKEN_BASE + TOKENS:
+                    tokens[phone._value] += 1
+            if record.name.value in PAIR:
+                versions[record.name.value] = record.find_note("Version").note
+        if contacts != self.contacts:
+            self.violations["contact count"] += 1
+        if len(tokens) != TOKENS or any(count != 1 for count in tokens.values()):
+            self.violations["token phones"] += 1
+        if len(set(versions.values())) != 1:
+            self.violations["version notes"] += 1
+
+    def reader(self, live):
+        while not self.stop.is_set():
+            try:
+                if live:
+                    self.check(self.book.data.values())
+                else:
+                    with self.lock:
+                        start = time.perf_counter()
+                        view = self.book.snapshot()
+                        self.snapshot_seconds.append(time.perf_counter() - start)
+                    self.check(view.values())
+                    del view
+            except (RuntimeError, KeyError) as e:
+                # A scan of the live book meeting a change under way
+                self.violations[f"{type(e).__name__}: {e}" if isinstance(e, KeyError) else str(e)] += 1
+            self.scans += 1
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--contacts", type=int, default=20000)
+    parser.add_argument("--readers", type=int, default=4)
+    parser.add_argument("--writers", type=int, default=2)
+    parser.add_argument("--seconds", type=float, default=10)
+    parser.add_argument("--live", action="store_true", help="scan book.data without views")
+    options = parser.parse_args()
+    # Switch threads often, so races show up within seconds
+    sys.setswitchinterval(1e-5)
+
+    with tempfile.TemporaryDirectory() as directory:
+        filename = os.path.join(directory, "address_book.dat")
+        generate_book(options.contacts, phones=(0, 1)).save_to_file(filename)
+        book = AddressBook(JournalStorage(filename, min_compact_size=64 * 1024, fsync=False))
+        book.load_from_file(filename)
+        stress = Stress(book, seed=1)
+        stress.setup()
+        start = time.perf_counter()
+        for _ in range(1000):
+            book.snapshot()
+        alone = (time.perf_counter() - start) / 1000
+
+        threads = [threading.Thread(target=stress.writer) for _ in range(options.writers)]
+        threads.append(threading.Thread(target=stress.committer))
+        threads += [threading.Thread(target=stress.reader, args=(options.live,)) for _ in range(options.readers)]
+        for thread in threads:
+            thread.start()
+        time.sleep(options.seconds)
+        stress.stop.set()
+        for thread in threads:
+            thread.join()
+
+    print(
+        f"{options.readers} readers, {options.writers} writers, {options.seconds:.0f} s: "
+        f"{stress.scans} scans of {stress.contacts} contacts, {stress.writes} writes"
+    )
+    if stress.snapshot_seconds:
+        print(
+            f"snapshot: {alone * 1e6:.1f} us alone, under load "
+            f"median {statistics.median(stress.snapshot_seconds) * 1e6:.1f} us, "
+            f"max {max(stress.snapshot_seconds) * 1e6:.1f} us (waiting for views_lock)"
+        )
+    if stress.violations:
+        for what, count in stress.violations.most_common():
+            print(f"FAILED: {count} scans: {what}")
+        sys.exit(1)
+    print("OK: every scan saw a consistent book")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,633 @@
+"""
+Benchmark suite over the AddressBook and Record operations plus load and save,
+on generated books (see generator.py).
+
+    python benchmarks/suite.py --sizes 1000 100000 1000000 --output results.json
+    python benchmarks/suite.py --sizes 1000 100000 --compare results.json --threshold 0.25
+
+Every result is the time per operation, best of --repeat runs. With --compare,
+an operation slower than in the baseline file by more than the threshold is a
+regression and the run exits with status 1.
+"""
+from datetime import datetime
+import argparse, json, os, platform, random, re, sys, tempfile, time
+
+from generator import generate_book, generate_records
+from personal_assistant.address_book import AddressBook
+from personal_assistant.indexes import AddressIndex, BirthdayIndex, EmailIndex, NameIndex, NoteIndex, PhoneIndex
+from personal_assistant.rendering import page_rows, record_row, render_table
+from personal_assistant.storage import JournalStorage, PickleStorage
+
+
+RESULTS_VERSION = 1
+SAMPLE_SIZE = 1000
+
+# name -> setup(context) returning (run, operations) or (run, operations, teardown)
+BENCHMARKS = {}
+
+
+def benchmark(name):
+    def register(setup):
+        BENCHMARKS[name] = setup
+        return setup
+    return register
+
+
+class Context:
+    def __init__(self, book, size, seed, directory):
+        self.book = book
+        self.size = size
+        self.seed = seed
+        self.directory = directory
+        rng = random.Random(seed)
+        self.records = rng.sample(list(book.data.values()), min(SAMPLE_SIZE, size))
+        self.names = [record.name.value for record in self.records]
+        self.runs = 0
+        self.snapshot = None
+
+    def with_(self, predicate):
+        return [record for record in self.records if predicate(record)]
+
+    def snapshot_file(self):
+        # Written once per size, the load benchmarks read it
+        if self.snapshot is None:
+            self.snapshot = os.path.join(self.directory, "snapshot.dat")
+            JournalStorage(self.snapshot).compact(self.book.data)
+        return self.snapshot
+
+
+def first(fields):
+    return next(iter(fields))
+
+
+def last(fields):
+    # The field a scan finds last
+    *_, field = fields
+    return field
+
+
+def warmed(context, run):
+    # The first query builds the index, index_build.* times that, the results
+    # it cached are dropped, *.cached time the cache
+    run()
+    context.book.cache.clear()
+    return run
+
+
+def ignore_errors(func, *args):
+    try:
+        func(*args)
+    except ValueError:
+        pass
+
+
+# AddressBook
+
+@benchmark("book.add_record")
+def bench_add_record(context):
+    records = list(generate_records(len(context.records), context.seed + 1, start=10 ** 9))
+
+    def run():
+        for record in records:
+            context.book.add_record(record)
+
+    def teardown():
+        for record in records:
+            context.book.delete(record.name.value)
+
+    return run, len(records), teardown
+
+
+@benchmark("book.find")
+def bench_find(context):
+    def run():
+        for name in context.names:
+            context.book.find(name)
+
+    return run, len(context.names)
+
+
+@benchmark("book.delete")
+def bench_delete(context):
+    def run():
+        for name in context.names:
+            context.book.delete(name)
+
+    def teardown():
+        for record in context.records:
+            context.book.add_record(record)
+
+    return run, len(context.names), teardown
+
+
+@benchmark("book.search_contacts")
+def bench_search_contacts(context):
+    # Half prefixes, half misspelled names for the fuzzy match
+    queries = [name[:len(name) // 2] for name in context.names[:50]]
+    queries += [name[1] + name[0] + name[2:] for name in context.names[50:100]]
+
+    def run():
+        for query in queries:
+            context.book.search_contacts(query)
+
+    return warmed(context, run), len(queries)
+
+
+@benchmark("book.find_by_phone")
+def bench_find_by_phone(context):
+    phones = [first(record.phones).value for record in context.with_(lambda record: record.phones)]
+
+    def run():
+        for phone in phones:
+            context.book.find_by_phone(phone)
+
+    return warmed(context, run), len(phones)
+
+
+@benchmark("book.find_by_email")
+def bench_find_by_email(context):
+    emails = [first(record.emails).value.upper() for record in context.with_(lambda record: record.emails)]
+
+    def run():
+        for email in emails:
+            context.book.find_by_email(email)
+
+    return warmed(context, run), len(emails)
+
+
+@benchmark("book.find_by_address")
+def bench_find_by_address(context):
+    addresses = [record.address.value for record in context.with_(lambda record: record.address)][:100]
+
+    def run():
+        for address in addresses:
+            context.book.find_by_address(address)
+
+    return warmed(context, run), len(addresses)
+
+
+@benchmark("book.search_note")
+def bench_search_note(context):
+    queries = []
+    for record in context.with_(lambda record: record.notes)[:100]:
+        note = first(record.notes)
+        # Exact title, title prefix and two words of the note
+        queries += [note.title, note.title[:4], " ".join(note.note.split()[:2])]
+
+    def run():
+        for query in queries:
+            ignore_errors(context.book.search_note, query)
+
+    return warmed(context, run), len(queries)
+
+
+@benchmark("book.search_note.cached")
+def bench_search_note_cached(context):
+    run, operations = bench_search_note(context)
+    run()
+    return run, operations
+
+
+@benchmark("book.get_birthdays_days_interval")
+def bench_birthdays_interval(context):
+    def run():
+        for days in range(1, 21):
+            context.book.get_birthdays_days_interval(days)
+
+    return warmed(context, run), 20
+
+
+@benchmark("book.birthdays")
+def bench_birthdays(context):
+    def run():
+        for _ in range(10):
+            context.book.cache.clear()
+            context.book.birthdays(7)
+
+    return warmed(context, run), 10
+
+
+@benchmark("book.birthdays.cached")
+def bench_birthdays_cached(context):
+    def run():
+        for _ in range(10):
+            context.book.birthdays(7)
+
+    run()
+    return run, 10
+
+
+def bench_index_build(index_class):
+    def setup(context):
+        def run():
+            context.book._index(index_class)
+
+        context.book._indexes.pop(index_class, None)
+        return run, 1
+
+    return setup
+
+
+for index_class in [NameIndex, PhoneIndex, EmailIndex, AddressIndex, NoteIndex, BirthdayIndex]:
+    benchmark(f"index_build.{index_class.__name__}")(bench_index_build(index_class))
+
+
+@benchmark("show_all.page")
+def bench_show_all_page(context):
+    pages = min(10, (context.size + 19) // 20)
+
+    def run():
+        for page in range(1, pages + 1):
+            for _ in render_table(page_rows(context.book.data, page, 20)):
+                pass
+
+    return run, pages
+
+
+@benchmark("show_all.full")
+def bench_show_all_full(context):
+    def run():
+        for _ in render_table(map(record_row, context.book.data.values())):
+            pass
+
+    return run, context.size
+
+
+# Record
+
+@benchmark("record.add_phone")
+def bench_add_phone(context):
+    def run():
+        for i, record in enumerate(context.records):
+            record.add_phone(f"{9000000000 + i}")
+
+    def teardown():
+        for i, record in enumerate(context.records):
+            record.remove_phone(f"{9000000000 + i}")
+
+    return run, len(context.records), teardown
+
+
+@benchmark("record.edit_phone")
+def bench_edit_phone(context):
+    records = context.with_(lambda record: record.phones)
+    old_phones = [last(record.phones).value for record in records]
+
+    def run():
+        for i, (record, phone) in enumerate(zip(records, old_phones)):
+            record.edit_phone(phone, f"{9000000000 + i}")
+
+    def teardown():
+        for i, (record, phone) in enumerate(zip(records, old_phones)):
+            record.edit_phone(f"{9000000000 + i}", phone)
+
+    return run, len(records), teardown
+
+
+@benchmark("record.remove_phone")
+def bench_remove_phone(context):
+    for i, record in enumerate(context.records):
+        record.add_phone(f"{9000000000 + i}")
+
+    def run():
+        for i, record in enumerate(context.records):
+            record.remove_phone(f"{9000000000 + i}")
+
+    return run, len(context.records)
+
+
+@benchmark("record.show_phones")
+def bench_show_phones(context):
+    def run():
+        for record in context.records:
+            record.show_phones()
+
+    return run, len(context.records)
+
+
+@benchmark("record.add_birthday")
+def bench_add_birthday(context):
+    records = context.with_(lambda record: hasattr(record, "birthday"))
+    birthdays = [record.birthday.value for record in records]
+
+    def run():
+        for record in records:
+            record.add_birthday("29.02.2000")
+
+    def teardown():
+        for record, birthday in zip(records, birthdays):
+            record.add_birthday(birthday)
+
+    return run, len(records), teardown
+
+
+@benchmark("record.add_note")
+def bench_add_note(context):
+    def run():
+        for record in context.records:
+            record.add_note("Benchmark", "a note added by the benchmark suite")
+
+    def teardown():
+        for record in context.records:
+            record.remove_note("Benchmark")
+
+    return run, len(context.records), teardown
+
+
+@benchmark("record.find_note")
+def bench_find_note(context):
+    pairs = [(record, last(record.notes).title) for record in context.with_(lambda record: record.notes)]
+
+    def run():
+        for record, title in pairs:
+            record.find_note(title)
+
+    return run, len(pairs)
+
+
+@benchmark("record.edit_note")
+def bench_edit_note(context):
+    notes = [(record, last(record.notes)) for record in context.with_(lambda record: record.notes)]
+    pairs = [(record, note.title, note.note) for record, note in notes]
+
+    def run():
+        for record, title, _ in pairs:
+            record.edit_note(title, "edited by the benchmark suite")
+
+    def teardown():
+        for record, title, note in pairs:
+            record.edit_note(title, note)
+
+    return run, len(pairs), teardown
+
+
+@benchmark("record.remove_note")
+def bench_remove_note(context):
+    for record in context.records:
+        record.add_note("Benchmark", "a note removed by the benchmark suite")
+
+    def run():
+        for record in context.records:
+            record.remove_note("Benchmark")
+
+    return run, len(context.records)
+
+
+@benchmark("record.add_email")
+def bench_add_email(context):
+    def run():
+        for i, record in enumerate(context.records):
+            record.add_email(f"benchmark{i}@example.com")
+
+    def teardown():
+        for i, record in enumerate(context.records):
+            record.remove_email(f"benchmark{i}@example.com")
+
+    return run, len(context.records), teardown
+
+
+@benchmark("record.show_emails")
+def bench_show_emails(context):
+    def run():
+        for record in context.records:
+            record.show_emails()
+
+    return run, len(context.records)
+
+
+@benchmark("record.remove_email")
+def bench_remove_email(context):
+    for i, record in enumerate(context.records):
+        record.add_email(f"benchmark{i}@example.com")
+
+    def run():
+        for i, record in enumerate(context.records):
+            record.remove_email(f"benchmark{i}@example.com")
+
+    return run, len(context.records)
+
+
+@benchmark("record.add_address")
+def bench_add_address(context):
+    records = context.with_(lambda record: not record.address)
+
+    def run():
+        for record in records:
+            record.add_address("Kyiv, Benchmark st 1")
+
+    def teardown():
+        for record in records:
+            record.remove_address()
+
+    return run, len(records), teardown
+
+
+@benchmark("record.edit_address")
+def bench_edit_address(context):
+    records = context.with_(lambda record: record.address)
+    addresses = [record.address.value for record in records]
+
+    def run():
+        for record in records:
+            record.edit_address("Lviv, Benchmark st 2")
+
+    def teardown():
+        for record, address in zip(records, addresses):
+            record.edit_address(address)
+
+    return run, len(records), teardown
+
+
+@benchmark("record.remove_address")
+def bench_remove_address(context):
+    records = context.with_(lambda record: not record.address)
+    for record in records:
+        record.add_address("Kyiv, Benchmark st 1")
+
+    def run():
+        for record in records:
+            record.remove_address()
+
+    return run, len(records)
+
+
+# Load and save
+
+@benchmark("storage.save_snapshot")
+def bench_save_snapshot(context):
+    storage = JournalStorage(os.path.join(context.directory, "save.dat"))
+
+    def run():
+        storage.compact(context.book.data)
+
+    return run, context.size
+
+
+@benchmark("storage.load")
+def bench_load(context):
+    filename = context.snapshot_file()
+
+    def run():
+        AddressBook().load_from_file(filename)
+
+    return run, 1
+
+
+@benchmark("storage.load_all_records")
+def bench_load_all_records(context):
+    filename = context.snapshot_file()
+
+    def run():
+        book = AddressBook()
+        book.load_from_file(filename)
+        for _ in book.data.values():
+            pass
+
+    return run, context.size
+
+
+@benchmark("storage.commit")
+def bench_commit(context):
+    book = AddressBook()
+    book.load_from_file(context.snapshot_file())
+    context.runs += 1
+    records = [book.find(name) for name in context.names[:100]]
+
+    def run():
+        for i, record in enumerate(records):
+            record.add_email(f"commit{context.runs}.{i}@example.com")
+            book.commit()
+
+    return run, len(records)
+
+
+@benchmark("storage.pickle_save")
+def bench_pickle_save(context):
+    storage = PickleStorage(os.path.join(context.directory, "pickle.dat"))
+
+    def run():
+        storage.save(context.book.data)
+
+    return run, context.size
+
+
+@benchmark("storage.pickle_load")
+def bench_pickle_load(context):
+    storage = PickleStorage(os.path.join(context.directory, "pickle.dat"))
+    if not os.path.exists(storage.filename):
+        storage.save(context.book.data)
+
+    def run():
+        storage.load()
+
+    return run, context.size
+
+
+def run_benchmark(setup, context, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        prepared = setup(context)
+        run, operations = prepared[:2]
+        start = time.perf_counter()
+        run()
+        best = min(best, time.perf_counter() - start)
+        if len(prepared) > 2:
+            prepared[2]()
+    return {"us_per_op": best / max(operations, 1) * 1e6, "operations": operations, "seconds": best}
+
+
+def run_suite(options):
+    pattern = re.compile(options.only) if options.only else None
+    generator_options = {
+        "phones": tuple(options.phones), "emails": tuple(options.emails), "notes": tuple(options.notes),
+        "birthday_share": options.birthday_share, "birthdays": options.birthdays,
+    }
+    results = {}
+    for size in options.sizes:
+        start = time.perf_counter()
+        book = generate_book(size, options.seed, **generator_options)
+        print(f"{size} contacts generated in {time.perf_counter() - start:.1f} s", file=sys.stderr)
+        results[str(size)] = {}
+        with tempfile.TemporaryDirectory() as directory:
+            context = Context(book, size, options.seed, directory)
+            for name, setup in BENCHMARKS.items():
+                if pattern and not pattern.search(name):
+                    continue
+                result = run_benchmark(setup, context, options.repeat)
+                results[str(size)][name] = result
+                print(f"  {name:40} {result['us_per_op']:12.3f} us/op", file=sys.stderr)
+    return {
+        "version": RESULTS_VERSION,
+        "meta": {
+            "date": datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "seed": options.seed,
+            "repeat": options.repeat,
+            "generator": generator_options,
+        },
+        "results": results,
+    }
+
+
+def compare(results, baseline, threshold, min_seconds):
+    """
+    Return the regressions as (size, name, baseline us/op, new us/op). Timings
+    under min_seconds in both runs are too short to compare and skipped.
+    """
+    regressions = []
+    for size, benchmarks in results["results"].items():
+        for name, result in benchmarks.items():
+            old = baseline["results"].get(size, {}).get(name)
+            if old is None or max(old["seconds"], result["seconds"]) < min_seconds:
+                continue
+            ratio = result["us_per_op"] / old["us_per_op"] if old["us_per_op"] else 1.0
+            mark = "REGRESSION" if ratio > 1 + threshold else ""
+            print(
+                f"{size:>8} {name:40} {old['us_per_op']:12.3f} -> {result['us_per_op']:12.3f} us/op "
+                f"{ratio - 1:+8.1%} {mark}"
+            )
+            if mark:
+                regressions.append((size, name, old["us_per_op"], result["us_per_op"]))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark every address book operation on generated books.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 100000, 1000000])
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--only", metavar="REGEX", help="run the benchmarks whose name matches")
+    parser.add_argument("--output", metavar="FILE", help="write the results as JSON to FILE")
+    parser.add_argument("--compare", metavar="FILE", help="baseline results to check for regressions")
+    parser.add_argument("--threshold", type=float, default=0.2, help="allowed slowdown, 0.2 is 20%% (default)")
+    parser.add_argument("--min-seconds", type=float, default=0.001, help="skip timings shorter than this")
+    parser.add_argument("--phones", type=int, nargs=2, default=[1, 2], metavar=("MIN", "MAX"))
+    parser.add_argument("--emails", type=int, nargs=2, default=[0, 2], metavar=("MIN", "MAX"))
+    parser.add_argument("--notes", type=int, nargs=2, default=[0, 3], metavar=("MIN", "MAX"))
+    parser.add_argument("--birthday-share", type=float, default=0.8)
+    parser.add_argument("--birthdays", choices=["uniform", "seasonal"], default="uniform")
+    options = parser.parse_args()
+
+    results = run_suite(options)
+    if options.output:
+        with open(options.output, "w", encoding="utf-8") as file:
+            json.dump(results, file, indent=2)
+    else:
+        json.dump(results, sys.stdout, indent=2)
+        print()
+
+    if options.compare:
+        with open(options.compare, encoding="utf-8") as file:
+            baseline = json.load(file)
+        if baseline.get("version") != RESULTS_VERSION:
+            sys.exit(f"'{options.compare}' holds results of another format version.")
+        regressions = compare(results, baseline, options.threshold, options.min_seconds)
+        if regressions:
+            print(f"{len(regressions)} regressions over {options.threshold:.0%}")
+            sys.exit(1)
+        print("No regressions.")
+
+
+if __name__ == "__main__":
+    main()
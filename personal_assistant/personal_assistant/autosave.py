@@ -0,0 +1,77 @@
+from time import monotonic
+import threading
+
+
+class BackgroundWriter:
+    """
+    Commits the changes of the book from a thread of its own, once max_changes
+    of them are waiting or the first one waited interval seconds, so the prompt
+    doesn't wait for the disk after every command.
+
+    Commands have to run while holding lock and call notify() afterwards, the
+    writer takes the lock to commit. close() commits what is left and stops
+    the thread.
+    """
+    def __init__(self, book, interval=1.0, max_changes=100):
+        self.book = book
+        self.interval = interval
+        self.max_changes = max_changes
+        self.lock = threading.RLock()
+        self.wakeup = threading.Condition(self.lock)
+        # When the oldest change still waiting was made
+        self.since = None
+        self.stopping = False
+        self.conflicts = []
+        self.error = None
+        self.thread = threading.Thread(target=self.run, name="background-writer", daemon=True)
+
+    def start(self):
+        self.thread.start()
+
+    def notify(self):
+        # Called with the lock held, after a command
+        if not self.book.changes:
+            self.since = None
+        elif self.since is None:
+            self.since = monotonic()
+        self.wakeup.notify()
+
+    def run(self):
+        with self.lock:
+            while not self.stopping:
+                if self.since is None:
+                    self.wakeup.wait()
+                    continue
+                remaining = self.since + self.interval - monotonic()
+                if remaining > 0 and self.book.changes < self.max_changes:
+                    self.wakeup.wait(remaining)
+                    continue
+                self.commit()
+            self.commit()
+
+    def commit(self):
+        self.since = None
+        if not self.book.changes:
+            return
+        try:
+            self.conflicts += self.book.commit()
+        except Exception as e:
+            # Reported by the prompt, the changes stay pending for the next try
+            self.error = e
+            self.since = monotonic()
+
+    def take_report(self):
+        """
+        Return the names merged over other sessions' changes and the last error
+        since the previous call.
+        """
+        with self.lock:
+            conflicts, self.conflicts = self.conflicts, []
+            error, self.error = self.error, None
+        return conflicts, error
+
+    def close(self):
+        with self.lock:
+            self.stopping = True
+            self.wakeup.notify()
+        self.thread.join()
@@ -0,0 +1,80 @@
+from collections import OrderedDict
+import threading
+
+from .metrics import metrics
+
+
+# Query kind -> record ops that can change its results
+DEPENDS_ON = {
+    "birthdays": ("add_record", "delete", "add_birthday"),
+    "search_note": ("add_record", "delete", "add_note", "edit_note", "remove_note"),
+}
+
+
+class QueryCache:
+    """
+    Results of the book's queries, the least recently used dropped past maxsize.
+
+    Every query kind has a version counter, bumped by AddressBook on each record
+    op listed for it in DEPENDS_ON. A result is stored with the version it was
+    computed at and is a miss once the version moved on, so a new phone doesn't
+    throw away cached birthdays. Results are shared, callers must not modify them.
+    """
+    def __init__(self, maxsize=256):
+        self.maxsize = maxsize
+        self.entries = OrderedDict()
+        self.versions = dict.fromkeys(DEPENDS_ON, 0)
+        self.kinds_by_op = {}
+        for kind, ops in DEPENDS_ON.items():
+            for op in ops:
+                self.kinds_by_op.setdefault(op, []).append(kind)
+        self.hits = 0
+        self.misses = 0
+        # The server runs queries from several threads
+        self.lock = threading.Lock()
+
+    def get(self, kind, key, compute):
+        """
+        Return the result cached for (kind, key), or compute() it and cache it.
+        """
+        key = (kind, key)
+        with self.lock:
+            version = self.versions[kind]
+            entry = self.entries.get(key)
+            if entry is not None and entry[0] == version:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                metrics.count("cache.hits." + kind)
+                return entry[1]
+            self.misses += 1
+        metrics.count("cache.misses." + kind)
+        result = compute()
+        with self.lock:
+            # Unless the book changed meanwhile
+            if self.versions[kind] == version:
+                self.entries[key] = (version, result)
+                self.entries.move_to_end(key)
+                if len(self.entries) > self.maxsize:
+                    self.entries.popitem(last=False)
+        return result
+
+    def changed(self, op):
+        for kind in self.kinds_by_op.get(op, ()):
+            self.versions[kind] += 1
+
+    def clear(self):
+        # All the data was replaced, by a load or a compaction of another session
+        with self.lock:
+            self.entries.clear()
+            for kind in self.versions:
+                self.versions[kind] += 1
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+            "entries": len(self.entries),
+            "maxsize": self.maxsize,
+        }
@@ -0,0 +1,320 @@
+"""
+Columnar snapshot format: the whole book as a handful of flat arrays, written
+and read in bulk, with no pickle inside.
+
+All numbers are little-endian. The file starts with the header
+
+    magic "PACS" (4 bytes), schema version (u16), generation (u64),
+    contact count (u64), CRC-32 of everything after the header (u32)
+
+whose first four fields are laid out as in the indexed snapshot (see
+storage.py), so the journal finds the generation the same way. Sections follow
+in the order below, each as a typecode (1 byte, "B", "I", "i" or "Q" of the
+array module), an item count (u64) and the items:
+
+    string_offsets  Q  string i is text[string_offsets[i]:string_offsets[i + 1]],
+                       in code points
+    string_text     B  the strings joined, as UTF-8; every distinct name, email,
+                       address, note title and note text is stored once
+    contact_names   I  string of the name, per contact
+    birthdays       i  date ordinal of the birthday, 0 for none
+    addresses       I  string of the address, NO_STRING for none
+    phone_starts    I  phones of contact i are phones[phone_starts[i]:phone_starts[i + 1]]
+    phones          Q  phone numbers as integers (10 digits with the leading zeros)
+    email_starts    I  same for emails
+    emails          I  strings of the emails
+    note_starts     I  same for notes
+    note_titles     I  strings of the note titles
+    note_texts      I  strings of the note texts
+
+Contacts are stored in the order they were added. Readers refuse a schema
+version they don't know and a checksum that doesn't match.
+"""
+from array import array
+from collections import deque
+from contextlib import contextmanager
+from itertools import accumulate, compress, islice, repeat
+import gc, mmap, os, pickle, struct, sys, zlib
+
+from .address_book import (
+    FIELD_INDEX_FROM, Address, Birthday, Email, Field, FieldIndex, Name, Note, Phone, Record, stored_field,
+)
+from .storage import COLUMNAR_MAGIC
+
+
+COLUMNAR_VERSION = 1
+COLUMNAR_HEADER = struct.Struct("<4sHQQI")
+SECTION_HEADER = struct.Struct("<cQ")
+SECTIONS = [
+    ("string_offsets", "Q"), ("string_text", "B"), ("contact_names", "I"), ("birthdays", "i"), ("addresses", "I"),
+    ("phone_starts", "I"), ("phones", "Q"), ("email_starts", "I"), ("emails", "I"),
+    ("note_starts", "I"), ("note_titles", "I"), ("note_texts", "I"),
+]
+NO_STRING = 2 ** 32 - 1
+# Records are encoded this many at a time, a column at a time
+CHUNK_SIZE = 65536
+# Slot setters, called through map() to fill a column of objects without a Python loop
+SET_VALUE = Field.__dict__["_value"].__set__
+
+
+@contextmanager
+def gc_paused():
+    # Encoding and decoding make millions of objects and no cycles among them,
+    # the collector would only scan them over and over
+    enabled = gc.isenabled()
+    gc.disable()
+    try:
+        yield
+    finally:
+        if enabled:
+            gc.enable()
+
+
+def consume(iterator):
+    deque(iterator, maxlen=0)
+
+
+def new_fields(field_class, values):
+    # stored_field() for a whole column
+    fields = list(map(field_class.__new__, repeat(field_class, len(values))))
+    consume(map(SET_VALUE, fields, values))
+    return fields
+
+
+def grouped(items, starts):
+    # Tuples of items[starts[i]:starts[i + 1]], as Record keeps them, a FieldIndex past FIELD_INDEX_FROM
+    groups = list(map(tuple, map(items.__getitem__, map(slice, starts[:-1], starts[1:]))))
+    lengths = map(len, groups)
+    for i in compress(range(len(groups)), map(FIELD_INDEX_FROM.__lt__, lengths)):
+        groups[i] = FieldIndex(groups[i])
+    return groups
+
+
+class StringTable:
+    def __init__(self):
+        self.index = {None: NO_STRING}
+        self.strings = []
+
+    def add(self, values):
+        # Each column is interned with C-level loops: new strings first, then one lookup per value
+        new = [value for value in dict.fromkeys(values) if value not in self.index]
+        self.index.update(zip(new, range(len(self.strings), len(self.strings) + len(new))))
+        self.strings += new
+        return map(self.index.__getitem__, values)
+
+
+def encode_columns(records):
+    """
+    Return the sections of the records as arrays, by section name.
+    """
+    columns = {name: array(typecode) for name, typecode in SECTIONS}
+    strings = StringTable()
+    for column in ("phone_starts", "email_starts", "note_starts"):
+        columns[column].append(0)
+    records = iter(records)
+    while True:
+        chunk = list(islice(records, CHUNK_SIZE))
+        if not chunk:
+            break
+        columns["contact_names"].extend(strings.add([record.name._value for record in chunk]))
+        columns["birthdays"].extend([
+            birthday._value if birthday is not None else 0
+            for birthday in [getattr(record, "birthday", None) for record in chunk]
+        ])
+        columns["addresses"].extend(strings.add([
+            record.address._value if record.address is not None else None for record in chunk
+        ]))
+
+        phones = [record.phones for record in chunk]
+        columns["phones"].extend([phone._value for fields in phones for phone in fields])
+        emails = [record.emails for record in chunk]
+        columns["emails"].extend(strings.add([email._value for fields in emails for email in fields]))
+        notes = [record.notes for record in chunk]
+        columns["note_titles"].extend(strings.add([note.title for fields in notes for note in fields]))
+        columns["note_texts"].extend(strings.add([note.note for fields in notes for note in fields]))
+        for column, fields in (("phone_starts", phones), ("email_starts", emails), ("note_starts", notes)):
+            starts = columns[column]
+            starts.extend(accumulate(map(len, fields), initial=starts[-1]))
+            # The first one repeats the end of the previous chunk
+            del starts[-len(fields) - 1]
+
+    columns["string_offsets"].extend(accumulate(map(len, strings.strings), initial=0))
+    columns["string_text"] = array("B", "".join(strings.strings).encode())
+    return columns
+
+
+def write_columnar(filename, generation, records):
+    """
+    Write records (an iterable of Record) as a columnar snapshot and swap it in
+    atomically, return the file size.
+    """
+    with gc_paused():
+        columns = encode_columns(records)
+    body = []
+    for name, typecode in SECTIONS:
+        column = columns[name]
+        if sys.byteorder == "big":
+            column.byteswap()
+        body += [SECTION_HEADER.pack(typecode.encode(), len(column)), column]
+    checksum = 0
+    for part in body:
+        checksum = zlib.crc32(part, checksum)
+
+    tmp_filename = f"{filename}.tmp"
+    with open(tmp_filename, "wb") as file:
+        file.write(COLUMNAR_HEADER.pack(COLUMNAR_MAGIC, COLUMNAR_VERSION, generation, len(columns["contact_names"]), checksum))
+        for part in body:
+            file.write(part)
+        file.flush()
+        os.fsync(file.fileno())
+        size = file.tell()
+    os.replace(tmp_filename, filename)
+    return size
+
+
+class ColumnarReader:
+    """
+    Columnar snapshot file, with the same interface as SnapshotReader.
+
+    Opening reads every section in bulk into arrays and maps the names to their
+    rows; a Record is built from its row when it is asked for, or all of them
+    at once by records().
+    """
+    def __init__(self, filename):
+        self.filename = filename
+        with open(filename, "rb") as file, mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            with memoryview(mm) as view:
+                self._read(view)
+
+    def _read(self, view):
+        if len(view) < COLUMNAR_HEADER.size:
+            raise ValueError(f"'{self.filename}' is not a supported address book file.")
+        magic, version, self.generation, self.count, checksum = COLUMNAR_HEADER.unpack_from(view)
+        if magic != COLUMNAR_MAGIC or version != COLUMNAR_VERSION:
+            raise ValueError(f"'{self.filename}' is not a supported address book file.")
+        if zlib.crc32(view[COLUMNAR_HEADER.size:]) != checksum:
+            raise ValueError(f"'{self.filename}' is damaged, its checksum doesn't match.")
+
+        offset = COLUMNAR_HEADER.size
+        for name, typecode in SECTIONS:
+            stored_typecode, length = SECTION_HEADER.unpack_from(view, offset)
+            offset += SECTION_HEADER.size
+            if stored_typecode != typecode.encode():
+                raise ValueError(f"'{self.filename}' is damaged, section {name} has the wrong type.")
+            if name == "string_text":
+                self.text = str(view[offset:offset + length], "utf-8")
+                offset += length
+                continue
+            column = array(typecode)
+            end = offset + length * column.itemsize
+            column.frombytes(view[offset:end])
+            if sys.byteorder == "big":
+                column.byteswap()
+            setattr(self, name, column)
+            offset = end
+
+        if len(self.contact_names) != self.count:
+            raise ValueError(f"'{self.filename}' is damaged, the contact count doesn't match.")
+        starts = map(self.string_offsets.__getitem__, self.contact_names)
+        ends = map(self.string_offsets.__getitem__, map((1).__add__, self.contact_names))
+        self.rows = dict(zip(map(self.text.__getitem__, map(slice, starts, ends)), range(self.count)))
+
+    def string(self, index):
+        return self.text[self.string_offsets[index]:self.string_offsets[index + 1]]
+
+    def __contains__(self, name):
+        return name in self.rows
+
+    def get(self, name):
+        row = self.rows.get(name)
+        if row is None:
+            return None
+        string = self.string
+        notes = []
+        for k in range(self.note_starts[row], self.note_starts[row + 1]):
+            note = Note.__new__(Note)
+            note.title = string(self.note_titles[k])
+            note.note = string(self.note_texts[k])
+            notes.append(note)
+        address, birthday = self.addresses[row], self.birthdays[row]
+        phones = self.phones[self.phone_starts[row]:self.phone_starts[row + 1]]
+        emails = self.emails[self.email_starts[row]:self.email_starts[row + 1]]
+        record = Record.__new__(Record)
+        record.__setstate__((
+            stored_field(Name, name),
+            tuple([stored_field(Phone, phone) for phone in phones]),
+            tuple([stored_field(Email, string(email)) for email in emails]),
+            tuple(notes),
+            stored_field(Address, string(address)) if address != NO_STRING else None,
+            stored_field(Birthday, birthday) if birthday else None,
+        ))
+        return record
+
+    def records(self):
+        """
+        Every Record in the order the contacts were added, decoded a column at a
+        time: each kind of field is built for all contacts at once, strings are
+        decoded once however many contacts share them.
+        """
+        with gc_paused():
+            return self._records()
+
+    def _records(self):
+        count = self.count
+        offsets = self.string_offsets
+        strings = list(map(self.text.__getitem__, map(slice, offsets[:-1], offsets[1:])))
+        string = strings.__getitem__
+
+        notes = list(map(Note.__new__, repeat(Note, len(self.note_titles))))
+        consume(map(Note.title.__set__, notes, map(string, self.note_titles)))
+        consume(map(Note.note.__set__, notes, map(string, self.note_texts)))
+
+        records = list(map(Record.__new__, repeat(Record, count)))
+        for slot, values in [
+            (Record.name, new_fields(Name, list(self.rows))),
+            (Record.phones, grouped(new_fields(Phone, self.phones), self.phone_starts)),
+            (Record.emails, grouped(new_fields(Email, list(map(string, self.emails))), self.email_starts)),
+            (Record.notes, grouped(notes, self.note_starts)),
+            (Record._book, repeat(None, count)),
+        ]:
+            consume(map(slot.__set__, records, values))
+        # Address and birthday are None or unset for the contacts without one
+        consume(map(Record.address.__set__, records, repeat(None, count)))
+        has_address = list(map(NO_STRING.__ne__, self.addresses))
+        addresses = new_fields(Address, list(map(string, compress(self.addresses, has_address))))
+        consume(map(Record.address.__set__, compress(records, has_address), addresses))
+        birthdays = new_fields(Birthday, list(filter(None, self.birthdays)))
+        consume(map(Record.birthday.__set__, compress(records, self.birthdays), birthdays))
+        return records
+
+    def raw(self, name):
+        # For a compaction into the indexed format
+        record = self.get(name)
+        return None if record is None else pickle.dumps(record)
+
+    def names(self):
+        # Names in the order the contacts were added
+        return iter(self.rows)
+
+    def close(self):
+        pass
+
+
+def snapshot_records(data):
+    """
+    Every Record of data in order. Records of a LazyRecords not touched yet are
+    decoded one by one and not kept, so writing a snapshot doesn't load the book.
+    """
+    snapshot = getattr(data, "snapshot", None)
+    if snapshot is None:
+        return data.values()
+    loaded = data.loaded
+    return (loaded.get(name) or snapshot.get(name) for name in data)
+
+
+def read_columnar(filename):
+    """
+    Return (generation, dict of name to Record) of a columnar snapshot file.
+    """
+    reader = ColumnarReader(filename)
+    return reader.generation, dict(zip(reader.names(), reader.records()))
@@ -0,0 +1,248 @@
+from functools import lru_cache
+from time import perf_counter
+import os
+
+from .indexes import tokenize, trigrams
+from .metrics import metrics
+
+
+# A pair scores 0.6 for its names and 0.4 for the phones and emails they share
+NAME_WEIGHT = 0.6
+
+
+class DedupeReport:
+    def __init__(self):
+        # (kept name, [(merged name, score)]), biggest groups first
+        self.groups = []
+        self.contacts = 0
+        self.candidates = 0
+        # Blocks over max_block contacts, too common a key to say anything
+        self.skipped_blocks = 0
+        # Stage -> seconds
+        self.seconds = {}
+        self.applied = False
+
+    def __str__(self):
+        duplicates = sum(len(merged) for _, merged in self.groups)
+        timings = ", ".join(f"{stage} {seconds:.1f} s" for stage, seconds in self.seconds.items())
+        if self.applied:
+            summary = f"Merged {duplicates} contacts into {len(self.groups)}."
+        elif self.groups:
+            summary = f"Found {duplicates} duplicates of {len(self.groups)} contacts, 'dedupe apply' merges them."
+        else:
+            summary = "No duplicates found."
+        lines = [
+            summary,
+            f"Compared {self.candidates} candidate pairs of {self.contacts} contacts ({timings}), "
+            f"skipped {self.skipped_blocks} keys shared by too many.",
+        ]
+        for kept, merged in self.groups[:20]:
+            lines.append(f"{kept} <- " + ", ".join(f"{name} ({score:.2f})" for name, score in merged))
+        if len(self.groups) > 20:
+            lines.append(f"... and {len(self.groups) - 20} more groups.")
+        return "\n".join(lines)
+
+
+def normalize_name(name):
+    # "Lisa K." and " lisa  k" are both "lisa k"
+    return " ".join(tokenize(name))
+
+
+def contact_features(record):
+    # What the scoring needs of a contact, small enough to send to the workers
+    keys = [phone._value for phone in record.phones] + [email.key for email in record.emails]
+    return normalize_name(record.name.value), frozenset(keys)
+
+
+def score_features(a, b, name_trigrams=trigrams):
+    """
+    Likelihood from 0 to 1 that two contacts are the same person.
+
+    Names score 1 when equal once normalized and their trigram Dice coefficient
+    otherwise. Phones and emails score the share of the smaller contact's ones
+    found in the other; when either contact has none, the names decide alone.
+    """
+    name_a, keys_a = a
+    name_b, keys_b = b
+    if name_a == name_b:
+        name_score = 1.0
+    else:
+        trigrams_a, trigrams_b = name_trigrams(name_a), name_trigrams(name_b)
+        name_score = 2 * len(trigrams_a & trigrams_b) / (len(trigrams_a) + len(trigrams_b))
+    if not keys_a or not keys_b:
+        return name_score
+    shared = len(keys_a & keys_b) / min(len(keys_a), len(keys_b))
+    return NAME_WEIGHT * name_score + (1 - NAME_WEIGHT) * shared
+
+
+# Contact features of the book being deduplicated and the trigrams of the
+# names seen last, set in each worker process
+_features = None
+_trigrams = None
+
+
+def init_worker(features):
+    global _features, _trigrams
+    _features = features
+    # A contact is in a pair with each one sharing a key, and pairs come sorted
+    _trigrams = lru_cache(maxsize=65536)(trigrams)
+
+
+def score_batch(pairs, threshold):
+    """
+    Return (score, i, j) for the pairs, packed as i * count + j, scoring at
+    least threshold. Runs in the worker processes.
+    """
+    count = len(_features)
+    results = []
+    for pair in pairs:
+        i, j = divmod(pair, count)
+        score = score_features(_features[i], _features[j], _trigrams)
+        if score >= threshold:
+            results.append((score, i, j))
+    return results
+
+
+def blocking_keys(feature):
+    # Name trigrams are 3 characters, emails longer and phones numbers, so they can't clash
+    name, keys = feature
+    return keys | trigrams(name)
+
+
+def blocks(features, max_block, report):
+    """
+    Group contacts by blocking key: each phone, each email and each trigram of
+    the normalized name. Only contacts sharing a key are compared, keys shared
+    by more than max_block contacts are too common to tell anything and left out.
+    """
+    by_key = {}
+    for i, feature in enumerate(features):
+        for key in blocking_keys(feature):
+            block = by_key.get(key)
+            if block is None:
+                by_key[key] = [i]
+            else:
+                block.append(i)
+    for block in by_key.values():
+        if len(block) > max_block:
+            report.skipped_blocks += 1
+        elif len(block) > 1:
+            yield block
+
+
+def candidate_pairs(features, max_block, report):
+    count = len(features)
+    pairs = set()
+    for block in blocks(features, max_block, report):
+        for position, i in enumerate(block):
+            # Contacts are added to the blocks in order, so i < j
+            pairs.update(i * count + j for j in block[position + 1:])
+    return pairs
+
+
+def scored_pairs(features, pairs, threshold, workers, batch_size):
+    pairs = sorted(pairs)
+    batches = [pairs[start:start + batch_size] for start in range(0, len(pairs), batch_size)]
+    if workers <= 1 or len(batches) <= 1:
+        init_worker(features)
+        try:
+            return [result for batch in batches for result in score_batch(batch, threshold)]
+        finally:
+            init_worker(None)
+    from multiprocessing import Pool
+
+    # Workers get the features once, forked workers without even pickling them
+    with Pool(workers, initializer=init_worker, initargs=(features,)) as pool:
+        results = pool.starmap(score_batch, [(batch, threshold) for batch in batches])
+    return [result for batch in results for result in batch]
+
+
+def field_count(record):
+    return (
+        len(record.phones) + len(record.emails) + len(record.notes)
+        + (record.address is not None) + hasattr(record, "birthday")
+    )
+
+
+def find_duplicates(book, threshold=0.8, workers=None, max_block=100, batch_size=20000):
+    """
+    Return a DedupeReport with the groups of contacts that look like the same
+    person: pairs sharing a blocking key and scoring at least threshold (see
+    score_features), joined transitively. Each group keeps the contact with
+    the most phones, emails, notes, address and birthday, the first added on a
+    tie. Scoring runs on a pool of worker processes, one per CPU by default.
+    """
+    if not 0 < threshold <= 1:
+        raise ValueError("Threshold should be a number from 0 to 1.")
+    report = DedupeReport()
+    start = perf_counter()
+    names = list(book.data)
+    records = [book.data[name] for name in names]
+    features = [contact_features(record) for record in records]
+    report.contacts = len(names)
+    report.seconds["features"] = perf_counter() - start
+
+    start = perf_counter()
+    pairs = candidate_pairs(features, max_block, report)
+    report.candidates = len(pairs)
+    report.seconds["blocking"] = perf_counter() - start
+
+    start = perf_counter()
+    workers = workers or os.cpu_count() or 1
+    matches = scored_pairs(features, pairs, threshold, workers, batch_size)
+    report.seconds["scoring"] = perf_counter() - start
+    metrics.count("dedupe.pairs", len(pairs))
+
+    # Union-find over the matching pairs, a group is the contacts linked by any of them
+    parent = {}
+
+    def root(i):
+        while parent.get(i, i) != i:
+            parent[i] = parent.get(parent[i], parent[i])
+            i = parent[i]
+        return i
+
+    best = {}
+    for score, i, j in matches:
+        parent[root(i)] = root(j)
+        best[i] = max(best.get(i, 0), score)
+        best[j] = max(best.get(j, 0), score)
+    groups = {}
+    for i in best:
+        groups.setdefault(root(i), []).append(i)
+    for members in groups.values():
+        members.sort(key=lambda i: (-field_count(records[i]), i))
+        kept, *merged = members
+        report.groups.append((names[kept], [(names[i], best[i]) for i in merged]))
+    report.groups.sort(key=lambda group: -len(group[1]))
+    return report
+
+
+def merge_into(record, other):
+    """
+    Add the phones, emails and notes of other to record, and its birthday and
+    address if record has none. A note whose title record already uses for
+    another text is kept under "title (other name)".
+    """
+    from .transfer import merge_records
+
+    merge_records(record, other)
+    for note in other.notes:
+        if record.find_note(note.title).note != note.note:
+            title = f"{note.title} ({other.name.value})"
+            if record.find_note(title) is None:
+                record.add_note(title, note.note)
+
+
+def apply_merges(book, report):
+    # Merge every group of the report into the contact it keeps, removing the others
+    for kept, merged in report.groups:
+        record = book.find(kept)
+        for name, _ in merged:
+            other = book.find(name)
+            if record is None or other is None:
+                continue
+            merge_into(record, other)
+            book.delete(name)
+    report.applied = True
+    return report
@@ -0,0 +1,95 @@
+from datetime import date, timedelta
+import os
+
+from .address_book import AddressBook
+from .storage import JournalStorage
+
+
+def open_book(filename):
+    # address_book.dat style files, or SQLite databases (see sqlite_storage.py) by their .db extension.
+    # Read-only: the books may belong to other teams, nothing is written next to them
+    if not os.path.exists(filename):
+        raise ValueError(f"No address book at '{filename}'.")
+    if filename.endswith(".db"):
+        from .sqlite_storage import SQLiteStorage
+
+        book = AddressBook(SQLiteStorage(filename, read_only=True))
+    else:
+        book = AddressBook(JournalStorage(filename, read_only=True))
+    book.load_from_file(filename)
+    return book
+
+
+def query_birthdays(book, days):
+    # Weekday -> names, weekends moved to Monday like AddressBook.get_birthdays_days_interval
+    return dict(book.get_birthdays_days_interval(days))
+
+
+def query_notes(book, title):
+    try:
+        return book.search_note(title)
+    except ValueError:
+        return []
+
+
+def query_names(book, name):
+    return [(record.name.value, [phone.value for phone in record.phones]) for record in book.search_contacts(name)]
+
+
+# Query name -> function of the book and the query arguments, the results are pickled back
+QUERIES = {
+    "birthdays": query_birthdays,
+    "search-note": query_notes,
+    "search-contact": query_names,
+}
+
+
+def run_query(task):
+    """
+    Answer one query on one book, in a pool process. Returns (filename, result,
+    None), or (filename, None, error message) if the book couldn't be read.
+    """
+    filename, query, args = task
+    try:
+        return filename, QUERIES[query](open_book(filename), *args), None
+    except Exception as e:
+        return filename, None, str(e)
+
+
+def federated_query(filenames, query, *args, workers=None):
+    """
+    Run query on every book, each in a process of a pool of workers (one per
+    CPU by default), and yield what run_query returns as soon as a book is done,
+    in the order they finish.
+    """
+    if query not in QUERIES:
+        raise ValueError(f"Unknown query '{query}', use one of: {', '.join(QUERIES)}.")
+    tasks = [(filename, query, args) for filename in filenames]
+    workers = min(workers or os.cpu_count() or 1, len(tasks))
+    if workers <= 1:
+        # Not worth starting processes for
+        yield from map(run_query, tasks)
+        return
+    from multiprocessing import Pool
+
+    with Pool(workers) as pool:
+        yield from pool.imap_unordered(run_query, tasks)
+
+
+def merge_birthdays(results, days, today=None):
+    """
+    Merge the weekday buckets of query_birthdays from (label, buckets) pairs into
+    weekday -> [(name, label)], weekdays in the order they come from today on.
+    """
+    today = today or date.today()
+    order = {}
+    for offset in range(min(days, 6) + 1):
+        day_of_week = (today + timedelta(days=offset)).strftime("%A")
+        if day_of_week in ["Saturday", "Sunday"]:
+            day_of_week = "Monday"
+        order.setdefault(day_of_week, len(order))
+    merged = {}
+    for label, buckets in results:
+        for day_of_week, names in buckets.items():
+            merged.setdefault(day_of_week, []).extend((name, label) for name in names)
+    return dict(sorted(merged.items(), key=lambda item: order.get(item[0], len(order))))
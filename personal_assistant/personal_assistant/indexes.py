@@ -0,0 +1,323 @@
+from bisect import bisect_left, insort
+from collections import defaultdict
+from datetime import date, timedelta
+import calendar, heapq, re
+
+
+def tokenize(text):
+    return re.findall(r"\w+", text.lower())
+
+
+def day_key(month, day):
+    # Day of a leap year, so 29 February gets its own bucket
+    return (date(2000, month, day) - date(2000, 1, 1)).days
+
+
+FEBRUARY_29 = day_key(2, 29)
+
+
+def calendar_days(today, days):
+    """
+    Yield (date, day keys celebrated on it) from today to today + days.
+    In common years birthdays on 29 February are celebrated on 28 February.
+    """
+    seen = set()
+    # A year ahead every day of the calendar has been visited
+    for offset in range(min(days, 365) + 1):
+        day = today + timedelta(days=offset)
+        keys = [day_key(day.month, day.day)]
+        if day.month == 2 and day.day == 28 and not calendar.isleap(day.year):
+            keys.append(FEBRUARY_29)
+        keys = [key for key in keys if key not in seen]
+        seen.update(keys)
+        yield day, keys
+
+
+class BirthdayIndex:
+    """
+    Contact names bucketed by the day of year of their birthday.
+
+    Indexes are built from the whole book on first use and then kept up to date
+    by AddressBook through update(), which receives every record mutation.
+    """
+    def __init__(self):
+        # Names are dict keys to keep the order they were added in
+        self.buckets = [{} for _ in range(366)]
+        self.keys = {}
+
+    def update(self, record, op, args):
+        name = record.name.value
+        if op == "delete":
+            self.remove(name)
+        elif op in ("add_record", "add_birthday"):
+            if hasattr(record, "birthday"):
+                self.add(name, record.birthday.date)
+            else:
+                self.remove(name)
+
+    def add(self, name, birthday_date):
+        self.remove(name)
+        key = day_key(birthday_date.month, birthday_date.day)
+        self.buckets[key][name] = None
+        self.keys[name] = key
+
+    def remove(self, name):
+        key = self.keys.pop(name, None)
+        if key is not None:
+            del self.buckets[key][name]
+
+    def upcoming(self, today, days):
+        """
+        Yield (date, names) for each day from today to today + days that has birthdays.
+        """
+        for day, keys in calendar_days(today, days):
+            names = [name for key in keys for name in self.buckets[key]]
+            if names:
+                yield day, names
+
+
+class NoteIndex:
+    """
+    Notes by exact title, by title prefix and by the words of their text.
+    """
+    def __init__(self):
+        # title -> names of the contacts having a note with it
+        self.titles = {}
+        # Distinct titles, sorted for prefix lookups
+        self.sorted_titles = []
+        # word -> (name, title) of the notes containing it
+        self.words = defaultdict(dict)
+        # name -> {title: words of the note}
+        self.notes = {}
+
+    def update(self, record, op, args):
+        name = record.name.value
+        if op in ("add_record", "delete"):
+            self.remove_contact(name)
+            if op == "add_record":
+                for note in record.notes:
+                    self.add(name, note.title, note.note)
+        elif op == "add_note":
+            self.add(name, *args)
+        elif op == "edit_note":
+            title, new_note = args
+            self.remove(name, title)
+            self.add(name, title, new_note)
+        elif op == "remove_note":
+            self.remove(name, *args)
+
+    def add(self, name, title, note):
+        names = self.titles.get(title)
+        if names is None:
+            names = self.titles[title] = {}
+            insort(self.sorted_titles, title)
+        names[name] = None
+        words = set(tokenize(note))
+        for word in words:
+            self.words[word][(name, title)] = None
+        self.notes.setdefault(name, {})[title] = words
+
+    def remove(self, name, title):
+        words = self.notes.get(name, {}).pop(title, None)
+        if words is None:
+            return
+        for word in words:
+            postings = self.words[word]
+            del postings[(name, title)]
+            if not postings:
+                del self.words[word]
+        names = self.titles[title]
+        del names[name]
+        if not names:
+            del self.titles[title]
+            del self.sorted_titles[bisect_left(self.sorted_titles, title)]
+
+    def remove_contact(self, name):
+        for title in list(self.notes.get(name, ())):
+            self.remove(name, title)
+        self.notes.pop(name, None)
+
+    def search(self, query):
+        """
+        Return (name, title) of matching notes: exact title matches first, then
+        title prefix matches, then notes containing every word of the query.
+        """
+        if not query:
+            return []
+        results = dict.fromkeys((name, query) for name in self.titles.get(query, ()))
+
+        position = bisect_left(self.sorted_titles, query)
+        while position < len(self.sorted_titles) and self.sorted_titles[position].startswith(query):
+            title = self.sorted_titles[position]
+            for name in self.titles[title]:
+                results.setdefault((name, title))
+            position += 1
+
+        # Intersect postings starting from the rarest word
+        postings = sorted((self.words.get(word, {}) for word in set(tokenize(query))), key=len)
+        if postings:
+            for key in postings[0]:
+                if all(key in other for other in postings[1:]):
+                    results.setdefault(key)
+        return list(results)
+
+
+class LookupIndex:
+    """
+    Contact names by keys taken from one of their fields.
+
+    Subclasses list the record ops that change the field and extract its keys,
+    on each of those ops the keys of the record are recomputed and diffed.
+    """
+    ops = ()
+
+    def __init__(self):
+        # key -> names of the contacts having it
+        self.names = defaultdict(dict)
+        self.keys_by_name = {}
+
+    def keys(self, record):
+        raise NotImplementedError
+
+    def normalize(self, value):
+        return value
+
+    def update(self, record, op, args):
+        name = record.name.value
+        if op == "delete":
+            self.set_keys(name, ())
+        elif op == "add_record" or op in self.ops:
+            self.set_keys(name, self.keys(record))
+
+    def set_keys(self, name, keys):
+        old_keys = self.keys_by_name.pop(name, frozenset())
+        new_keys = frozenset(keys)
+        for key in old_keys - new_keys:
+            names = self.names[key]
+            del names[name]
+            if not names:
+                del self.names[key]
+        for key in new_keys - old_keys:
+            self.names[key][name] = None
+        if new_keys:
+            self.keys_by_name[name] = new_keys
+
+    def find(self, value):
+        return list(self.names.get(self.normalize(value), ()))
+
+
+class PhoneIndex(LookupIndex):
+    ops = ("add_phone", "edit_phone", "remove_phone")
+
+    def keys(self, record):
+        return (phone.value for phone in record.phones)
+
+    def normalize(self, value):
+        # Accept "+38 (099) 741-12-35" for 0997411235
+        return re.sub(r"\D", "", value)[-10:]
+
+
+class EmailIndex(LookupIndex):
+    ops = ("add_email", "remove_email")
+
+    def keys(self, record):
+        return (self.normalize(email.value) for email in record.emails)
+
+    def normalize(self, value):
+        return value.strip().lower()
+
+
+class AddressIndex(LookupIndex):
+    ops = ("add_address", "edit_address", "remove_address")
+
+    def keys(self, record):
+        return tokenize(record.address.value) if record.address else ()
+
+    def find(self, value):
+        # Contacts whose address has every word of the query
+        postings = sorted((self.names.get(word, {}) for word in set(tokenize(value))), key=len)
+        if not postings:
+            return []
+        return [name for name in postings[0] if all(name in other for other in postings[1:])]
+
+
+def trigrams(text):
+    padded = f"  {text} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class NameIndex:
+    """
+    Contact names for prefix and typo-tolerant search, both case-insensitive.
+
+    Prefix lookups bisect a sorted list of casefolded names, fuzzy lookups rank
+    the names sharing trigrams with the query by their Dice coefficient.
+    """
+    def __init__(self, min_score=0.3):
+        self.min_score = min_score
+        # (casefolded name, name), sorted
+        self.sorted_names = []
+        # trigram -> names containing it
+        self.trigrams = defaultdict(set)
+
+    def update(self, record, op, args):
+        if op == "add_record":
+            self.add(record.name.value)
+        elif op == "delete":
+            self.remove(record.name.value)
+
+    def add(self, name):
+        entry = (name.casefold(), name)
+        position = bisect_left(self.sorted_names, entry)
+        if position < len(self.sorted_names) and self.sorted_names[position] == entry:
+            return
+        self.sorted_names.insert(position, entry)
+        for trigram in trigrams(entry[0]):
+            self.trigrams[trigram].add(name)
+
+    def remove(self, name):
+        entry = (name.casefold(), name)
+        position = bisect_left(self.sorted_names, entry)
+        if position == len(self.sorted_names) or self.sorted_names[position] != entry:
+            return
+        del self.sorted_names[position]
+        for trigram in trigrams(entry[0]):
+            names = self.trigrams[trigram]
+            names.discard(name)
+            if not names:
+                del self.trigrams[trigram]
+
+    def search(self, query, limit=10):
+        """
+        Return up to limit names: names starting with the query first, then the
+        closest names by trigram similarity.
+        """
+        query = query.strip().casefold()
+        if not query:
+            return []
+        results = []
+        position = bisect_left(self.sorted_names, (query,))
+        while (
+            len(results) < limit and position < len(self.sorted_names)
+            and self.sorted_names[position][0].startswith(query)
+        ):
+            results.append(self.sorted_names[position][1])
+            position += 1
+        if len(results) == limit:
+            return results
+
+        query_trigrams = trigrams(query)
+        postings = [self.trigrams[trigram] for trigram in query_trigrams if trigram in self.trigrams]
+        # Trigrams shared by a large part of the book say little and cost the most,
+        # candidates come from the rarer ones
+        common = max(1000, len(self.sorted_names) // 100)
+        rare = [names for names in postings if len(names) <= common] or sorted(postings, key=len)[:1]
+        candidates = set().union(*rare).difference(results)
+        scored = ((self.similarity(query_trigrams, name), name) for name in candidates)
+        best = heapq.nlargest(limit - len(results), (item for item in scored if item[0] >= self.min_score))
+        return results + [name for _, name in best]
+
+    def similarity(self, query_trigrams, name):
+        # Dice coefficient of the trigram sets
+        name_trigrams = trigrams(name.casefold())
+        return 2 * len(query_trigrams & name_trigrams) / (len(query_trigrams) + len(name_trigrams))
@@ -0,0 +1,137 @@
+from collections import defaultdict
+import json
+
+
+class Histogram:
+    """
+    Latencies in power-of-two nanosecond buckets: bucket b counts the values
+    from 2 ** (b - 1) up to 2 ** b nanoseconds.
+    """
+    __slots__ = ("buckets", "total", "max")
+
+    def __init__(self):
+        self.buckets = [0] * 64
+        self.total = 0
+        self.max = 0
+
+    def add(self, nanoseconds):
+        self.buckets[nanoseconds.bit_length()] += 1
+        self.total += nanoseconds
+        if nanoseconds > self.max:
+            self.max = nanoseconds
+
+    @property
+    def count(self):
+        return sum(self.buckets)
+
+    def percentile(self, p):
+        # Upper bound of the bucket holding the value, in seconds
+        rank = self.count * p / 100
+        seen = 0
+        for bucket, count in enumerate(self.buckets):
+            seen += count
+            if count and seen >= rank:
+                return min(2 ** bucket, self.max) / 1e9
+        return self.max / 1e9
+
+    def as_dict(self):
+        return {
+            "count": self.count,
+            "total_seconds": self.total / 1e9,
+            "max_seconds": self.max / 1e9,
+            "p50_seconds": self.percentile(50),
+            "p99_seconds": self.percentile(99),
+            "buckets_ns": {str(2 ** bucket): count for bucket, count in enumerate(self.buckets) if count},
+        }
+
+
+class Metrics:
+    """
+    Counters and timings of a session: command latencies, index hits and full
+    scans, load and save durations and sizes.
+
+    Collection is off until enabled is set, the instrumented code then only
+    checks the flag.
+    """
+    def __init__(self):
+        self.enabled = False
+        self.reset()
+
+    def reset(self):
+        self.commands = defaultdict(Histogram)
+        self.counters = defaultdict(int)
+        # kind -> [count, seconds, bytes]
+        self.io = defaultdict(lambda: [0, 0.0, 0])
+
+    def count(self, name, amount=1):
+        if self.enabled:
+            self.counters[name] += amount
+
+    def record_command(self, command, nanoseconds):
+        self.commands[command].add(nanoseconds)
+
+    def record_io(self, kind, seconds, size):
+        if self.enabled:
+            totals = self.io[kind]
+            totals[0] += 1
+            totals[1] += seconds
+            totals[2] += size
+
+    def as_dict(self):
+        stats = {
+            "commands": {command: histogram.as_dict() for command, histogram in sorted(self.commands.items())},
+            "counters": dict(sorted(self.counters.items())),
+            "io": {
+                kind: {"count": count, "seconds": seconds, "bytes": size}
+                for kind, (count, seconds, size) in sorted(self.io.items())
+            },
+        }
+        memory = top_allocations()
+        if memory:
+            stats["memory"] = memory
+        return stats
+
+    def dump(self, filename):
+        with open(filename, "w", encoding="utf-8") as file:
+            json.dump(self.as_dict(), file, indent=2)
+
+
+# Shared by the whole process, the CLI turns it on
+metrics = Metrics()
+
+
+def top_allocations(limit=10):
+    """
+    Biggest allocation sites while tracemalloc is tracing (see start_profiling),
+    an empty list otherwise.
+    """
+    import tracemalloc
+
+    if not tracemalloc.is_tracing():
+        return []
+    statistics = tracemalloc.take_snapshot().statistics("lineno")[:limit]
+    return [
+        {"where": f"{stat.traceback[0].filename}:{stat.traceback[0].lineno}", "bytes": stat.size, "blocks": stat.count}
+        for stat in statistics
+    ]
+
+
+def start_profiling():
+    """
+    Start cProfile and tracemalloc, return the profile to pass to stop_profiling.
+    """
+    import cProfile, tracemalloc
+
+    tracemalloc.start()
+    profile = cProfile.Profile()
+    profile.enable()
+    return profile
+
+
+def stop_profiling(profile, filename):
+    # The file is read with pstats or a viewer like snakeviz
+    import tracemalloc
+
+    profile.disable()
+    profile.dump_stats(filename)
+    tracemalloc.stop()
@@ -1,25 +1,60 @@
 from .address_book import AddressBook, Record
-from prettytable import PrettyTable
-from prompt_toolkit import prompt
-from prompt_toolkit.completion import WordCompleter
+from .metrics import metrics, start_profiling, stop_profiling, top_allocations
+from .rendering import page_rows, record_row, render_table
+from contextlib import nullcontext
+from time import perf_counter_ns
+import argparse, os, shlex, sys
+
+# prettytable, prompt_toolkit, the server, SQLite and the import/export formats
+# are imported by the commands that use them, so a batch run or a one-shot
+# command doesn't pay for them at startup (see benchmarks/bench_startup.py).
+
+# Set while running a batch: missing arguments are errors instead of prompts
+batch_mode = False
+# Worker processes for dedupe and import, None for one per CPU. The server
+# sets 1: forking its threads mid-request could copy a lock another holds
+process_workers = None
+# Birthday reminders (see reminders.py), set up by --remind
+reminder_scheduler = None
+
 
 def parse_input(user_input):
-    cmd, *args = user_input.split()
+    # Quotes group words ("Lisa K."), a stray apostrophe falls back to plain splitting
+    try:
+        cmd, *args = shlex.split(user_input)
+    except ValueError:
+        cmd, *args = user_input.split()
     cmd = cmd.strip().lower()
     return cmd, *args
 
 
+def get_arg(args, index, prompt, rest=False):
+    """
+    Return the inline argument at index, or ask for it if it wasn't given.
+    With rest the argument takes all the words that follow too.
+    """
+    if index < len(args):
+        return " ".join(args[index:]) if rest else args[index]
+    if batch_mode:
+        raise ValueError(f"Missing argument {index + 1} for this command.")
+    return input(prompt)
+
+
 def input_error(func):
     def inner(*args, **kwargs):
         try:
             return func(*args, **kwargs)
         except ValueError as e:
+            metrics.count(f"errors.{func.__name__}")
             return str(e)
         except KeyError as e:
+            metrics.count(f"errors.{func.__name__}")
             return f"Contact with the name {e} doesn't exists. Use 'add-contact' to add."
         except IndexError as e:
+            metrics.count(f"errors.{func.__name__}")
             return f"Index error occurred: {str(e)}"
         except Exception as e:
+            metrics.count(f"errors.{func.__name__}")
             return f"An unexpected error occurred: {str(e)}"
 
     inner.__doc__ = func.__doc__
@@ -33,11 +68,11 @@ def check_name(name, book):
 
 
 @input_error
-def add_contact(book):
+def add_contact(book, *args):
     """
     Add a new contact to the address book.
     """
-    name = input("Please enter contact name: ")
+    name = get_arg(args, 0, "Please enter contact name: ", rest=True)
     if not name:
         raise ValueError("Contact name cannot be empty.")
 
@@ -50,129 +85,179 @@ def add_contact(book):
 
 
 @input_error
-def remove_contact(book):
+def remove_contact(book, *args):
     """
     Remove a contact from the address book.
     """
-    name = input("Please enter contact's name: ")
+    name = get_arg(args, 0, "Please enter contact's name: ", rest=True)
     check_name(name, book)
     book.delete(name)
     return f"Contact '{name}' removed."
 
 
 @input_error
-def add_phone(book):
+def add_phone(book, *args):
     """
     Add a phone number to a contact.
     """
-    name = input("Please enter contact's name: ")
+    name = get_arg(args, 0, "Please enter contact's name: ")
     check_name(name, book)
-    phone = input("Please enter contact's phone: ")
+    phone = get_arg(args, 1, "Please enter contact's phone: ", rest=True)
     record = book.find(name)
     record.add_phone(phone)
     return "Phone added."
 
 
 @input_error
-def edit_phone(book):
+def edit_phone(book, *args):
     """
     Edit contact's phone number.
     """
-    name = input("Please enter contact's name: ")
+    name = get_arg(args, 0, "Please enter contact's name: ")
     check_name(name, book)
-    old_phone = input("Please enter phone you want to edit: ")
-    new_phone = input("Please enter new phone: ")
+    old_phone = get_arg(args, 1, "Please enter phone you want to edit: ")
+    new_phone = get_arg(args, 2, "Please enter new phone: ", rest=True)
     record = book.find(name)
     record.edit_phone(old_phone, new_phone)
     return "Phone updated."
 
 
 @input_error
-def remove_phone(book):
+def remove_phone(book, *args):
     """
     Remove a phone number from a contact.
     """
-    name = input("Please enter contact's name: ")
+    name = get_arg(args, 0, "Please enter contact's name: ")
     check_name(name, book)
-    phone = input("Please enter phone number to remove: ")
+    phone = get_arg(args, 1, "Please enter phone number to remove: ", rest=True)
     record = book.find(name)
     record.remove_phone(phone)
     return "Phone removed."
 
 
 @input_error
-def show_phones(book):
+def show_phones(book, *args):
     """
     Show all phone numbers of the contact.
     """
-    name = input("Please enter contact's name: ")
+    name = get_arg(args, 0, "Please enter contact's name: ", rest=True)
     check_name(name, book)
     record = book.find(name)
     return record.show_phones()
 
 
+def show_names(records, not_found):
+    if records:
+        return "\n".join(record.name.value for record in records)
+    else:
+        raise ValueError(not_found)
+
+
 @input_error
-def show_all(book):
+def search_contact(book, *args):
     """
-    Show all contacts.
+    Search contacts by the beginning of the name or a close spelling.
     """
-    if book.data.values():
-        table = PrettyTable()
-        table.field_names = ["Name", "Phones", "Address", "Birthday", "Email", "Note Title", "Note Content"]
-        table.align = "l"
+    query = get_arg(args, 0, "Please enter contact name: ", rest=True)
+    return show_names(book.search_contacts(query), "No matching contacts.")
 
-        for record in book.data.values():
-            phones_str = "\n".join(p.value for p in record.phones)
-            email_str = "\n".join(e.value for e in record.emails)
-            notes_str = ""
-            notes_titles_str = ""
-            for note in record.notes:
-                if notes_str == "":
-                    notes_str += note.note
-                    notes_titles_str += note.title
-                else:
-                    notes_str += f"\n{note.note}"
-                    notes_titles_str += f"\n{note.title}"
-            address_str = (
-                record.address.value
-                if hasattr(record, "address") and record.address
-                else ""
-            )
-            birthday_str = (
-                record.birthday.value
-                if hasattr(record, "birthday") and record.birthday
-                else ""
-            )
 
-            table.add_row(
-                [record.name.value, phones_str, address_str, birthday_str, email_str, notes_titles_str, notes_str],
-                divider=True
-            )
+@input_error
+def find_by_phone(book, *args):
+    """
+    Find contacts by phone number.
+    """
+    phone = get_arg(args, 0, "Please enter phone number: ", rest=True)
+    return show_names(book.find_by_phone(phone), "No contact with this phone number.")
 
-        print(table)
-    else:
-        print("No contacts available.")
+
+@input_error
+def find_by_email(book, *args):
+    """
+    Find contacts by email address.
+    """
+    email = get_arg(args, 0, "Please enter email address: ", rest=True)
+    return show_names(book.find_by_email(email), "No contact with this email address.")
 
 
 @input_error
-def add_birthday(book):
+def find_by_address(book, *args):
+    """
+    Find contacts whose address contains all of the entered words.
+    """
+    address = get_arg(args, 0, "Please enter address: ", rest=True)
+    return show_names(book.find_by_address(address), "No contact with this address.")
+
+
+def parse_page_args(args):
+    """
+    Parse "--page N", "--size N" and "--pager" of the all command.
+    """
+    options = {"page": None, "size": None, "pager": False}
+    args = list(args)
+    while args:
+        arg = args.pop(0)
+        if arg == "--pager":
+            options["pager"] = True
+        elif arg in ("--page", "--size") and args and args[0].isdigit() and int(args[0]) > 0:
+            options[arg[2:]] = int(args.pop(0))
+        else:
+            raise ValueError("Usage: all [--page N] [--size N] [--pager]")
+    return options
+
+
+@input_error
+def show_all(book, *args):
+    """
+    Show all contacts. Use "--page N --size N" for one page or "--pager" to scroll.
+    """
+    options = parse_page_args(args)
+    if options["pager"] and batch_mode:
+        # The pager would read the next commands as its answers
+        raise ValueError("--pager needs the prompt, use --page N in batch mode.")
+    if not book.data:
+        return "No contacts available."
+    metrics.count("scan.full.all")
+
+    if any(options.values()):
+        size = options["size"] or 20
+        pages = (len(book.data) + size - 1) // size
+        page = options["page"] or 1
+        if page > pages:
+            raise ValueError(f"There are only {pages} pages of {size} contacts.")
+        while True:
+            for line in render_table(page_rows(book.data, page, size)):
+                print(line)
+            if not options["pager"] or page == pages:
+                return f"Page {page} of {pages}."
+            if input(f"Page {page} of {pages}. Press Enter for the next page or 'q' to stop: ").strip().lower() == "q":
+                return ""
+            page += 1
+
+    for line in render_table(map(record_row, book.data.values())):
+        print(line)
+    return ""
+
+
+@input_error
+def add_birthday(book, *args):
     """
     Add a birthday to a contact.
     """
-    name = input("Please enter contact's name: ")
+    name = get_arg(args, 0, "Please enter contact's name: ")
     check_name(name, book)
-    birthday = input("Please enter contact's birthday: ")
+    birthday = get_arg(args, 1, "Please enter contact's birthday: ", rest=True)
     record = book.find(name)
     record.add_birthday(birthday)
     return "Birthday added."
 
 
 @input_error
-def show_birthday(book):
+def show_birthday(book, *args):
     """
     Show contact's birthday.
     """
-    name = input("Please enter contact's name: ")
+    name = get_arg(args, 0, "Please enter contact's name: ", rest=True)
     check_name(name, book)
     record = book.find(name)
     if hasattr(record, "birthday"):
@@ -182,24 +267,24 @@ def show_birthday(book):
 
 
 @input_error
-def add_email(book):
+def add_email(book, *args):
     """
     Add an email address to a contact.
     """
-    name = input("Please enter contact's name: ")
+    name = get_arg(args, 0, "Please enter contact's name: ")
     check_name(name, book)
-    email = input("Please enter email address: ")
+    email = get_arg(args, 1, "Please enter email address: ", rest=True)
     record = book.find(name)
     record.add_email(email)
     return "Email added."
 
 
 @input_error
-def show_emails(book):
+def show_emails(book, *args):
     """
     Show all email addresses of the contact.
     """
-    name = input("Please enter contact's name: ")
+    name = get_arg(args, 0, "Please enter contact's name: ", rest=True)
     check_name(name, book)
     record = book.find(name)
     if record.emails:
@@ -209,50 +294,50 @@ def show_emails(book):
 
 
 @input_error
-def remove_email(book):
+def remove_email(book, *args):
     """
     Remove contact's email address.
     """
-    name = input("Please enter contact's name: ")
+    name = get_arg(args, 0, "Please enter contact's name: ")
     check_name(name, book)
-    email = input("Please email address to remove: ")
+    email = get_arg(args, 1, "Please email address to remove: ", rest=True)
     record = book.find(name)
     record.remove_email(email)
     return "Email removed."
 
 
 @input_error
-def add_address(book):
+def add_address(book, *args):
     """
     Add an address to a contact.
     """
-    name = input("Please enter contact's name: ")
+    name = get_arg(args, 0, "Please enter contact's name: ")
     check_name(name, book)
-    address = input("Please enter contact's address: ")
+    address = get_arg(args, 1, "Please enter contact's address: ", rest=True)
     record = book.find(name)
     record.add_address(address)
     return "Address added."
 
 
 @input_error
-def edit_address(book):
+def edit_address(book, *args):
     """
     Edit contact's email address.
     """
-    name = input("Please enter contact's name: ")
+    name = get_arg(args, 0, "Please enter contact's name: ")
     check_name(name, book)
-    new_address = input("Please enter new address: ")
+    new_address = get_arg(args, 1, "Please enter new address: ", rest=True)
     record = book.find(name)
     record.edit_address(new_address)
     return "Address updated."
 
 
 @input_error
-def remove_address(book):
+def remove_address(book, *args):
     """
     Remove contact's email address.
     """
-    name = input("Please enter contact's name: ")
+    name = get_arg(args, 0, "Please enter contact's name: ", rest=True)
     check_name(name, book)
     record = book.find(name)
     record.remove_address()
@@ -260,179 +345,549 @@ def remove_address(book):
 
 
 @input_error
-def add_note(book):
+def add_note(book, *args):
     """
     Add a note to a contact.
     """
-    name = input("Please enter contact's name: ")
+    name = get_arg(args, 0, "Please enter contact's name: ")
     check_name(name, book)
-    title = input("Please enter note title: ")
-    note = input("Please enter note text: ")
+    title = get_arg(args, 1, "Please enter note title: ")
+    note = get_arg(args, 2, "Please enter note text: ", rest=True)
     record = book.find(name)
     record.add_note(title, note)
     return "Note added."
 
 
 @input_error
-def edit_note(book):
+def edit_note(book, *args):
     """
     Edit a contact note by title.
     """
-    name = input("Please enter contact's name: ")
+    name = get_arg(args, 0, "Please enter contact's name: ")
     check_name(name, book)
-    title = input("Please enter note title: ")
-    new_note = input("Please enter text for a new note: ")
+    title = get_arg(args, 1, "Please enter note title: ")
+    new_note = get_arg(args, 2, "Please enter text for a new note: ", rest=True)
     record = book.find(name)
     record.edit_note(title, new_note)
     return "Note updated."
 
 
 @input_error
-def remove_note(book):
+def remove_note(book, *args):
     """
     Remove contact's note.
     """
-    name = input("Please enter contact's name: ")
+    name = get_arg(args, 0, "Please enter contact's name: ")
     check_name(name, book)
-    title = input("Please enter note title: ")
+    title = get_arg(args, 1, "Please enter note title: ", rest=True)
     record = book.find(name)
     record.remove_note(title)
     return "Note removed."
 
 
 @input_error
-def search_note(book):
+def search_note(book, *args):
     """
-    Search for a note by title.
+    Search for notes by title, title prefix or words in the note.
     """
-    title = input("Please enter note title: ")
+    from prettytable import PrettyTable
+
+    title = get_arg(args, 0, "Please enter note title: ", rest=True)
     if book.data.values():
         table = PrettyTable()
         table.field_names = ["Contact Name", "Note Title", "Note Content"]
         table.align = "l"
-        note_title, note, contact_name = book.search_note(title)
-        table.add_row(
-                [contact_name, note_title, note]
-            )
+        for note_title, note, contact_name in book.search_note(title):
+            table.add_row(
+                    [contact_name, note_title, note]
+                )
         return table
     else:
-        print("No notes available.")
+        return "No notes available."
+
+
+@input_error
+def import_file(book, *args):
+    """
+    Import contacts from a .csv, .jsonl or .vcf file. Existing contacts are skipped, replaced or merged.
+    """
+    from .transfer import import_contacts
+
+    filename = get_arg(args, 0, "Please enter file name: ")
+    # import FILE [skip|replace|merge], skip by default
+    on_duplicate = args[1].lower() if len(args) > 1 else "skip"
+    return str(import_contacts(book, filename, on_duplicate=on_duplicate, workers=process_workers))
 
-available_commands = {
-    "add-contact" : "add_contact",
-    "remove-contact" : "remove_contact",
-    "add-phone" : "add_phone",
-    "edit-phone" : "edit_phone",
-    "remove-phone" : "remove_phone",
-    "show-phones" : "show_phones",
-    "all" : "show_all",
-    "add-birthday": "add_birthday",
-    "show-birthday" : "show_birthday",
-    "add-address" : "add_address",
-    "edit-address" :"edit_address",
-    "remove-address" : "remove_address",
-    "add-email":"add_email",
-    "show-emails":"show_emails",
-    "remove-email":"remove_email",
-    "add-note" : "add_note",
-    "edit-note" : "edit_note",
-    "remove-note" : "remove_note",
-    "search-note" : "search_note",
-    "birthdays" : "birthdays",
-    "help" : "show_help",
-    "exit" : "exit",
-    "close" : "close",
-    "hello" : "hello"
-}
+
+@input_error
+def export_file(book, *args):
+    """
+    Export all contacts to a .csv, .jsonl or .vcf file.
+    """
+    from .transfer import export_contacts
+
+    filename = get_arg(args, 0, "Please enter file name: ", rest=True)
+    metrics.count("scan.full.export")
+    count = export_contacts(book, filename)
+    return f"Exported {count} contacts to '{filename}'."
+
+
+@input_error
+def dedupe(book, *args):
+    """
+    Find contacts that look like the same person. "dedupe apply" merges them, a threshold (0.8 by default) can follow.
+    """
+    from .dedupe import apply_merges, find_duplicates
+
+    apply = bool(args) and args[0].lower() == "apply"
+    if apply:
+        args = args[1:]
+    try:
+        threshold = float(args[0]) if args else 0.8
+    except ValueError:
+        raise ValueError("Threshold should be a number from 0 to 1.")
+    metrics.count("scan.full.dedupe")
+    report = find_duplicates(book, threshold, workers=process_workers)
+    if apply:
+        apply_merges(book, report)
+    return str(report)
 
 
-def show_help():
+@input_error
+def birthdays(book, *args):
+    """
+    Show birthdays that will occur during the next day interval. The default interval is 7 days.
+    """
+    # Default to 7 days if no argument provided
+    if args and not args[0].isdigit():
+        raise ValueError("Number of days should be a whole number.")
+    days = int(args[0]) if args else 7
+    return book.birthdays(days)
+
+
+@input_error
+def show_reminders(book, *args):
+    """
+    Show the birthday reminders due during the next day interval. The default interval is 30 days.
+    """
+    from .reminders import format_reminder
+
+    if reminder_scheduler is None:
+        return "Reminders are off, start with --remind DAYS to get them."
+    if args and not args[0].isdigit():
+        raise ValueError("Number of days should be a whole number.")
+    days = int(args[0]) if args else 30
+    reminders = reminder_scheduler.timeline(days)
+    if not reminders:
+        return "No reminders due."
+    return "\n".join(f"{due:%d.%m.%Y}: {format_reminder(reminder)}" for due, reminder in reminders)
+
+
+@input_error
+def flush(book, *args):
+    """
+    Write the changes not saved yet to disk right away and show how long it took.
+    """
+    changes, contacts = book.changes, len(book.dirty)
+    start = perf_counter_ns()
+    conflicts = book.commit()
+    milliseconds = (perf_counter_ns() - start) / 1e6
+    return "\n".join([
+        f"Flushed {changes} changes to {contacts} contacts in {milliseconds:.1f} ms.",
+        *map(conflict_message, conflicts),
+    ])
+
+
+@input_error
+def save(book, *args):
+    """
+    Save the whole book to disk now and show how long it took.
+    """
+    filename = book.storage.filename
+    start = perf_counter_ns()
+    conflicts = book.save_to_file(filename)
+    milliseconds = (perf_counter_ns() - start) / 1e6
+    return "\n".join([
+        f"Saved {len(book.data)} contacts to '{filename}' in {milliseconds:.1f} ms.",
+        *map(conflict_message, conflicts),
+    ])
+
+
+@input_error
+def show_stats(book, *args):
+    """
+    Show command latencies, index and load/save statistics. "stats FILE" also writes them to FILE as JSON.
+    """
+    from prettytable import PrettyTable
+
+    if not metrics.enabled:
+        return "Statistics are off, start without --no-stats to collect them."
+    table = PrettyTable()
+    table.field_names = ["Command", "Count", "Mean ms", "p50 ms", "p99 ms", "Max ms"]
+    table.align = "r"
+    table.align["Command"] = "l"
+    for command, histogram in sorted(metrics.commands.items()):
+        table.add_row([
+            command, histogram.count, f"{histogram.total / histogram.count / 1e6:.3f}",
+            f"{histogram.percentile(50) * 1000:.3f}", f"{histogram.percentile(99) * 1000:.3f}",
+            f"{histogram.max / 1e6:.3f}",
+        ])
+    lines = [str(table)]
+    for kind, (count, seconds, size) in sorted(metrics.io.items()):
+        lines.append(f"{kind}: {count} times, {seconds * 1000:.1f} ms, {size} bytes")
+    cache = book.cache.stats()
+    lines.append(
+        f"query cache: {cache['hits']} hits, {cache['misses']} misses ({cache['hit_rate']:.0%} hits), "
+        f"{cache['entries']} of {cache['maxsize']} entries"
+    )
+    lines += [f"{name}: {value}" for name, value in sorted(metrics.counters.items())]
+    lines += [f"{site['where']}: {site['bytes']} bytes in {site['blocks']} blocks" for site in top_allocations()]
+    if args:
+        filename = " ".join(args)
+        metrics.dump(filename)
+        lines.append(f"Statistics written to '{filename}'.")
+    return "\n".join(lines)
+
+
+def hello(book, *args):
+    """
+    Display a welcome message.
+    """
+    return "How can I help you?"
+
+
+def show_help(book, *args):
     """
     Display help information for available commands.
     """
-    print("Available commands:")
-    for command in available_commands.keys():
-        if command in ["exit","close"]:
-            command_desc = "Exit the assistant bot."
-        else:
-            func_name = available_commands[command]
-            func = globals().get(func_name.replace("-", "_"))
-            docstring = func.__doc__.strip() if func and func.__doc__ else "None"
-            command_desc = docstring
+    lines = ["Available commands:"]
+    for command, func in available_commands.items():
+        lines.append(f"{command: <15}: {func.__doc__.strip() if func.__doc__ else 'None'}")
+    for command in ["exit", "close"]:
+        lines.append(f"{command: <15}: Exit the assistant bot.")
+    return "\n".join(lines)
 
-        if command == "hello":
-            command_desc = "Display a welcome message."
 
-        if command == "birthdays":
-            command_desc = "Show birthdays that will occur during the next day interval. The default interval is 7 days."
+# Command name to handler, every handler takes the book and the inline arguments
+available_commands = {
+    "add-contact" : add_contact,
+    "remove-contact" : remove_contact,
+    "add-phone" : add_phone,
+    "edit-phone" : edit_phone,
+    "remove-phone" : remove_phone,
+    "show-phones" : show_phones,
+    "search-contact" : search_contact,
+    "find-by-phone" : find_by_phone,
+    "find-by-email" : find_by_email,
+    "find-by-address" : find_by_address,
+    "all" : show_all,
+    "add-birthday": add_birthday,
+    "show-birthday" : show_birthday,
+    "add-address" : add_address,
+    "edit-address" : edit_address,
+    "remove-address" : remove_address,
+    "add-email": add_email,
+    "show-emails": show_emails,
+    "remove-email": remove_email,
+    "add-note" : add_note,
+    "edit-note" : edit_note,
+    "remove-note" : remove_note,
+    "search-note" : search_note,
+    "import" : import_file,
+    "export" : export_file,
+    "dedupe" : dedupe,
+    "birthdays" : birthdays,
+    "reminders" : show_reminders,
+    "stats" : show_stats,
+    "flush" : flush,
+    "save" : save,
+    "help" : show_help,
+    "hello" : hello,
+}
 
-        print(f"{command: <15}: {command_desc}")
+# Commands that don't change the book, the server runs them side by side
+read_commands = {
+    "hello", "all", "show-phones", "search-contact", "find-by-phone", "find-by-email", "find-by-address",
+    "show-birthday", "birthdays", "reminders", "show-emails", "search-note", "export", "stats",
+}
 
 
 def get_user_input():
-    user_input = prompt("Enter a command: ", completer=WordCompleter(available_commands.keys()))
+    from prompt_toolkit import prompt
+    from prompt_toolkit.completion import WordCompleter
+
+    user_input = prompt("Enter a command: ", completer=WordCompleter([*available_commands, "exit", "close"]))
     return user_input
 
 
-def main():
+def run_command(book, command, args):
+    """
+    Run one command and return the text to print.
+    """
+    handler = available_commands.get(command)
+    if handler is None:
+        return "Invalid command."
+    if not metrics.enabled:
+        return handler(book, *args)
+    start = perf_counter_ns()
+    try:
+        return handler(book, *args)
+    finally:
+        metrics.record_command(command, perf_counter_ns() - start)
+
+
+def run_interactive(book, commit_interval=1.0, commit_changes=100):
+    """
+    Run commands typed at the prompt. Changes are committed in the background
+    (see autosave.py), a second after the first one or once commit_changes of
+    them are waiting, and on exit. Storages with commit_per_command, SQLite,
+    commit each command as one transaction instead.
+    """
+    from .autosave import BackgroundWriter
+
+    print("Welcome to the assistant bot!")
+    if getattr(book.storage, "commit_per_command", False):
+        writer, lock = None, nullcontext()
+    else:
+        writer = BackgroundWriter(book, commit_interval, commit_changes)
+        writer.start()
+        lock = writer.lock
     try:
-        book = AddressBook()
-        book.load_from_file("address_book.dat")
-        print("Welcome to the assistant bot!")
+        if reminder_scheduler is not None:
+            reminder_scheduler.fire_due()
         while True:
             user_input = get_user_input()
+            if not user_input.strip():
+                continue
             command, *args = parse_input(user_input)
 
             if command in ["close", "exit"]:
                 print("Good bye!")
                 break
-            elif command == "hello":
-                print("How can I help you?")
-            elif command == "all":
-                show_all(book)
-            elif command == "add-contact":
-                print(add_contact(book))
-            elif command == "remove-contact":
-                print(remove_contact(book))
-            elif command == "add-phone":
-                print(add_phone(book))
-            elif command == "edit-phone":
-                print(edit_phone(book))
-            elif command == "remove-phone":
-                print(remove_phone(book))
-            elif command == "show-phones":
-                print(show_phones(book))
-            elif command == "add-birthday":
-                print(add_birthday(book))
-            elif command == "show-birthday":
-                print(show_birthday(book))
-            elif command == "birthdays":
-                # Default to 7 days if no argument provided
-                days = int(args[0]) if args else 7
-                print(book.birthdays(days))
-            elif command == "add-address":
-                print(add_address(book))
-            elif command == "edit-address":
-                print(edit_address(book))
-            elif command == "remove-address":
-                print(remove_address(book))
-            elif command == "add-email":
-                print(add_email(book))
-            elif command == "show-emails":
-                print(show_emails(book))
-            elif command == "remove-email":
-                print(remove_email(book))
-            elif command == "add-note":
-                print(add_note(book))
-            elif command == "edit-note":
-                print(edit_note(book))
-            elif command == "remove-note":
-                print(remove_note(book))
-            elif command == "search-note":
-                print(search_note(book))
-            elif command == "help":
-                show_help()
-            else:
-                print("Invalid command.")
+            with lock:
+                # Another session may have changed the book meanwhile
+                conflicts = book.sync()
+                message = run_command(book, command, args)
+                if writer is None:
+                    conflicts += book.commit()
+                else:
+                    writer.notify()
+            if message:
+                print(message)
+            if reminder_scheduler is not None:
+                with lock:
+                    # Reminders of a new day, or of contacts added to a day announced already
+                    reminder_scheduler.fire_due()
+            if writer is not None:
+                background_conflicts, error = writer.take_report()
+                conflicts += background_conflicts
+                if error is not None:
+                    print(f"Saving in the background failed: {error}")
+            report_conflicts(conflicts)
+    finally:
+        if writer is not None:
+            writer.close()
+
+
+def conflict_message(name):
+    return f"Contact '{name}' was also changed in another session, your version is kept."
+
+
+def report_conflicts(names):
+    for name in names:
+        print(conflict_message(name))
+
+
+def run_batch(book, filename):
+    """
+    Run commands with inline arguments, one per line, from a file or "-" for stdin.
+    Empty lines and lines starting with # are skipped.
+    """
+    global batch_mode
+    batch_mode = True
+    file = sys.stdin if filename == "-" else open(filename, encoding="utf-8")
+    try:
+        for line in file:
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            command, *args = parse_input(line)
+            if command in ["close", "exit"]:
+                break
+            message = run_command(book, command, args)
+            if message:
+                print(message)
+    finally:
+        batch_mode = False
+        if file is not sys.stdin:
+            file.close()
+
+
+def run_server(book, host, port, commit_interval):
+    import asyncio
+    from .server import AssistantServer
+
+    global batch_mode, process_workers
+    batch_mode = True
+    process_workers = 1
+    commands = [command for command in available_commands if command != "help"]
+    server = AssistantServer(
+        book, run_command, commands, read_commands, commit_interval, view_commands={"export"},
+        file_commands={"export", "stats"},
+    )
+    try:
+        asyncio.run(server.serve(host, port))
+    except KeyboardInterrupt:
+        print("Good bye!")
+    finally:
+        batch_mode = False
+        process_workers = None
+
+
+def run_federated(filenames, words, workers=None):
+    """
+    Answer "birthdays [days]", "search-note TITLE" or "search-contact NAME"
+    across several address books at once (see federation.py). Notes and
+    contacts are printed as each book is done, birthdays merged at the end.
+    """
+    from .federation import federated_query, merge_birthdays
+
+    if not words or words[0] not in ["birthdays", "search-note", "search-contact"]:
+        print("Query the books with: birthdays [days], search-note TITLE or search-contact NAME.")
+        return
+    command, *args = words
+    if command == "birthdays":
+        if args and not args[0].isdigit():
+            print("Number of days should be a whole number.")
+            return
+        args = [int(args[0]) if args else 7]
+    else:
+        args = [" ".join(args)]
+
+    results, found = [], False
+    for filename, result, error in federated_query(filenames, command, *args, workers=workers):
+        if error is not None:
+            print(f"{filename}: {error}")
+        elif command == "birthdays":
+            results.append((filename, result))
+        elif command == "search-note":
+            for note_title, note, contact_name in result:
+                print(f"{filename}: {contact_name}: {note_title}: {note}")
+        else:
+            for name, phones in result:
+                print(f"{filename}: {name}: {', '.join(phones)}")
+        found = found or bool(result)
+    if command == "birthdays":
+        # Books in the order given, whichever finished first
+        results.sort(key=lambda item: filenames.index(item[0]))
+        for day_of_week, names in merge_birthdays(results, args[0]).items():
+            print(f"{day_of_week}: {', '.join(f'{name} ({filename})' for name, filename in names)}")
+    if not found:
+        print({
+            "birthdays": "No upcoming birthdays.",
+            "search-note": "No note with such title.",
+            "search-contact": "No matching contacts.",
+        }[command])
+
+
+def main(argv=None):
+    global reminder_scheduler
+    parser = argparse.ArgumentParser(prog="run_personal_assistant", description="Address book and notes assistant.")
+    parser.add_argument(
+        "mode", nargs="?", choices=["serve", "query"],
+        help="serve: answer the commands as a JSON API over HTTP instead of the prompt, "
+        "query: run one query across the --books",
+    )
+    parser.add_argument(
+        "query", nargs="*",
+        help="for query: birthdays [days], search-note TITLE or search-contact NAME",
+    )
+    parser.add_argument(
+        "--books", nargs="+", metavar="FILE",
+        help="for query: the address books to search, address_book.dat files or SQLite .db files",
+    )
+    parser.add_argument(
+        "--workers", type=int, metavar="N", help="for query: processes reading the books (default one per CPU)",
+    )
+    parser.add_argument("--host", default="127.0.0.1", help="address the server listens on (default 127.0.0.1)")
+    parser.add_argument("--port", type=int, default=8080, help="port the server listens on (default 8080)")
+    parser.add_argument(
+        "--commit-interval", type=float, metavar="MS",
+        help="how long writes are gathered into one commit (default 50 ms for the server, 1000 ms at the prompt)",
+    )
+    parser.add_argument(
+        "--commit-changes", type=int, default=100, metavar="N",
+        help="at the prompt, commit as soon as N changes are waiting (default 100)",
+    )
+    parser.add_argument(
+        "--batch", nargs="?", const="-", metavar="FILE",
+        help="run commands with inline arguments from FILE (stdin if omitted) and save once at the end",
+    )
+    parser.add_argument(
+        "--storage", choices=["file", "columnar", "sqlite"], default="file",
+        help="keep the book in address_book.dat (default), in address_book.dat with columnar snapshots "
+        "read whole on start, or in the SQLite database address_book.db",
+    )
+    parser.add_argument(
+        "--remind", type=int, nargs="+", metavar="DAYS",
+        help="at the prompt, remind of birthdays DAYS days ahead, e.g. --remind 7 1 0",
+    )
+    parser.add_argument(
+        "--remind-webhook", metavar="URL", help="also post the reminders as JSON to URL",
+    )
+    parser.add_argument("--no-stats", action="store_true", help="don't collect the statistics shown by the stats command")
+    parser.add_argument("--stats-file", metavar="FILE", help="write the statistics to FILE as JSON on exit")
+    parser.add_argument(
+        "--profile", metavar="FILE",
+        help="run under cProfile and write the profile to FILE on exit, trace memory allocations for stats",
+    )
+    options = parser.parse_args(argv)
+
+    if options.mode == "query":
+        if not options.books:
+            parser.error("query needs the address books to search, give them with --books")
+        run_federated(options.books, options.query, options.workers)
+        return
+    metrics.enabled = not options.no_stats
+    profile = start_profiling() if options.profile else None
+
+    if options.storage == "sqlite":
+        from .sqlite_storage import SQLiteStorage, migrate_to_sqlite
+
+        filename = "address_book.db"
+        if not os.path.exists(filename) and os.path.exists("address_book.dat"):
+            count = migrate_to_sqlite("address_book.dat", filename)
+            print(f"Copied {count} contacts from address_book.dat to {filename}.")
+        book = AddressBook(SQLiteStorage(filename))
+    else:
+        filename = "address_book.dat"
+        if options.storage == "columnar":
+            from .storage import JournalStorage
+
+            book = AddressBook(JournalStorage(filename, snapshot_format="columnar"))
+        else:
+            book = AddressBook()
+    book.load_from_file(filename)
+    if options.remind:
+        from .reminders import ReminderScheduler, print_reminder, webhook
+
+        hooks = [print_reminder] + ([webhook(options.remind_webhook)] if options.remind_webhook else [])
+        try:
+            reminder_scheduler = ReminderScheduler(book, options.remind, hooks)
+        except ValueError as e:
+            parser.error(str(e))
+    try:
+        if options.mode == "serve":
+            commit_interval = 50 if options.commit_interval is None else options.commit_interval
+            run_server(book, options.host, options.port, commit_interval / 1000)
+        elif options.batch:
+            run_batch(book, options.batch)
+        else:
+            commit_interval = 1000 if options.commit_interval is None else options.commit_interval
+            run_interactive(book, commit_interval / 1000, options.commit_changes)
     finally:
-        book.save_to_file("address_book.dat")
+        report_conflicts(book.save_to_file(filename))
+        if options.stats_file and metrics.enabled:
+            metrics.dump(options.stats_file)
+        if profile is not None:
+            stop_profiling(profile, options.profile)
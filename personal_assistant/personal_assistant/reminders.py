@@ -0,0 +1,171 @@
+from datetime import date, timedelta
+from itertools import count
+import heapq, json
+
+from .metrics import metrics
+
+
+def birthday_days(celebrated):
+    # Birthdays on a weekend are celebrated on the Monday after, like AddressBook.get_birthdays_days_interval
+    back = (2, 1, 0) if celebrated.weekday() == 0 else (0,)
+    return [celebrated - timedelta(days=days) for days in back]
+
+
+def celebrated_on(birthday, day):
+    # Whether a birthday falls on day, 29 February on 28 February of common years
+    if (birthday.month, birthday.day) == (day.month, day.day):
+        return True
+    leap_day = (birthday.month, birthday.day) == (2, 29)
+    return leap_day and (day.month, day.day) == (2, 28) and (day + timedelta(days=1)).month == 3
+
+
+def format_reminder(reminder):
+    names = ", ".join(reminder["names"])
+    celebrated = reminder["date"]
+    if reminder["days_before"] == 0:
+        when = "today"
+    elif reminder["days_before"] == 1:
+        when = f"tomorrow, {celebrated.strftime('%A')} {celebrated:%d.%m.%Y}"
+    else:
+        when = f"in {reminder['days_before']} days, {celebrated.strftime('%A')} {celebrated:%d.%m.%Y}"
+    return f"Reminder: birthdays {when}: {names}"
+
+
+def print_reminder(reminder):
+    print(format_reminder(reminder))
+
+
+def webhook(url, timeout=2.0):
+    """
+    Return a hook posting each reminder as JSON to url, e.g. a local chat bot
+    or a script standing in for one.
+    """
+    from urllib.request import Request, urlopen
+
+    def post(reminder):
+        body = json.dumps(reminder, default=str).encode()
+        request = Request(url, data=body, headers={"Content-Type": "application/json"}, method="POST")
+        with urlopen(request, timeout=timeout) as response:
+            response.read()
+
+    return post
+
+
+class ReminderScheduler:
+    """
+    Fires the hooks with a reminder of the birthdays celebrated lead_times days
+    ahead, e.g. (7, 1, 0) for a week before, the day before and on the day.
+
+    The timeline is a heap of (day the reminder is due, celebration date, lead
+    time) for every weekday of the next horizon days, so it costs horizon *
+    len(lead_times) entries whatever the size of the book. Names are read from
+    the book's birthday index when a reminder fires, the index follows
+    add_birthday and delete on its own; update() only adds a one-off reminder
+    for a contact whose day was already announced today.
+
+    A reminder is a dict with the celebration "date" (Monday for weekend
+    birthdays), "days_before" and the "names".
+    """
+    def __init__(self, book, lead_times=(0,), hooks=(print_reminder,), horizon=365, today=None):
+        self.lead_times = sorted(set(lead_times), reverse=True)
+        if not self.lead_times or self.lead_times[-1] < 0 or self.lead_times[0] > horizon:
+            raise ValueError(f"Reminder lead times should be whole numbers of days from 0 to {horizon}.")
+        self.book = book
+        self.hooks = list(hooks)
+        self.horizon = horizon
+        self.heap = []
+        self.sequence = count()
+        self.start = today or date.today()
+        # First celebration day not scheduled yet
+        self.next_day = self.start
+        # Last day fire_due() ran for
+        self.checked = None
+        self._extend(self.start)
+        book.listeners.append(self)
+
+    def _extend(self, today):
+        until = today + timedelta(days=self.horizon)
+        events = []
+        while self.next_day <= until:
+            celebrated = self.next_day
+            self.next_day += timedelta(days=1)
+            if celebrated.weekday() >= 5:
+                continue
+            for lead in self.lead_times:
+                due = celebrated - timedelta(days=lead)
+                if due >= self.start:
+                    events.append((due, celebrated, lead, next(self.sequence), None))
+        if events:
+            self.heap += events
+            heapq.heapify(self.heap)
+
+    def _reminder(self, celebrated, lead, names):
+        return {"date": celebrated, "days_before": lead, "names": names}
+
+    def _names(self, celebrated, names):
+        if names is None:
+            return [name for day in birthday_days(celebrated) for name in self.book.birthdays_on(day)]
+        # One-off reminders, for the contacts still there
+        return [name for name in names if self.book.find(name) is not None]
+
+    def fire_due(self, today=None):
+        """
+        Call the hooks with every reminder due by today, return how many fired.
+        """
+        today = today or date.today()
+        self._extend(today)
+        fired = 0
+        while self.heap and self.heap[0][0] <= today:
+            _, celebrated, lead, _, names = heapq.heappop(self.heap)
+            names = self._names(celebrated, names)
+            if names:
+                self._fire(self._reminder(celebrated, lead, names))
+                fired += 1
+        self.checked = today
+        return fired
+
+    def _fire(self, reminder):
+        metrics.count("reminders.fired")
+        for hook in self.hooks:
+            try:
+                hook(reminder)
+            except Exception:
+                # A hook that fails (a webhook down) must not stop the others or the prompt
+                metrics.count("reminders.hook_errors")
+
+    def timeline(self, days=None, today=None):
+        """
+        Return the reminders due from today to today + days (the whole horizon
+        by default) in the order they will fire, without firing them.
+        """
+        today = today or date.today()
+        self._extend(today)
+        until = today + timedelta(days=self.horizon if days is None else days)
+        reminders = []
+        for due, celebrated, lead, _, names in sorted(self.heap):
+            if due > until:
+                break
+            names = self._names(celebrated, names)
+            if names:
+                reminders.append((due, self._reminder(celebrated, lead, names)))
+        return reminders
+
+    def next_due(self):
+        # Day of the next reminder, whether anyone has a birthday then or not
+        return self.heap[0][0] if self.heap else None
+
+    def update(self, record, op, args):
+        if op not in ("add_record", "add_birthday") or self.checked is None or not hasattr(record, "birthday"):
+            return
+        birthday = record.birthday.date
+        for lead in self.lead_times:
+            # The celebration announced today for this lead time, if any
+            celebrated = self.checked + timedelta(days=lead)
+            if celebrated.weekday() >= 5:
+                continue
+            if any(celebrated_on(birthday, day) for day in birthday_days(celebrated)):
+                heapq.heappush(self.heap, (self.checked, celebrated, lead, next(self.sequence), [record.name.value]))
+
+    def close(self):
+        if self in self.book.listeners:
+            self.book.listeners.remove(self)
@@ -0,0 +1,66 @@
+from itertools import chain, islice
+import textwrap
+
+
+COLUMNS = ["Name", "Phones", "Address", "Birthday", "Email", "Note Title", "Note Content"]
+
+
+def record_row(record):
+    return [
+        record.name.value,
+        "\n".join(p.value for p in record.phones),
+        record.address.value if record.address else "",
+        record.birthday.value if hasattr(record, "birthday") else "",
+        "\n".join(e.value for e in record.emails),
+        "\n".join(note.title for note in record.notes),
+        "\n".join(note.note for note in record.notes),
+    ]
+
+
+def column_widths(rows, max_width):
+    widths = [len(column) for column in COLUMNS]
+    for row in rows:
+        for i, cell in enumerate(row):
+            for line in cell.splitlines():
+                widths[i] = max(widths[i], min(len(line), max_width))
+    return widths
+
+
+def wrap_cell(cell, width):
+    lines = []
+    for line in cell.splitlines() or [""]:
+        lines.extend(textwrap.wrap(line, width) or [""])
+    return lines
+
+
+def format_row(cells, widths):
+    columns = [wrap_cell(cell, width) for cell, width in zip(cells, widths)]
+    for i in range(max(len(column) for column in columns)):
+        yield "| " + " | ".join(
+            (column[i] if i < len(column) else "").ljust(width) for column, width in zip(columns, widths)
+        ) + " |"
+
+
+def render_table(rows, sample_size=100, max_width=40):
+    """
+    Yield the lines of a table as rows arrive.
+
+    Column widths are taken from the first sample_size rows, longer values are
+    wrapped, so the first line is out before the remaining rows are even read.
+    """
+    rows = iter(rows)
+    sample = list(islice(rows, sample_size))
+    widths = column_widths(sample, max_width)
+    divider = "+" + "+".join("-" * (width + 2) for width in widths) + "+"
+    yield divider
+    yield from format_row(COLUMNS, widths)
+    yield divider
+    for row in chain(sample, rows):
+        yield from format_row(row, widths)
+        yield divider
+
+
+def page_rows(data, page, size):
+    # page is 1-based, the names before it are skipped without reading their records
+    names = islice(data, (page - 1) * size, page * size)
+    return (record_row(data[name]) for name in names)
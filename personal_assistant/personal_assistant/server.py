@@ -0,0 +1,267 @@
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from itertools import islice
+from urllib.parse import parse_qs, urlsplit
+import asyncio, json
+
+from .transfer import contact_from_record
+
+
+MAX_BODY = 1 << 20
+REASONS = {
+    200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed", 413: "Payload Too Large",
+    415: "Unsupported Media Type", 500: "Internal Server Error",
+}
+
+
+class HTTPError(Exception):
+    # close: the rest of the connection can't be read as requests anymore
+    def __init__(self, status, message, close=False):
+        super().__init__(message)
+        self.status = status
+        self.close = close
+
+
+class ReadWriteLock:
+    """
+    Any number of readers or a single writer. A waiting writer keeps new readers
+    out, so a steady stream of lookups can't starve it.
+    """
+    def __init__(self):
+        self.readers = 0
+        self.writer = False
+        self.writers_waiting = 0
+        self.condition = asyncio.Condition()
+
+    @asynccontextmanager
+    async def read(self):
+        async with self.condition:
+            await self.condition.wait_for(lambda: not self.writer and not self.writers_waiting)
+            self.readers += 1
+        try:
+            yield
+        finally:
+            async with self.condition:
+                self.readers -= 1
+                self.condition.notify_all()
+
+    @asynccontextmanager
+    async def write(self):
+        async with self.condition:
+            self.writers_waiting += 1
+            await self.condition.wait_for(lambda: not self.writer and not self.readers)
+            self.writers_waiting -= 1
+            self.writer = True
+        try:
+            yield
+        finally:
+            async with self.condition:
+                self.writer = False
+                self.condition.notify_all()
+
+
+async def read_request(reader):
+    """
+    Return (method, path, headers, body) of the next request on the connection,
+    None once the client has closed it.
+    """
+    line = await reader.readline()
+    if not line:
+        return None
+    try:
+        method, path, _ = line.decode("latin-1").split()
+    except ValueError:
+        raise HTTPError(400, "Malformed request line.", close=True) from None
+    headers = {}
+    while True:
+        line = await reader.readline()
+        if line in (b"\r\n", b"\n", b""):
+            break
+        name, _, value = line.decode("latin-1").partition(":")
+        headers[name.strip().lower()] = value.strip()
+    try:
+        length = int(headers.get("content-length") or 0)
+    except ValueError:
+        length = -1
+    if length < 0:
+        raise HTTPError(400, "Content-Length should be a whole number.", close=True)
+    if length > MAX_BODY:
+        raise HTTPError(413, "Request body is too large.", close=True)
+    body = await reader.readexactly(length) if length else b""
+    return method.upper(), path, headers, body
+
+
+def response(status, payload, keep_alive=True):
+    body = json.dumps(payload, ensure_ascii=False).encode()
+    head = (
+        f"HTTP/1.1 {status} {REASONS[status]}\r\n"
+        "Content-Type: application/json; charset=utf-8\r\n"
+        f"Content-Length: {len(body)}\r\n"
+        f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n"
+    )
+    return head.encode() + body
+
+
+class AssistantServer:
+    """
+    JSON over HTTP front end for the commands of the assistant.
+
+    POST /<command> with {"args": [...]} and Content-Type application/json
+    runs the command like an inline CLI call and answers {"command", "result"};
+    read commands also accept GET /<command>?arg=...&arg=... and GET /commands
+    lists them all. file_commands, which write files, take POST only: with the
+    JSON content type a web page can't send one without a CORS preflight.
+    "all" answers {"contacts", "page", "pages"}, 100 contacts a page by default.
+
+    Read commands run side by side on a thread pool, write commands one at a
+    time. "all" and the view_commands, long scans of the whole book, run on a
+    snapshot of it (see views.py) without holding writes back. A write is
+    acknowledged once it is on disk: commits are batched, one commit covers
+    every write of the last commit_interval seconds or up to max_batch writes,
+    a failed commit answers each of them with a 500 error.
+    """
+    def __init__(self, book, run_command, commands, read_commands, commit_interval=0.05, max_batch=256, workers=4,
+                 view_commands=(), file_commands=()):
+        self.book = book
+        self.run_command = run_command
+        self.commands = commands
+        self.read_commands = read_commands
+        self.view_commands = view_commands
+        self.file_commands = file_commands
+        self.commit_interval = commit_interval
+        self.max_batch = max_batch
+        self.executor = ThreadPoolExecutor(workers)
+        self.lock = None
+        self.commit_future = None
+        self.uncommitted = 0
+        self.dirty = None
+        self.batch_full = None
+
+    async def serve(self, host, port):
+        # Created here so they belong to the running loop
+        self.lock = ReadWriteLock()
+        self.dirty = asyncio.Event()
+        self.batch_full = asyncio.Event()
+        server = await asyncio.start_server(self.handle_connection, host, port)
+        committer = asyncio.create_task(self.commit_loop())
+        print(f"Serving on http://{host}:{port}, press Ctrl+C to stop.", flush=True)
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            committer.cancel()
+            self.executor.shutdown()
+
+    async def handle_connection(self, reader, writer):
+        try:
+            while True:
+                try:
+                    request = await read_request(reader)
+                    if request is None:
+                        break
+                    method, path, headers, body = request
+                    keep_alive = headers.get("connection", "").lower() != "close"
+                    status, payload = 200, await self.dispatch(method, path, headers, body)
+                except HTTPError as e:
+                    keep_alive = not e.close
+                    status, payload = e.status, {"error": str(e)}
+                writer.write(response(status, payload, keep_alive))
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def dispatch(self, method, path, headers, body):
+        url = urlsplit(path)
+        command = url.path.strip("/")
+        if command == "commands" and method == "GET":
+            return {"commands": self.commands}
+        if command not in self.commands:
+            raise HTTPError(404, f"Unknown command '{command}'.")
+
+        if method == "GET" and command in self.read_commands and command not in self.file_commands:
+            args = parse_qs(url.query).get("arg", [])
+        elif method == "POST":
+            if headers.get("content-type", "").partition(";")[0].strip().lower() != "application/json":
+                raise HTTPError(415, "Send the args as Content-Type: application/json.")
+            try:
+                args = json.loads(body or b"{}").get("args", [])
+            except (ValueError, AttributeError):
+                raise HTTPError(400, 'Expected a JSON object like {"args": [...]}.') from None
+            if not isinstance(args, list) or not all(isinstance(arg, str) for arg in args):
+                raise HTTPError(400, "args should be a list of strings.")
+        else:
+            raise HTTPError(405, f"Use POST for '{command}'.")
+
+        if command == "all":
+            async with self.lock.read():
+                view = self.book.snapshot()
+            return await self.run(self.list_contacts, view, args)
+        if command in self.view_commands:
+            async with self.lock.read():
+                view = self.book.snapshot()
+            result = await self.run(self.run_command, view, command, args)
+        elif command in self.read_commands:
+            async with self.lock.read():
+                result = await self.run(self.run_command, self.book, command, args)
+        else:
+            async with self.lock.write():
+                result = await self.run(self.run_command, self.book, command, args)
+            try:
+                await self.committed()
+            except Exception as e:
+                raise HTTPError(500, f"The change was made but could not be saved: {e}") from None
+        return {"command": command, "result": result}
+
+    def run(self, func, *args):
+        return asyncio.get_running_loop().run_in_executor(self.executor, func, *args)
+
+    def list_contacts(self, view, args):
+        options = dict(zip(args[::2], args[1::2]))
+        try:
+            page = int(options.get("--page", 1))
+            size = int(options.get("--size", 100))
+        except ValueError:
+            raise HTTPError(400, "--page and --size should be whole numbers.") from None
+        if page < 1 or size < 1:
+            raise HTTPError(400, "--page and --size should be positive.")
+        # Only the records on the page are read, a lazy book decodes no others
+        names = islice(view, (page - 1) * size, page * size)
+        return {
+            "contacts": [contact_from_record(view[name]) for name in names],
+            "page": page,
+            "pages": (len(view) + size - 1) // size,
+        }
+
+    async def committed(self):
+        # Join the commit batch in flight, the first write of a batch starts it
+        if self.commit_future is None:
+            self.commit_future = asyncio.get_running_loop().create_future()
+            self.dirty.set()
+        future = self.commit_future
+        self.uncommitted += 1
+        if self.uncommitted >= self.max_batch:
+            self.batch_full.set()
+        await asyncio.shield(future)
+
+    async def commit_loop(self):
+        while True:
+            await self.dirty.wait()
+            try:
+                await asyncio.wait_for(self.batch_full.wait(), self.commit_interval)
+            except asyncio.TimeoutError:
+                pass
+            self.dirty.clear()
+            self.batch_full.clear()
+            future, self.commit_future, self.uncommitted = self.commit_future, None, 0
+            # The commit merges what other sessions wrote to the file, so nothing else runs
+            async with self.lock.write():
+                try:
+                    await self.run(self.book.commit)
+                except Exception as e:
+                    future.set_exception(e)
+                else:
+                    future.set_result(None)
@@ -0,0 +1,371 @@
+from collections.abc import MutableMapping
+from urllib.request import pathname2url
+import sqlite3
+
+from .address_book import AddressBook, Address, Birthday, Email, Name, Note, Phone, Record, normalize_email, stored_field
+from .indexes import BirthdayIndex, EmailIndex, NoteIndex, PhoneIndex, calendar_days, day_key, tokenize
+from .storage import JournalStorage
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS contacts (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL UNIQUE,
+    address TEXT,
+    -- date ordinal, and the day of year used by the birthdays query
+    birthday INTEGER,
+    birthday_key INTEGER
+);
+CREATE INDEX IF NOT EXISTS contacts_birthday_key ON contacts (birthday_key);
+
+CREATE TABLE IF NOT EXISTS phones (
+    id INTEGER PRIMARY KEY,
+    contact_id INTEGER NOT NULL REFERENCES contacts (id) ON DELETE CASCADE,
+    phone INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS phones_contact ON phones (contact_id);
+CREATE INDEX IF NOT EXISTS phones_phone ON phones (phone);
+
+CREATE TABLE IF NOT EXISTS emails (
+    id INTEGER PRIMARY KEY,
+    contact_id INTEGER NOT NULL REFERENCES contacts (id) ON DELETE CASCADE,
+    email TEXT NOT NULL,
+    -- lowercased for lookups
+    email_key TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS emails_contact ON emails (contact_id);
+CREATE INDEX IF NOT EXISTS emails_email_key ON emails (email_key);
+
+CREATE TABLE IF NOT EXISTS notes (
+    id INTEGER PRIMARY KEY,
+    contact_id INTEGER NOT NULL REFERENCES contacts (id) ON DELETE CASCADE,
+    title TEXT NOT NULL,
+    note TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS notes_contact ON notes (contact_id);
+CREATE INDEX IF NOT EXISTS notes_title ON notes (title);
+
+-- Full-text index over the note texts, kept in sync by triggers
+CREATE VIRTUAL TABLE IF NOT EXISTS notes_fts USING fts5(
+    note, content = 'notes', content_rowid = 'id', tokenize = 'unicode61 remove_diacritics 0'
+);
+CREATE TRIGGER IF NOT EXISTS notes_fts_insert AFTER INSERT ON notes BEGIN
+    INSERT INTO notes_fts (rowid, note) VALUES (new.id, new.note);
+END;
+CREATE TRIGGER IF NOT EXISTS notes_fts_delete AFTER DELETE ON notes BEGIN
+    INSERT INTO notes_fts (notes_fts, rowid, note) VALUES ('delete', old.id, old.note);
+END;
+CREATE TRIGGER IF NOT EXISTS notes_fts_update AFTER UPDATE ON notes BEGIN
+    INSERT INTO notes_fts (notes_fts, rowid, note) VALUES ('delete', old.id, old.note);
+    INSERT INTO notes_fts (rowid, note) VALUES (new.id, new.note);
+END;
+"""
+
+
+class SQLiteRecords(MutableMapping):
+    """
+    Contacts of an address book kept in SQLite, a record is read when first asked for.
+
+    Writes don't go through this mapping: the storage turns every mutation into
+    SQL, this only keeps the Record objects handed out so far.
+    """
+    def __init__(self, connection):
+        self.connection = connection
+        self.loaded = {}
+        self.book = None
+
+    def _read(self, name):
+        row = self.connection.execute(
+            "SELECT id, address, birthday FROM contacts WHERE name = ?", (name,)
+        ).fetchone()
+        if row is None:
+            return None
+        contact_id, address, birthday = row
+        phones = tuple(stored_field(Phone, phone) for phone, in self.connection.execute(
+            "SELECT phone FROM phones WHERE contact_id = ? ORDER BY id", (contact_id,)
+        ))
+        emails = tuple(stored_field(Email, email) for email, in self.connection.execute(
+            "SELECT email FROM emails WHERE contact_id = ? ORDER BY id", (contact_id,)
+        ))
+        notes = tuple(Note(title, note) for title, note in self.connection.execute(
+            "SELECT title, note FROM notes WHERE contact_id = ? ORDER BY id", (contact_id,)
+        ))
+        record = Record.__new__(Record)
+        record.__setstate__((
+            stored_field(Name, name), phones, emails, notes,
+            stored_field(Address, address) if address is not None else None,
+            stored_field(Birthday, birthday) if birthday is not None else None,
+        ))
+        record._book = self.book
+        return record
+
+    def __getitem__(self, name):
+        record = self.loaded.get(name)
+        if record is None:
+            record = self._read(name)
+            if record is None:
+                raise KeyError(name)
+            # Another thread may have read it meanwhile, everyone has to get the same record
+            record = self.loaded.setdefault(name, record)
+        return record
+
+    def __setitem__(self, name, record):
+        self.loaded[name] = record
+
+    def __delitem__(self, name):
+        if name not in self:
+            raise KeyError(name)
+        self.loaded.pop(name, None)
+
+    def __contains__(self, name):
+        return name in self.loaded or self.connection.execute(
+            "SELECT 1 FROM contacts WHERE name = ?", (name,)
+        ).fetchone() is not None
+
+    def __iter__(self):
+        # In chunks, so writes in between don't disturb an open cursor
+        last_id = 0
+        while True:
+            rows = self.connection.execute(
+                "SELECT id, name FROM contacts WHERE id > ? ORDER BY id LIMIT 1000", (last_id,)
+            ).fetchall()
+            if not rows:
+                return
+            for last_id, name in rows:
+                yield name
+
+    def __len__(self):
+        return self.connection.execute("SELECT COUNT(*) FROM contacts").fetchone()[0]
+
+
+class SQLBirthdayIndex(BirthdayIndex):
+    def __init__(self, connection):
+        self.connection = connection
+
+    def update(self, record, op, args):
+        pass
+
+    def upcoming(self, today, days):
+        calendar = list(calendar_days(today, days))
+        keys = [key for _, day_keys in calendar for key in day_keys]
+        names_by_key = {}
+        for start in range(0, len(keys), 500):
+            chunk = keys[start:start + 500]
+            rows = self.connection.execute(
+                f"SELECT birthday_key, name FROM contacts WHERE birthday_key IN ({','.join('?' * len(chunk))}) ORDER BY id",
+                chunk,
+            )
+            for key, name in rows:
+                names_by_key.setdefault(key, []).append(name)
+        for day, day_keys in calendar:
+            names = [name for key in day_keys for name in names_by_key.get(key, ())]
+            if names:
+                yield day, names
+
+
+class SQLNoteIndex(NoteIndex):
+    def __init__(self, connection):
+        self.connection = connection
+
+    def update(self, record, op, args):
+        pass
+
+    def search(self, query):
+        if not query:
+            return []
+        select = "SELECT c.name, n.title FROM notes n JOIN contacts c ON c.id = n.contact_id"
+        results = dict.fromkeys(self.connection.execute(f"{select} WHERE n.title = ? ORDER BY n.id", (query,)))
+        # Titles starting with the query, as a range so the title index is used
+        for key in self.connection.execute(
+            f"{select} WHERE n.title >= ? AND n.title < ? ORDER BY n.title, n.id", (query, query + "\U0010ffff")
+        ):
+            results.setdefault(key)
+        words = set(tokenize(query))
+        if words:
+            # Quoted words, all of them have to be in the note
+            match = " ".join(f'"{word}"' for word in words)
+            for key in self.connection.execute(
+                f"{select} JOIN notes_fts ON notes_fts.rowid = n.id WHERE notes_fts MATCH ? ORDER BY n.id", (match,)
+            ):
+                results.setdefault(key)
+        return list(results)
+
+
+class SQLPhoneIndex(PhoneIndex):
+    def __init__(self, connection):
+        self.connection = connection
+
+    def update(self, record, op, args):
+        pass
+
+    def find(self, value):
+        phone = self.normalize(value)
+        if len(phone) != 10:
+            return []
+        return [name for name, in self.connection.execute(
+            "SELECT DISTINCT c.name FROM phones p JOIN contacts c ON c.id = p.contact_id WHERE p.phone = ? ORDER BY c.id",
+            (int(phone),),
+        )]
+
+
+class SQLEmailIndex(EmailIndex):
+    def __init__(self, connection):
+        self.connection = connection
+
+    def update(self, record, op, args):
+        pass
+
+    def find(self, value):
+        return [name for name, in self.connection.execute(
+            "SELECT DISTINCT c.name FROM emails e JOIN contacts c ON c.id = e.contact_id WHERE e.email_key = ? ORDER BY c.id",
+            (self.normalize(value),),
+        )]
+
+
+class SQLiteStorage:
+    """
+    Address book in an SQLite database with tables for contacts, phones, emails
+    and notes.
+
+    Every record mutation is written as SQL right away and commit() ends the
+    transaction, the CLI commits once per command (commit_per_command) rather
+    than from the background writer. Birthday, note, phone and email queries
+    run in SQL instead of in-memory indexes.
+    """
+    # A transaction end is cheap, a command is acknowledged once it is durable
+    commit_per_command = True
+
+    def __init__(self, filename, read_only=False):
+        self.filename = filename
+        if read_only:
+            # Fails on writes, and the schema of an existing database is left as it is
+            uri = f"file:{pathname2url(filename)}?mode=ro"
+            self.connection = sqlite3.connect(uri, uri=True, check_same_thread=False)
+        else:
+            # The server runs commands on worker threads, one at a time for writes
+            self.connection = sqlite3.connect(filename, check_same_thread=False)
+            self.connection.execute("PRAGMA foreign_keys = ON")
+            self.connection.executescript(SCHEMA)
+        self.indexes = {
+            BirthdayIndex: SQLBirthdayIndex(self.connection),
+            NoteIndex: SQLNoteIndex(self.connection),
+            PhoneIndex: SQLPhoneIndex(self.connection),
+            EmailIndex: SQLEmailIndex(self.connection),
+        }
+
+    def index(self, index_class):
+        return self.indexes.get(index_class)
+
+    def load(self):
+        return SQLiteRecords(self.connection), []
+
+    def _contact_id(self, name):
+        return self.connection.execute("SELECT id FROM contacts WHERE name = ?", (name,)).fetchone()[0]
+
+    def _insert(self, record):
+        birthday = record.birthday.date if hasattr(record, "birthday") else None
+        contact_id = self.connection.execute(
+            "INSERT INTO contacts (name, address, birthday, birthday_key) VALUES (?, ?, ?, ?)",
+            (
+                record.name.value,
+                record.address.value if record.address else None,
+                birthday.toordinal() if birthday else None,
+                day_key(birthday.month, birthday.day) if birthday else None,
+            ),
+        ).lastrowid
+        self.connection.executemany(
+            "INSERT INTO phones (contact_id, phone) VALUES (?, ?)",
+            [(contact_id, int(phone.value)) for phone in record.phones],
+        )
+        self.connection.executemany(
+            "INSERT INTO emails (contact_id, email, email_key) VALUES (?, ?, ?)",
+            [(contact_id, email.value, email.key) for email in record.emails],
+        )
+        self.connection.executemany(
+            "INSERT INTO notes (contact_id, title, note) VALUES (?, ?, ?)",
+            [(contact_id, note.title, note.note) for note in record.notes],
+        )
+
+    def append(self, op, name, args):
+        execute = self.connection.execute
+        if op == "add_record":
+            execute("DELETE FROM contacts WHERE name = ?", (name,))
+            self._insert(*args)
+            return
+        if op == "delete":
+            execute("DELETE FROM contacts WHERE name = ?", (name,))
+            return
+
+        contact_id = self._contact_id(name)
+        if op == "add_phone":
+            execute("INSERT INTO phones (contact_id, phone) VALUES (?, ?)", (contact_id, int(args[0])))
+        elif op == "remove_phone":
+            execute(
+                "DELETE FROM phones WHERE id = (SELECT id FROM phones WHERE contact_id = ? AND phone = ? ORDER BY id LIMIT 1)",
+                (contact_id, int(args[0])),
+            )
+        elif op == "edit_phone":
+            old_phone, new_phone = args
+            execute(
+                "UPDATE phones SET phone = ? WHERE id = "
+                "(SELECT id FROM phones WHERE contact_id = ? AND phone = ? ORDER BY id LIMIT 1)",
+                (int(new_phone), contact_id, int(old_phone)),
+            )
+        elif op == "add_birthday":
+            birthday = Birthday(args[0]).date
+            execute(
+                "UPDATE contacts SET birthday = ?, birthday_key = ? WHERE id = ?",
+                (birthday.toordinal(), day_key(birthday.month, birthday.day), contact_id),
+            )
+        elif op == "add_email":
+            email, = args
+            execute(
+                "INSERT INTO emails (contact_id, email, email_key) VALUES (?, ?, ?)",
+                (contact_id, email, normalize_email(email)),
+            )
+        elif op == "remove_email":
+            # Record.remove_email matches the normalized address, like find-by-email
+            execute(
+                "DELETE FROM emails WHERE id = "
+                "(SELECT id FROM emails WHERE contact_id = ? AND email_key = ? ORDER BY id LIMIT 1)",
+                (contact_id, normalize_email(args[0])),
+            )
+        elif op in ("add_address", "edit_address"):
+            execute("UPDATE contacts SET address = ? WHERE id = ?", (args[0], contact_id))
+        elif op == "remove_address":
+            execute("UPDATE contacts SET address = NULL WHERE id = ?", (contact_id,))
+        elif op == "add_note":
+            title, note = args
+            execute("INSERT INTO notes (contact_id, title, note) VALUES (?, ?, ?)", (contact_id, title, note))
+        elif op == "edit_note":
+            title, note = args
+            execute("UPDATE notes SET note = ? WHERE contact_id = ? AND title = ?", (note, contact_id, title))
+        elif op == "remove_note":
+            execute("DELETE FROM notes WHERE contact_id = ? AND title = ?", (contact_id, args[0]))
+
+    def commit(self):
+        self.connection.commit()
+
+    def save(self, data):
+        self.commit()
+
+    def compact(self, data):
+        self.commit()
+        self.connection.execute("VACUUM")
+
+
+def migrate_to_sqlite(source, target):
+    """
+    Copy the address book file source (address_book.dat, with its journal) into
+    the SQLite database target in one transaction. Returns the number of contacts.
+    """
+    book = AddressBook(JournalStorage(source))
+    book.load_from_file(source)
+    storage = SQLiteStorage(target)
+    count = 0
+    for record in book.data.values():
+        storage.append("add_record", record.name.value, (record,))
+        count += 1
+    storage.commit()
+    storage.connection.close()
+    return count
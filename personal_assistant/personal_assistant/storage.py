@@ -0,0 +1,528 @@
+from collections.abc import MutableMapping
+from contextlib import contextmanager, nullcontext
+import mmap, os, pickle, shutil, struct, zlib
+
+from .metrics import metrics
+
+try:
+    import fcntl
+except ImportError:
+    # No cooperative locking where fcntl is missing (Windows)
+    fcntl = None
+
+
+SNAPSHOT_TAG = "personal_assistant.snapshot"
+SNAPSHOT_MAGIC = b"PABK"
+# Columnar snapshots (see columnar.py) share the first header fields
+COLUMNAR_MAGIC = b"PACS"
+SNAPSHOT_VERSION = 1
+SNAPSHOT_HEADER = struct.Struct("<4sHQQ")
+# name offset, name length, record offset, record length
+INDEX_ENTRY = struct.Struct("<QIQI")
+ORDER_ENTRY = struct.Struct("<I")
+JOURNAL_MAGIC = b"PAJ1"
+JOURNAL_HEADER = struct.Struct("<4sQ")
+ENTRY_HEADER = struct.Struct("<II")
+
+
+def atomic_write(filename, payload):
+    # Write to a temporary file and swap it in, so a crash never leaves a half-written file
+    tmp_filename = f"{filename}.tmp"
+    with open(tmp_filename, "wb") as file:
+        file.write(payload)
+        file.flush()
+        os.fsync(file.fileno())
+    os.replace(tmp_filename, filename)
+
+
+class SnapshotReader:
+    """
+    Memory-mapped snapshot file.
+
+    Layout: header (magic, version, generation, count), an index of fixed-size
+    entries sorted by name, the index positions in insertion order, the names
+    blob and one pickled record per contact. Only the index is touched at open
+    time, a record is unpickled when it is asked for.
+    """
+    def __init__(self, filename):
+        self.filename = filename
+        with open(filename, "rb") as file:
+            self.mm = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, self.generation, self.count = SNAPSHOT_HEADER.unpack_from(self.mm)
+        if magic != SNAPSHOT_MAGIC or version != SNAPSHOT_VERSION:
+            raise ValueError(f"'{filename}' is not a supported address book file.")
+        self.index_start = SNAPSHOT_HEADER.size
+        self.order_start = self.index_start + self.count * INDEX_ENTRY.size
+
+    def _entry(self, position):
+        return INDEX_ENTRY.unpack_from(self.mm, self.index_start + position * INDEX_ENTRY.size)
+
+    def _name_at(self, position):
+        name_offset, name_length, _, _ = self._entry(position)
+        return self.mm[name_offset:name_offset + name_length]
+
+    def _position(self, name):
+        # Binary search over the sorted index, comparing raw UTF-8 bytes
+        key = name.encode()
+        low, high = 0, self.count
+        while low < high:
+            middle = (low + high) // 2
+            if self._name_at(middle) < key:
+                low = middle + 1
+            else:
+                high = middle
+        if low < self.count and self._name_at(low) == key:
+            return low
+        return None
+
+    def __contains__(self, name):
+        return self._position(name) is not None
+
+    def raw(self, name):
+        position = self._position(name)
+        if position is None:
+            return None
+        _, _, record_offset, record_length = self._entry(position)
+        return self.mm[record_offset:record_offset + record_length]
+
+    def get(self, name):
+        payload = self.raw(name)
+        return None if payload is None else pickle.loads(payload)
+
+    def names(self):
+        # Names in the order the contacts were added
+        for i in range(self.count):
+            position, = ORDER_ENTRY.unpack_from(self.mm, self.order_start + i * ORDER_ENTRY.size)
+            yield self._name_at(position).decode()
+
+    def close(self):
+        self.mm.close()
+
+
+def write_snapshot(filename, generation, names, get_payload):
+    """
+    Write a snapshot file and swap it in atomically.
+
+    get_payload(name) returns the pickled record, payloads are streamed to disk
+    one by one so only the names are held in memory.
+    """
+    names = [name.encode() for name in names]
+    count = len(names)
+    by_name = sorted(range(count), key=names.__getitem__)
+    order = [0] * count
+    for position, i in enumerate(by_name):
+        order[i] = position
+
+    names_start = SNAPSHOT_HEADER.size + count * (INDEX_ENTRY.size + ORDER_ENTRY.size)
+    name_offsets = []
+    offset = names_start
+    for name in names:
+        name_offsets.append(offset)
+        offset += len(name)
+
+    tmp_filename = f"{filename}.tmp"
+    with open(tmp_filename, "wb") as file:
+        file.seek(names_start)
+        file.write(b"".join(names))
+        record_offsets = []
+        record_lengths = []
+        for name in names:
+            payload = get_payload(name.decode())
+            record_offsets.append(offset)
+            record_lengths.append(len(payload))
+            file.write(payload)
+            offset += len(payload)
+
+        file.seek(0)
+        file.write(SNAPSHOT_HEADER.pack(SNAPSHOT_MAGIC, SNAPSHOT_VERSION, generation, count))
+        file.write(b"".join(
+            INDEX_ENTRY.pack(name_offsets[i], len(names[i]), record_offsets[i], record_lengths[i])
+            for i in by_name
+        ))
+        file.write(b"".join(ORDER_ENTRY.pack(position) for position in order))
+        file.flush()
+        os.fsync(file.fileno())
+    os.replace(tmp_filename, filename)
+    return offset
+
+
+class LazyRecords(MutableMapping):
+    """
+    Contacts of an address book, decoded from the snapshot on first access.
+
+    Records read or added during the session live in a plain dict, names removed
+    from the snapshot are remembered so they stay hidden.
+    """
+    def __init__(self, snapshot=None, records=None):
+        self.snapshot = snapshot
+        self.loaded = dict(records or {})
+        # Names that are not part of the snapshot, in the order they were added
+        self.added = dict.fromkeys(self.loaded)
+        self.deleted = set()
+        self._book = None
+
+    @property
+    def book(self):
+        return self._book
+
+    @book.setter
+    def book(self, book):
+        self._book = book
+        for record in self.loaded.values():
+            record._book = book
+
+    def _in_snapshot(self, name):
+        return self.snapshot is not None and name not in self.deleted and name in self.snapshot
+
+    def __getitem__(self, name):
+        record = self.loaded.get(name)
+        if record is not None:
+            return record
+        if name in self.deleted or self.snapshot is None:
+            raise KeyError(name)
+        record = self.snapshot.get(name)
+        if record is None:
+            raise KeyError(name)
+        metrics.count("records.decoded")
+        record._book = self._book
+        # Another thread may have decoded it meanwhile, everyone has to get the same record
+        return self.loaded.setdefault(name, record)
+
+    def __setitem__(self, name, record):
+        if name in self.deleted:
+            # Back in its place in the snapshot, the loaded record shadows the old one
+            self.deleted.discard(name)
+        elif name not in self.loaded and not self._in_snapshot(name):
+            self.added[name] = None
+        self.loaded[name] = record
+
+    def __delitem__(self, name):
+        if name not in self:
+            raise KeyError(name)
+        self.loaded.pop(name, None)
+        if name in self.added:
+            del self.added[name]
+        else:
+            self.deleted.add(name)
+
+    def __contains__(self, name):
+        return name in self.loaded or self._in_snapshot(name)
+
+    def __iter__(self):
+        if self.snapshot is not None:
+            for name in self.snapshot.names():
+                if name not in self.deleted:
+                    yield name
+        yield from self.added
+
+    def __len__(self):
+        snapshot_count = self.snapshot.count if self.snapshot is not None else 0
+        return snapshot_count - len(self.deleted) + len(self.added)
+
+    def raw(self, name):
+        # Untouched records are copied as stored, without unpickling them
+        record = self.loaded.get(name)
+        if record is not None:
+            return pickle.dumps(record)
+        return self.snapshot.raw(name)
+
+    def rebase(self, snapshot):
+        # Point at a freshly written snapshot holding everything seen so far,
+        # not while a view of the book (see views.py) reads from the old one
+        with self._book.views_lock if self._book is not None else nullcontext():
+            if self.snapshot is not None:
+                self.snapshot.close()
+            self.snapshot = snapshot
+            self.added = {}
+            self.deleted = set()
+
+
+class PickleStorage:
+    """
+    Legacy storage: the whole book is pickled on every save.
+    """
+    def __init__(self, filename):
+        self.filename = filename
+
+    def load(self):
+        if not os.path.exists(self.filename):
+            return LazyRecords(), []
+        with open(self.filename, "rb") as file:
+            return LazyRecords(records=pickle.load(file)), []
+
+    def append(self, op, name, args):
+        pass
+
+    def commit(self):
+        pass
+
+    def save(self, data):
+        atomic_write(self.filename, pickle.dumps(dict(data)))
+
+
+class JournalStorage:
+    """
+    Snapshot plus append-only journal of record mutations.
+
+    Every mutation is appended to "<filename>.journal" as a small delta, so a save
+    costs O(changes). Once the journal outgrows the snapshot it is compacted: a new
+    snapshot is written and atomically swapped in, then a fresh journal is started.
+    The generation number stored in both files tells a stale journal apart.
+
+    The snapshot is memory-mapped (see SnapshotReader), a pickled file from older
+    versions is converted on first load and kept as "<filename>.bak". With
+    snapshot_format "columnar" snapshots are written in the format of
+    columnar.py instead, either format is read on load.
+
+    Several sessions can share the files: loads, commits and compactions hold an
+    exclusive fcntl lock on "<filename>.lock", and changes() tells what the other
+    sessions committed since, from the journal size, the snapshot mtime and the
+    generation number.
+
+    With read_only the files are only read, e.g. another team's book in a
+    federated query: no lock file, a pickled file is read without converting
+    it and a torn journal tail is skipped without truncating it. Saving
+    raises ValueError.
+    """
+    def __init__(self, filename, min_compact_size=1024 * 1024, fsync=True, snapshot_format="indexed", read_only=False):
+        self.filename = filename
+        self.read_only = read_only
+        self.snapshot_format = snapshot_format
+        self.journal_filename = f"{filename}.journal"
+        self.lock_filename = f"{filename}.lock"
+        self.min_compact_size = min_compact_size
+        self.fsync = fsync
+        self.generation = 0
+        self.snapshot_size = 0
+        self.snapshot_stat = None
+        self.journal_size = 0
+        # (contact name, encoded entry) not committed yet
+        self.pending = []
+        self.lock_file = None
+        self.lock_depth = 0
+        # Totals for the metrics, the snapshot counts as read once mapped
+        self.bytes_read = 0
+        self.bytes_written = 0
+
+    @contextmanager
+    def lock(self):
+        # Exclusive for every process using the file, nested uses lock once
+        if self.lock_depth == 0 and fcntl is not None and not self.read_only:
+            self.lock_file = open(self.lock_filename, "ab")
+            fcntl.flock(self.lock_file, fcntl.LOCK_EX)
+        self.lock_depth += 1
+        try:
+            yield
+        finally:
+            self.lock_depth -= 1
+            if self.lock_depth == 0 and self.lock_file is not None:
+                # Closing the file releases the lock
+                self.lock_file.close()
+                self.lock_file = None
+
+    def _stat_snapshot(self):
+        try:
+            stat = os.stat(self.filename)
+        except FileNotFoundError:
+            return None
+        return stat.st_ino, stat.st_size, stat.st_mtime_ns
+
+    def load(self):
+        with self.lock():
+            return self._load()
+
+    def _load(self):
+        self.generation = 0
+        self.snapshot_size = 0
+        self.snapshot_stat = self._stat_snapshot()
+        if self.snapshot_stat is None:
+            return LazyRecords(), self._read_journal()
+
+        with open(self.filename, "rb") as file:
+            magic = file.read(len(SNAPSHOT_MAGIC))
+        if magic == COLUMNAR_MAGIC:
+            from .columnar import ColumnarReader
+
+            snapshot = ColumnarReader(self.filename)
+        else:
+            if magic != SNAPSHOT_MAGIC and self.read_only:
+                self.generation, records = self._read_pickle()
+                return LazyRecords(records=records), self._read_journal()
+            if magic != SNAPSHOT_MAGIC:
+                self._migrate()
+                self.snapshot_stat = self._stat_snapshot()
+            snapshot = SnapshotReader(self.filename)
+        self.generation = snapshot.generation
+        self.snapshot_size = os.path.getsize(self.filename)
+        self.bytes_read += self.snapshot_size
+        return LazyRecords(snapshot), self._read_journal()
+
+    def changes(self):
+        """
+        Return (data, entries) committed by other sessions since the last load or
+        commit, to be called under lock(). data is a fresh mapping to replace the
+        book's if the snapshot was compacted meanwhile, entries then start from it;
+        otherwise data is None and entries are the new journal entries.
+        """
+        stat = self._stat_snapshot()
+        if stat != self.snapshot_stat:
+            # The mtime check is cheap, the generation confirms a new snapshot
+            if stat is not None and self.snapshot_stat is not None:
+                with open(self.filename, "rb") as file:
+                    header = file.read(SNAPSHOT_HEADER.size)
+                if len(header) == SNAPSHOT_HEADER.size and SNAPSHOT_HEADER.unpack(header)[2] == self.generation:
+                    self.snapshot_stat = stat
+                    return self.changes()
+            return self._load()
+        try:
+            journal_size = os.path.getsize(self.journal_filename)
+        except FileNotFoundError:
+            journal_size = 0
+        if journal_size == self.journal_size:
+            return None, []
+        if journal_size < self.journal_size:
+            return self._load()
+        return None, self._read_journal(self.journal_size)
+
+    def _read_pickle(self):
+        # (generation, records) of a pickled book
+        with open(self.filename, "rb") as file:
+            snapshot = pickle.load(file)
+        # Files written before the journal existed hold a bare dict of records
+        if isinstance(snapshot, dict):
+            return 0, snapshot
+        tag, generation, data = snapshot
+        if tag != SNAPSHOT_TAG:
+            raise ValueError(f"'{self.filename}' is not an address book file.")
+        return generation, data
+
+    def _migrate(self):
+        # One-shot conversion of a pickled book, the original is kept next to it
+        generation, data = self._read_pickle()
+        shutil.copyfile(self.filename, f"{self.filename}.bak")
+        write_snapshot(self.filename, generation, data, lambda name: pickle.dumps(data[name]))
+
+    def _read_journal(self, start=0):
+        # Entries from the start offset on, 0 reads the whole journal
+        entries = []
+        self.journal_size = start
+        if not os.path.exists(self.journal_filename):
+            self.journal_size = 0
+            return entries
+
+        with open(self.journal_filename, "rb") as file:
+            file.seek(start)
+            content = file.read()
+        self.bytes_read += len(content)
+        if start == 0:
+            if len(content) < JOURNAL_HEADER.size:
+                return entries
+            magic, generation = JOURNAL_HEADER.unpack_from(content)
+            if magic != JOURNAL_MAGIC or generation != self.generation:
+                # Left over from before the last compaction, the snapshot already has it
+                return entries
+
+        offset = JOURNAL_HEADER.size if start == 0 else 0
+        while offset + ENTRY_HEADER.size <= len(content):
+            length, checksum = ENTRY_HEADER.unpack_from(content, offset)
+            payload_start = offset + ENTRY_HEADER.size
+            payload = content[payload_start:payload_start + length]
+            # A torn or corrupted tail means the process died mid-write, drop it
+            if len(payload) < length or zlib.crc32(payload) != checksum:
+                break
+            entries.append(pickle.loads(payload))
+            offset = payload_start + length
+
+        if offset < len(content) and not self.read_only:
+            with open(self.journal_filename, "r+b") as file:
+                file.truncate(start + offset)
+        self.journal_size = start + offset
+        return entries
+
+    def append(self, op, name, args):
+        payload = pickle.dumps((op, name, args))
+        self.pending.append((name, ENTRY_HEADER.pack(len(payload), zlib.crc32(payload)) + payload))
+
+    def pending_names(self):
+        return {name for name, _ in self.pending}
+
+    def resolve(self, name, record):
+        # Replace the uncommitted changes of a contact by its whole state, None if deleted
+        self.pending = [(pending_name, entry) for pending_name, entry in self.pending if pending_name != name]
+        if record is None:
+            self.append("delete", name, ())
+        else:
+            self.append("add_record", name, (record,))
+
+    def commit(self):
+        if not self.pending:
+            return
+        self._check_writable()
+        with self.lock():
+            if self.journal_size == 0:
+                self._start_journal()
+            chunk = b"".join(entry for _, entry in self.pending)
+            with open(self.journal_filename, "r+b") as file:
+                # Right after the last good entry, past a torn tail if a session died mid-write
+                file.seek(self.journal_size)
+                file.write(chunk)
+                file.truncate()
+                file.flush()
+                if self.fsync:
+                    os.fsync(file.fileno())
+            self.journal_size += len(chunk)
+            self.bytes_written += len(chunk)
+            self.pending = []
+
+    def _start_journal(self):
+        atomic_write(self.journal_filename, JOURNAL_HEADER.pack(JOURNAL_MAGIC, self.generation))
+        self.journal_size = JOURNAL_HEADER.size
+        self.bytes_written += JOURNAL_HEADER.size
+
+    def compact_due(self):
+        # Once the journal outgrows the snapshot, replaying it costs more than a new snapshot
+        return not os.path.exists(self.filename) or self.journal_size > max(self.min_compact_size, self.snapshot_size)
+
+    def save(self, data):
+        with self.lock():
+            self.commit()
+            if self.compact_due():
+                self.compact(data)
+
+    def compact(self, data):
+        self._check_writable()
+        with self.lock():
+            self.pending = []
+            # Past every generation written so far, by this session or another one
+            self.generation = max(self.generation, self._stored_generation()) + 1
+            if self.snapshot_format == "columnar":
+                from .columnar import ColumnarReader, snapshot_records, write_columnar
+
+                self.snapshot_size = write_columnar(self.filename, self.generation, snapshot_records(data))
+                if isinstance(data, LazyRecords):
+                    data.rebase(ColumnarReader(self.filename))
+            else:
+                if isinstance(data, LazyRecords):
+                    get_payload = data.raw
+                else:
+                    get_payload = lambda name: pickle.dumps(data[name])
+                self.snapshot_size = write_snapshot(self.filename, self.generation, data, get_payload)
+                if isinstance(data, LazyRecords):
+                    data.rebase(SnapshotReader(self.filename))
+            self.bytes_written += self.snapshot_size
+            self.snapshot_stat = self._stat_snapshot()
+            self._start_journal()
+
+    def _check_writable(self):
+        if self.read_only:
+            raise ValueError(f"'{self.filename}' is open read-only.")
+
+    def _stored_generation(self):
+        try:
+            with open(self.filename, "rb") as file:
+                header = file.read(SNAPSHOT_HEADER.size)
+        except FileNotFoundError:
+            return 0
+        if len(header) < SNAPSHOT_HEADER.size or header[:len(SNAPSHOT_MAGIC)] not in (SNAPSHOT_MAGIC, COLUMNAR_MAGIC):
+            return 0
+        return SNAPSHOT_HEADER.unpack(header)[2]
@@ -0,0 +1,362 @@
+from collections import deque
+from itertools import chain, islice
+import csv, json, os, re
+
+from .address_book import Record, normalize_email
+
+
+FORMATS = {".csv": "csv", ".jsonl": "jsonl", ".json": "jsonl", ".vcf": "vcard", ".vcard": "vcard"}
+CSV_COLUMNS = ["name", "phones", "emails", "birthday", "address", "notes"]
+DUPLICATE_POLICIES = ("skip", "replace", "merge")
+
+
+class ImportReport:
+    def __init__(self):
+        self.added = 0
+        self.replaced = 0
+        self.merged = 0
+        self.skipped = 0
+        # (line number, message)
+        self.errors = []
+
+    def __str__(self):
+        summary = (
+            f"Imported {self.added} contacts, replaced {self.replaced}, merged {self.merged}, "
+            f"skipped {self.skipped} duplicates, {len(self.errors)} errors."
+        )
+        lines = [summary] + [f"Line {line}: {message}" for line, message in self.errors[:20]]
+        if len(self.errors) > 20:
+            lines.append(f"... and {len(self.errors) - 20} more errors.")
+        return "\n".join(lines)
+
+
+def detect_format(filename, format=None):
+    format = format or FORMATS.get(os.path.splitext(filename)[1].lower())
+    if format not in FORMATS.values():
+        raise ValueError("Unknown file format. Use a .csv, .jsonl or .vcf file.")
+    return format
+
+
+# Contacts travel between the readers, the workers and the book as plain dicts:
+# {"name", "phones", "emails", "birthday", "address", "notes": {title: text}}
+
+def contact_from_record(record):
+    return {
+        "name": record.name.value,
+        "phones": [phone.value for phone in record.phones],
+        "emails": [email.value for email in record.emails],
+        "birthday": record.birthday.value if hasattr(record, "birthday") else "",
+        "address": record.address.value if record.address else "",
+        "notes": {note.title: note.note for note in record.notes},
+    }
+
+
+def record_from_contact(contact):
+    name = (contact.get("name") or "").strip()
+    if not name:
+        raise ValueError("Contact name cannot be empty.")
+    record = Record(name)
+    # A phone or email listed twice is added once, emails differing only in case are the same
+    for phone in dict.fromkeys(contact.get("phones") or ()):
+        record.add_phone(phone)
+    emails = {}
+    for email in contact.get("emails") or ():
+        emails.setdefault(normalize_email(email), email)
+    for email in emails.values():
+        record.add_email(email)
+    if contact.get("birthday"):
+        record.add_birthday(contact["birthday"])
+    if contact.get("address"):
+        record.add_address(contact["address"])
+    for title, note in (contact.get("notes") or {}).items():
+        record.add_note(title, note)
+    return record
+
+
+# CSV: phones and emails are joined with ";", notes are a JSON object
+
+def read_csv(file):
+    reader = csv.DictReader(file)
+    line_number = reader.line_num + 1
+    for row in reader:
+        yield line_number, row
+        line_number = reader.line_num + 1
+
+
+def parse_csv(row):
+    notes = row.get("notes") or ""
+    return {
+        "name": row.get("name"),
+        "phones": [phone.strip() for phone in (row.get("phones") or "").split(";") if phone.strip()],
+        "emails": [email.strip() for email in (row.get("emails") or "").split(";") if email.strip()],
+        "birthday": (row.get("birthday") or "").strip(),
+        "address": (row.get("address") or "").strip(),
+        "notes": json.loads(notes) if notes.strip() else {},
+    }
+
+
+def write_csv(file, contacts):
+    writer = csv.DictWriter(file, CSV_COLUMNS)
+    writer.writeheader()
+    for contact in contacts:
+        writer.writerow({
+            **contact,
+            "phones": ";".join(contact["phones"]),
+            "emails": ";".join(contact["emails"]),
+            "notes": json.dumps(contact["notes"], ensure_ascii=False) if contact["notes"] else "",
+        })
+
+
+# JSON Lines: one contact object per line
+
+def read_jsonl(file):
+    for line_number, line in enumerate(file, 1):
+        if line.strip():
+            yield line_number, line
+
+
+def parse_jsonl(line):
+    contact = json.loads(line)
+    if not isinstance(contact, dict):
+        raise ValueError("Expected a JSON object.")
+    return contact
+
+
+def write_jsonl(file, contacts):
+    for contact in contacts:
+        file.write(json.dumps(contact, ensure_ascii=False))
+        file.write("\n")
+
+
+# vCard 3.0 and 4.0: FN, TEL, EMAIL, BDAY, ADR and NOTE (title in an X-TITLE parameter)
+
+def read_vcard(file):
+    card = None
+    for line_number, line in enumerate(file, 1):
+        line = line.rstrip("\r\n")
+        if line.upper() == "BEGIN:VCARD":
+            card, start = [], line_number
+        elif line.upper() == "END:VCARD" and card is not None:
+            yield start, card
+            card = None
+        elif card is not None:
+            # Folded lines continue with a space or a tab
+            if line[:1] in (" ", "\t") and card:
+                card[-1] += line[1:]
+            elif line:
+                card.append(line)
+
+
+def unescape_vcard(value):
+    result, escaped = [], False
+    for char in value:
+        if escaped:
+            result.append("\n" if char in "nN" else char)
+            escaped = False
+        elif char == "\\":
+            escaped = True
+        else:
+            result.append(char)
+    return "".join(result)
+
+
+def escape_vcard(value):
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace(",", "\\,").replace(";", "\\;")
+
+
+def parse_vcard_birthday(value):
+    # 1986-12-25 or 19861225, a year-less --1225 can't be stored
+    digits = value.replace("-", "")
+    if len(digits) != 8 or not digits.isdigit():
+        raise ValueError(f"Unsupported vCard birthday '{value}'.")
+    return f"{digits[6:8]}.{digits[4:6]}.{digits[0:4]}"
+
+
+def split_vcard_line(line):
+    # The value starts at the first colon outside a quoted parameter
+    quoted = False
+    for i, char in enumerate(line):
+        if char == '"':
+            quoted = not quoted
+        elif char == ":" and not quoted:
+            return line[:i], line[i + 1:]
+    return line, ""
+
+
+def parse_vcard(lines):
+    contact = {"name": "", "phones": [], "emails": [], "birthday": "", "address": "", "notes": {}}
+    for line in lines:
+        head, value = split_vcard_line(line)
+        prop, *params = re.findall(r'(?:[^;"]|"[^"]*")+', head)
+        # Grouped properties look like item1.TEL
+        prop = prop.rsplit(".", 1)[-1].upper()
+        params = dict(param.partition("=")[::2] for param in params)
+        if prop == "FN":
+            contact["name"] = unescape_vcard(value)
+        elif prop == "TEL":
+            value = value[4:] if value.lower().startswith("tel:") else value
+            contact["phones"].append("".join(char for char in value if char.isdigit())[-10:])
+        elif prop == "EMAIL":
+            contact["emails"].append(unescape_vcard(value))
+        elif prop == "BDAY":
+            contact["birthday"] = parse_vcard_birthday(value.split("T")[0])
+        elif prop == "ADR":
+            parts = [unescape_vcard(part) for part in re.split(r"(?<!\\);", value)]
+            contact["address"] = ", ".join(part for part in parts if part)
+        elif prop == "NOTE":
+            title = params.get("X-TITLE", "").strip('"') or f"Note {len(contact['notes']) + 1}"
+            contact["notes"][title] = unescape_vcard(value)
+    return contact
+
+
+def write_vcard(file, contacts):
+    for contact in contacts:
+        lines = ["BEGIN:VCARD", "VERSION:3.0", f"FN:{escape_vcard(contact['name'])}"]
+        lines += [f"TEL:{phone}" for phone in contact["phones"]]
+        lines += [f"EMAIL:{escape_vcard(email)}" for email in contact["emails"]]
+        if contact["birthday"]:
+            day, month, year = contact["birthday"].split(".")
+            lines.append(f"BDAY:{year}-{month}-{day}")
+        if contact["address"]:
+            lines.append(f"ADR:;;{escape_vcard(contact['address'])};;;;")
+        for title, note in contact["notes"].items():
+            # Parameter values can't hold double quotes
+            title = title.replace('"', "'")
+            lines.append(f'NOTE;X-TITLE="{title}":{escape_vcard(note)}')
+        lines.append("END:VCARD")
+        file.write("\r\n".join(lines) + "\r\n")
+
+
+READERS = {"csv": read_csv, "jsonl": read_jsonl, "vcard": read_vcard}
+PARSERS = {"csv": parse_csv, "jsonl": parse_jsonl, "vcard": parse_vcard}
+WRITERS = {"csv": write_csv, "jsonl": write_jsonl, "vcard": write_vcard}
+
+
+def validate_batch(format, batch):
+    """
+    Turn a batch of (line number, raw contact) into (line number, record, error).
+    Runs in the worker processes.
+    """
+    parse = PARSERS[format]
+    results = []
+    for line_number, raw in batch:
+        try:
+            results.append((line_number, record_from_contact(parse(raw)), None))
+        except (ValueError, KeyError, TypeError, AttributeError) as e:
+            results.append((line_number, None, str(e) or type(e).__name__))
+    return results
+
+
+def batches(items, batch_size):
+    batch = []
+    for item in items:
+        batch.append(item)
+        if len(batch) == batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def validated_records(format, units, workers, batch_size):
+    all_batches = batches(units, batch_size)
+    # A file that fits in one batch is validated here, not worth starting processes
+    first = list(islice(all_batches, 2))
+    if workers <= 1 or len(first) < 2:
+        for batch in chain(first, all_batches):
+            yield from validate_batch(format, batch)
+        return
+    from multiprocessing import Pool
+
+    with Pool(workers) as pool:
+        # Keep a few batches per worker in flight, results come back in file order
+        pending = deque()
+        for batch in chain(first, all_batches):
+            pending.append(pool.apply_async(validate_batch, (format, batch)))
+            if len(pending) >= workers * 2:
+                yield from pending.popleft().get()
+        while pending:
+            yield from pending.popleft().get()
+
+
+def merge_records(record, new_record):
+    phones = {phone.key for phone in record.phones}
+    for phone in new_record.phones:
+        if phone.key not in phones:
+            record.add_phone(phone.value)
+    emails = {email.key for email in record.emails}
+    for email in new_record.emails:
+        if email.key not in emails:
+            record.add_email(email.value)
+    if hasattr(new_record, "birthday") and not hasattr(record, "birthday"):
+        record.add_birthday(new_record.birthday.value)
+    if new_record.address and not record.address:
+        record.add_address(new_record.address.value)
+    for note in new_record.notes:
+        if record.find_note(note.title) is None:
+            record.add_note(note.title, note.note)
+
+
+def import_contacts(book, filename, format=None, on_duplicate="skip", workers=None, batch_size=1000):
+    """
+    Add the contacts of a CSV, JSON Lines or vCard file to the book.
+
+    The file is read one contact at a time, parsing and validation run in batches
+    on a pool of worker processes with a few batches in flight, so memory use
+    does not grow with the file; a file of one batch is validated in-process.
+    Every contact is built as a Record, so the Phone, Email and Birthday rules
+    apply.
+
+    on_duplicate decides what happens to a contact whose name is already in the
+    book: "skip" keeps the existing one, "replace" overwrites it and "merge" adds
+    the new phones, emails and notes plus a missing birthday or address.
+    Invalid contacts are left out and reported with their line number.
+    """
+    format = detect_format(filename, format)
+    if on_duplicate not in DUPLICATE_POLICIES:
+        raise ValueError(f"Unknown duplicate policy. Use one of: {', '.join(DUPLICATE_POLICIES)}.")
+    if workers is None:
+        workers = os.cpu_count() or 1
+
+    report = ImportReport()
+    with open(filename, encoding="utf-8", newline="") as file:
+        units = READERS[format](file)
+        for line_number, record, error in validated_records(format, units, workers, batch_size):
+            if error:
+                report.errors.append((line_number, error))
+                continue
+            existing = book.find(record.name.value)
+            if existing is None:
+                book.add_record(record)
+                report.added += 1
+            elif on_duplicate == "replace":
+                book.add_record(record)
+                report.replaced += 1
+            elif on_duplicate == "merge":
+                try:
+                    merge_records(existing, record)
+                except ValueError as e:
+                    report.errors.append((line_number, str(e)))
+                    continue
+                report.merged += 1
+            else:
+                report.skipped += 1
+    return report
+
+
+def export_contacts(book, filename, format=None):
+    """
+    Write every contact of the book to a CSV, JSON Lines or vCard file, return the count.
+    """
+    format = detect_format(filename, format)
+    count = 0
+
+    def contacts():
+        nonlocal count
+        for record in book.data.values():
+            count += 1
+            yield contact_from_record(record)
+
+    with open(filename, "w", encoding="utf-8", newline="") as file:
+        WRITERS[format](file, contacts())
+    return count
@@ -0,0 +1,83 @@
+from datetime import date
+import re
+
+
+PHONE_PATTERN = re.compile(r"\d{10}", re.ASCII)
+EMAIL_PATTERN = re.compile(r"[^@]+@[^@]+\.[^@]+")
+BIRTHDAY_PATTERN = re.compile(r"(\d{2})\.(\d{2})\.(\d{4})", re.ASCII)
+
+PHONE_ERROR = "Invalid phone number format. Use a 10-digit number."
+EMAIL_ERROR = "Invalid email format."
+BIRTHDAY_ERROR = "Invalid birthday format. Use DD.MM.YYYY."
+
+
+def validate_phone(value):
+    """
+    Return the phone number (10 digits) packed into an integer.
+    """
+    if not PHONE_PATTERN.fullmatch(value):
+        raise ValueError(PHONE_ERROR)
+    return int(value)
+
+
+def validate_email(value):
+    if not EMAIL_PATTERN.fullmatch(value):
+        raise ValueError(EMAIL_ERROR)
+    return value
+
+
+def validate_birthday(value):
+    """
+    Return the date ordinal of a DD.MM.YYYY birthday that exists in the calendar.
+    """
+    match = BIRTHDAY_PATTERN.fullmatch(value)
+    if not match:
+        raise ValueError(BIRTHDAY_ERROR)
+    day, month, year = map(int, match.groups())
+    try:
+        return date(year, month, day).toordinal()
+    except ValueError:
+        raise ValueError(f"Invalid birthday date: {value} is not in the calendar.") from None
+
+
+def validate_column(validate, values):
+    """
+    Validate a whole column of values with one of the validate_* functions.
+
+    Returns the list of results, with None for invalid rows, and a list of
+    (row index, message) for those rows.
+    """
+    results = []
+    errors = []
+    append = results.append
+    for i, value in enumerate(values):
+        try:
+            append(validate(value))
+        except ValueError as e:
+            append(None)
+            errors.append((i, str(e)))
+    return results, errors
+
+
+def validate_phones(values):
+    # Plain digit strings, the common case, are checked with str methods only
+    results = [int(value) if len(value) == 10 and value.isascii() and value.isdigit() else None for value in values]
+    errors = [(i, PHONE_ERROR) for i, result in enumerate(results) if result is None]
+    return results, errors
+
+
+def validate_emails(values):
+    return validate_column(validate_email, values)
+
+
+def validate_birthdays(values):
+    # Columns repeat the same dates a lot, each distinct value is parsed once
+    cache = {}
+
+    def validate(value):
+        ordinal = cache.get(value)
+        if ordinal is None:
+            ordinal = cache[value] = validate_birthday(value)
+        return ordinal
+
+    return validate_column(validate, values)
@@ -0,0 +1,67 @@
+from collections.abc import Mapping
+
+
+class BookView(Mapping):
+    """
+    Read-only view of the contacts of an AddressBook as they were when
+    AddressBook.snapshot() made it, name -> Record like book.data.
+
+    Making one is O(1): the view shares the book's records and the book saves
+    the old version of a contact into overrides before it changes, the first
+    time after the view was made. Adding, replacing and removing a contact
+    keep the record it replaces; a contact about to be edited is copied by
+    AddressBook.find() and the copy takes its place in the book, so the
+    records a view hands out are never edited. The names are copied on the
+    first iteration, contacts removed from the book by then come last. Views
+    are dropped with their last reference.
+
+    Readers can use a view from any thread while writers carry on. Snapshots
+    should be taken between write commands, as the prompt and the server do
+    under their locks. The records must not be edited through a view.
+    """
+    def __init__(self, book):
+        self.book = book
+        # The contacts of the book when the view was made, a load or a sync
+        # replaces them in the book without touching these
+        self.source = book.data
+        # name -> record as of the view, None for names added since
+        self.overrides = {}
+        self.names = None
+
+    # Views are told apart by identity, the book keeps weak references to them in a set
+    __hash__ = object.__hash__
+
+    @property
+    def data(self):
+        # Commands reading book.data, like "all" and "export", run on a view as on the book
+        return self
+
+    def __getitem__(self, name):
+        with self.book.views_lock:
+            if name in self.overrides:
+                record = self.overrides[name]
+            else:
+                record = self.source.get(name)
+        if record is None:
+            raise KeyError(name)
+        return record
+
+    def _names(self):
+        if self.names is None:
+            with self.book.views_lock:
+                if self.names is None:
+                    overrides = self.overrides
+                    names = [name for name in self.source if overrides.get(name, name) is not None]
+                    # Removed from the book since, their records are in overrides
+                    names += [
+                        name for name, record in overrides.items()
+                        if record is not None and name not in self.source
+                    ]
+                    self.names = names
+        return self.names
+
+    def __iter__(self):
+        return iter(self._names())
+
+    def __len__(self):
+        return len(self._names())